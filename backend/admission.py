@@ -0,0 +1,143 @@
+"""
+Admission control for the inference routes.
+
+Every inference request in this worker competes for the same CPU and the
+same model, so a request admitted during a burst waits behind all the work
+already in flight. AdmissionController estimates that wait as
+
+    sum over routes of (in-flight requests x smoothed inference time) / concurrency
+
+where the inference time is an exponentially weighted average of what the
+routes report through record_inference(), and concurrency is how many
+inferences the worker effectively runs at once. A request is turned away
+instead of being queued when:
+
+  * 429 - the estimated wait is already over its route's wait_target
+  * 503 - its route already has max_inflight requests running
+
+Both come with Retry-After: roughly how long the backlog needs to drain
+back under the target, plus random jitter so rejected clients don't all
+come back at the same moment. Counts of admitted and shed requests per
+route are kept for stats().
+"""
+
+import math
+import random
+import threading
+from collections import namedtuple
+
+# wait_target and initial_service in seconds; max_inflight 0 means no cap
+RoutePolicy = namedtuple('RoutePolicy', ['wait_target', 'max_inflight', 'initial_service'])
+
+DEFAULT_POLICIES = {
+    "/predict": RoutePolicy(wait_target=10.0, max_inflight=32, initial_service=0.5),
+    "/ultrasound": RoutePolicy(wait_target=5.0, max_inflight=32, initial_service=0.3),
+    "/ultrasound/cine": RoutePolicy(wait_target=60.0, max_inflight=4, initial_service=10.0),
+}
+
+Decision = namedtuple('Decision', ['admitted', 'status', 'retry_after', 'estimated_wait'])
+
+ADMIT = Decision(True, None, None, 0.0)
+
+
+def parse_route_values(spec):
+    """'/predict:5,/ultrasound:3' -> {'/predict': 5.0, '/ultrasound': 3.0}"""
+    values = {}
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        route, _, value = part.strip().rpartition(":")
+        if not route:
+            raise ValueError(f"Invalid route setting {part!r} (expected ROUTE:VALUE)")
+        values[route] = float(value)
+    return values
+
+
+def build_policies(wait_targets=None, max_inflight=None, defaults=None):
+    """DEFAULT_POLICIES with per-route overrides; routes can be added by giving a wait target."""
+    policies = dict(defaults or DEFAULT_POLICIES)
+    for route, target in (wait_targets or {}).items():
+        base = policies.get(route, RoutePolicy(target, 0, 1.0))
+        policies[route] = base._replace(wait_target=target)
+    for route, cap in (max_inflight or {}).items():
+        if route in policies:
+            policies[route] = policies[route]._replace(max_inflight=int(cap))
+    # A zero wait target switches admission control off for that route
+    return {route: policy for route, policy in policies.items() if policy.wait_target > 0}
+
+
+class AdmissionController:
+    def __init__(self, policies, concurrency=1, smoothing=0.2):
+        self.policies = policies
+        self.concurrency = max(1, concurrency)
+        self.smoothing = smoothing
+        self.lock = threading.Lock()
+        self.routes = {
+            route: {"inflight": 0, "service": policy.initial_service, "observed": 0,
+                    "admitted": 0, "shed_wait": 0, "shed_full": 0}
+            for route, policy in policies.items()
+        }
+
+    def _estimated_wait(self):
+        # Called with the lock held
+        work = sum(state["inflight"] * state["service"] for state in self.routes.values())
+        return work / self.concurrency
+
+    def _retry_after(self, excess):
+        # Seconds to back off, jittered by up to +50%
+        return max(1, math.ceil(excess * (1 + random.random() / 2)))
+
+    def admit(self, route):
+        """Decision for a new request on route; admitted requests must be release()d."""
+        policy = self.policies.get(route)
+        if policy is None:
+            return ADMIT
+        with self.lock:
+            state = self.routes[route]
+            wait = self._estimated_wait()
+            if policy.max_inflight and state["inflight"] >= policy.max_inflight:
+                state["shed_full"] += 1
+                return Decision(False, 503, self._retry_after(state["service"] / self.concurrency), wait)
+            if wait > policy.wait_target:
+                state["shed_wait"] += 1
+                return Decision(False, 429, self._retry_after(wait - policy.wait_target), wait)
+            state["inflight"] += 1
+            state["admitted"] += 1
+            return Decision(True, None, None, wait)
+
+    def release(self, route):
+        with self.lock:
+            state = self.routes.get(route)
+            if state:
+                state["inflight"] -= 1
+
+    def record_inference(self, route, seconds):
+        """Feeds one observed inference time into the route's estimate."""
+        with self.lock:
+            state = self.routes.get(route)
+            if state is None:
+                return
+            if state["observed"]:
+                state["service"] += self.smoothing * (seconds - state["service"])
+            else:
+                state["service"] = seconds
+            state["observed"] += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "concurrency": self.concurrency,
+                "estimated_wait_s": self._estimated_wait(),
+                "routes": {
+                    route: {
+                        "inflight": state["inflight"],
+                        "inference_s": state["service"],
+                        "wait_target_s": self.policies[route].wait_target,
+                        "max_inflight": self.policies[route].max_inflight,
+                        "admitted": state["admitted"],
+                        "shed_429": state["shed_wait"],
+                        "shed_503": state["shed_full"],
+                    }
+                    for route, state in self.routes.items()
+                },
+            }
@@ -4,193 +4,344 @@ import os
 import numpy as np
 import tensorflow as tf
 import keras
-from keras import layers, ops
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
 from dotenv import load_dotenv
 from supabase import create_client, Client
-from PIL import Image
 from werkzeug.utils import secure_filename
-import io
 import cv2
 import time
 import uuid
 import base64
+import json
+from thumbnails import make_derivatives, encode_image
+from preprocessing import preprocess_image, preprocess_ultrasound, input_buffers, vgg_input_into, vit_input_into, VGG_INPUT_SIZE, VIT_INPUT_SIZE
+from ensemble import EnsembleScorer, parse_weights
+from model_registry import ModelRegistry, ModelSpec
+from shadow import ShadowRunner, compare_classification, compare_segmentation
+from profiling import ProfileCapture
+import tracing
+from tracing import BatchExporter, Tracer
+from admission import AdmissionController, build_policies, parse_route_values
+import decode_budget
+from decode_budget import DecodeLimiter, DecodeBusy, ImageTooLarge, UnreadableImage
+import hmac
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import cine
+import explain
+from training.architectures import create_vit_classifier
+import tempfile
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=list(tracing.RESPONSE_HEADERS))
 
 # Supabase Setup
 url = os.environ.get("SUPABASE_URL")
 key = os.environ.get("SUPABASE_KEY")
 supabase: Client = create_client(url, key) if url and key else None
 
-# --- ViT Model Architecture ---
-
-def mlp(x, hidden_units, dropout_rate):
-    for units in hidden_units:
-        x = layers.Dense(units, activation=keras.activations.gelu)(x)
-        x = layers.Dropout(dropout_rate)(x)
-    return x
-
-class Patches(layers.Layer):
-    def __init__(self, patch_size):
-        super().__init__()
-        self.patch_size = patch_size
-
-    def call(self, images):
-        input_shape = ops.shape(images)
-        batch_size = input_shape[0]
-        height = input_shape[1]
-        width = input_shape[2]
-        channels = input_shape[3]
-        num_patches_h = height // self.patch_size
-        num_patches_w = width // self.patch_size
-        patches = keras.ops.image.extract_patches(images, size=self.patch_size)
-        patches = ops.reshape(
-            patches,
-            (
-                batch_size,
-                num_patches_h * num_patches_w,
-                self.patch_size * self.patch_size * channels,
-            ),
-        )
-        return patches
-
-    def get_config(self):
-        config = super().get_config()
-        config.update({"patch_size": self.patch_size})
-        return config
-
-class PatchEncoder(layers.Layer):
-    def __init__(self, num_patches, projection_dim):
-        super().__init__()
-        self.num_patches = num_patches
-        self.projection = layers.Dense(units=projection_dim)
-        self.position_embedding = layers.Embedding(
-            input_dim=num_patches, output_dim=projection_dim
-        )
-
-    def call(self, patch):
-        positions = ops.expand_dims(
-            ops.arange(start=0, stop=self.num_patches, step=1), axis=0
-        )
-        projected_patches = self.projection(patch)
-        encoded = projected_patches + self.position_embedding(positions)
-        return encoded
-
-    def get_config(self):
-        config = super().get_config()
-        config.update({"num_patches": self.num_patches})
-        return config
-
-def create_vit_classifier():
-    inputs = keras.Input(shape=(224, 224, 1))
-    patches = Patches(patch_size=16)(inputs)
-    num_patches = (224 // 16) ** 2
-    encoded_patches = PatchEncoder(num_patches, projection_dim=64)(patches)
-    for _ in range(8):
-        x1 = layers.LayerNormalization(epsilon=1e-6)(encoded_patches)
-        attention_output = layers.MultiHeadAttention(
-            num_heads=4, key_dim=64, dropout=0.1
-        )(x1, x1)
-        x2 = layers.Add()([attention_output, encoded_patches])
-        x3 = layers.LayerNormalization(epsilon=1e-6)(x2)
-        x3 = mlp(x3, hidden_units=[128, 64], dropout_rate=0.1)
-        encoded_patches = layers.Add()([x3, x2])
-    representation = layers.LayerNormalization(epsilon=1e-6)(encoded_patches)
-    representation = layers.Flatten()(representation)
-    representation = layers.Dropout(0.5)(representation)
-    features = mlp(representation, hidden_units=[2048, 1024], dropout_rate=0.5)
-    logits = layers.Dense(2)(features)
-    model = keras.Model(inputs=inputs, outputs=logits)
-    return model
-
 # --- Model Loading ---
 
 MODEL_PATH = os.path.join(os.path.dirname(__file__), 'models', 'vit_mammogram_model.keras')
 ULTRA_MODEL_PATH = os.path.join(os.path.dirname(__file__), 'models', 'ultrasound_unet_model.h5')
+VGG_MODEL_PATH = os.path.join(os.path.dirname(__file__), 'models', 'VGG16_mammogram_model.h5')
 
-model = None
-ultrasound_model = None
+# Versioned artifacts + manifest; models missing from it load from the paths above
+MODEL_REGISTRY_DIR = os.environ.get(
+    "MODEL_REGISTRY_DIR", os.path.join(os.path.dirname(__file__), 'models', 'registry')
+)
+# Seconds between manifest checks (0 disables the watcher)
+MODEL_WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", 30))
 
-def load_model():
-    global model, ultrasound_model
-    try:
-        if os.path.exists(MODEL_PATH):
-            print(f"Loading model architecture and weights from {MODEL_PATH}...")
-            # Instantiate model architecture directly from code
-            model = create_vit_classifier()
-            # Load weights
-            model.load_weights(MODEL_PATH)
-            print("Model loaded successfully.")
-        else:
-            print(f"Model not found at {MODEL_PATH}")
-    except Exception as e:
-        print(f"Error loading model: {e}")
-        import traceback
-        traceback.print_exc()
+# 'vit' (default) or 'ensemble'; a request can override with ?mode=
+PREDICT_MODE = os.environ.get("PREDICT_MODE", "vit")
+ensemble_scorer = EnsembleScorer(parse_weights(os.environ.get("ENSEMBLE_WEIGHTS")))
+
+def load_vit(path):
+    # Instantiate model architecture directly from code, then load weights
+    vit = create_vit_classifier()
+    vit.load_weights(path)
+    return vit
+
+def load_keras(path):
+    # compile=False is critical for avoiding custom loss function errors during inference
+    return tf.keras.models.load_model(path, compile=False)
+
+model_registry = ModelRegistry(MODEL_REGISTRY_DIR, {
+    "vit": ModelSpec(load_vit, (1, 224, 224, 1), MODEL_PATH),
+    "unet": ModelSpec(load_keras, (1, 128, 128, 3), ULTRA_MODEL_PATH),
+    # Ensemble member
+    "vgg16": ModelSpec(load_keras, (1, VGG_INPUT_SIZE, VGG_INPUT_SIZE, 3), VGG_MODEL_PATH),
+    # Shadow candidates: only loaded when listed in the manifest
+    "vit_shadow": ModelSpec(load_vit, (1, 224, 224, 1), None),
+    "unet_shadow": ModelSpec(load_keras, (1, 128, 128, 3), None),
+})
+model_registry.load_all()
+model_registry.start_watcher(MODEL_WATCH_INTERVAL)
+
+def vit_probabilities(vit_model, model_input):
+    logits = vit_model.predict(model_input, verbose=0) # Model returns logits
+    # Apply Softmax to get probabilities (since from_logits=True was used)
+    return keras.ops.softmax(logits).numpy()[0]
+
+def vgg_probabilities(vgg_model, model_input):
+    # The VGG16 head already ends in softmax
+    return np.asarray(vgg_model.predict(model_input, verbose=0))[0]
+
+def unet_probability_map(unet_model, model_input):
+    return np.asarray(unet_model.predict(model_input, verbose=0))[0, :, :, 0]
+
+def postprocess_mask(pred_mask):
+    """
+    U-Net output (1, H, W, 1) -> (mask_2d, has_tumor, confidence), where
+    mask_2d is the HxW uint8 mask (255 = tumour) and confidence the max
+    probability in the map.
+    """
+    prob_map = pred_mask[0, :, :, 0] # Remove extra dims to get 128x128 image
+    # Threshold at 0.5 (Pixels > 0.5 are tumor)
+    mask_2d = (prob_map > cine.MASK_THRESHOLD).astype(np.uint8) * 255
+    # If any white pixels exist, tumor is found
+    return mask_2d, bool(mask_2d.any()), float(prob_map.max())
+
+def mask_png_base64(mask_2d):
+    _, buffer = cv2.imencode('.png', mask_2d)
+    return base64.b64encode(buffer).decode('utf-8')
+
+# Candidate models score copies of live inputs in the background; see shadow.py
+shadow_runner = ShadowRunner(
+    {
+        "vit": (vit_probabilities, compare_classification),
+        "unet": (unet_probability_map, compare_segmentation),
+    },
+    db_path=os.environ.get("SHADOW_DB", os.path.join(os.path.dirname(__file__), 'shadow_stats.sqlite')),
+    queue_size=int(os.environ.get("SHADOW_QUEUE_SIZE", 32)),
+    max_inflight=int(os.environ.get("SHADOW_MAX_INFLIGHT", 1)),
+    max_age=float(os.environ.get("SHADOW_MAX_AGE", 30)),
+    sample_rate=float(os.environ.get("SHADOW_SAMPLE_RATE", 1.0)),
+)
+# Production inference routes; shadow work backs off while these are busy
+SHADOW_TRACKED_ENDPOINTS = {"predict", "predict_ultrasound", "predict_ultrasound_cine"}
+
+# Admin-armed TensorFlow + Python profiles of those routes; see profiling.py
+profile_capture = ProfileCapture(
+    os.environ.get("PROFILE_DIR", os.path.join(os.path.dirname(__file__), 'profiles')),
+    max_seconds=float(os.environ.get("PROFILE_MAX_SECONDS", 120)),
+)
+
+# Trace ids on every request; spans for the sampled share are exported in
+# batches to TRACE_EXPORT_URL (OTLP/HTTP JSON) or TRACE_EXPORT_FILE. See tracing.py
+TRACE_EXPORT_URL = os.environ.get("TRACE_EXPORT_URL")
+TRACE_EXPORT_FILE = os.environ.get("TRACE_EXPORT_FILE")
+tracer = Tracer(
+    BatchExporter(
+        url=TRACE_EXPORT_URL,
+        path=TRACE_EXPORT_FILE,
+        service_name=os.environ.get("TRACE_SERVICE_NAME", "backend"),
+        batch_size=int(os.environ.get("TRACE_BATCH_SIZE", 512)),
+        flush_interval=float(os.environ.get("TRACE_FLUSH_INTERVAL", 5)),
+    ) if TRACE_EXPORT_URL or TRACE_EXPORT_FILE else None,
+    sample_rate=float(os.environ.get("TRACE_SAMPLE_RATE", 0.01)),
+)
+
+@app.before_request
+def start_trace():
+    route = request.url_rule.rule if request.url_rule else request.path
+    g.trace = tracer.start_request(
+        request.headers, f"{request.method} {route}",
+        **{"http.method": request.method, "http.route": route,
+           "http.request_content_length": request.content_length}
+    )
+
+@app.after_request
+def end_trace(response):
+    trace = g.pop("trace", None)
+    if trace:
+        response.headers.update(trace.response_headers())
+        tracer.end_request(trace, response.status_code)
+    return response
+
+@app.teardown_request
+def end_unfinished_trace(exc):
+    trace = g.pop("trace", None)
+    if trace:
+        tracer.end_request(trace, error=exc)
+
+# Sheds inference requests (429/503 + Retry-After) once the estimated wait
+# behind in-flight work passes the route's target; see admission.py.
+# e.g. ADMISSION_WAIT_TARGETS="/predict:10,/ultrasound:5" (seconds, 0 = off)
+admission = AdmissionController(
+    build_policies(
+        parse_route_values(os.environ.get("ADMISSION_WAIT_TARGETS")),
+        parse_route_values(os.environ.get("ADMISSION_MAX_INFLIGHT")),
+    ),
+    concurrency=int(os.environ.get("ADMISSION_CONCURRENCY", 1)),
+)
+
+# Caps the memory of image decodes running at once and refuses images over
+# DECODE_MAX_PIXELS from their header alone; see decode_budget.py.
+decode_limiter = DecodeLimiter(
+    budget_bytes=int(float(os.environ.get("DECODE_MEMORY_BUDGET_MB", 512)) * 1024 * 1024),
+    max_pixels=int(os.environ.get("DECODE_MAX_PIXELS", decode_budget.DEFAULT_MAX_PIXELS)),
+    timeout=float(os.environ.get("DECODE_QUEUE_TIMEOUT", 30)),
+)
+DECODE_ERRORS = (ImageTooLarge, UnreadableImage, DecodeBusy)
+
+def decode_error_response(e):
+    """413 for images over the pixel limit (or decompression bombs), 400 if unreadable, 503 if no decode memory freed up in time."""
+    if isinstance(e, DecodeBusy):
+        response = jsonify({"error": "Server is busy, please retry later"})
+        response.status_code = 503
+        response.headers["Retry-After"] = "5"
+        return response
+    return jsonify({"error": str(e)}), 413 if isinstance(e, ImageTooLarge) else 400
+
+@app.before_request
+def admit_request():
+    if request.endpoint not in SHADOW_TRACKED_ENDPOINTS:
+        return None
+    route = request.url_rule.rule
+    decision = admission.admit(route)
+    if not decision.admitted:
+        response = jsonify({
+            "error": "Server is busy, please retry later",
+            "retry_after": decision.retry_after,
+            "estimated_wait": round(decision.estimated_wait, 2)
+        })
+        response.status_code = decision.status
+        response.headers["Retry-After"] = str(decision.retry_after)
+        return response
+    g.admitted_route = route
+
+@app.teardown_request
+def release_admission(exc):
+    route = g.pop("admitted_route", None)
+    if route:
+        admission.release(route)
+
+@app.before_request
+def track_inference_start():
+    if request.endpoint in SHADOW_TRACKED_ENDPOINTS:
+        g.shadow_tracked = True
+        shadow_runner.request_started()
+        g.profiled = profile_capture.request_started()
+
+@app.teardown_request
+def track_inference_end(exc):
+    if g.pop("shadow_tracked", False):
+        shadow_runner.request_finished()
+    if g.pop("profiled", False):
+        profile_capture.request_finished()
+
+def authenticate_admin():
+    """Returns an error response unless X-Admin-Token matches ADMIN_TOKEN."""
+    expected = os.environ.get("ADMIN_TOKEN")
+    if not expected:
+        return jsonify({"error": "Admin endpoints are disabled (ADMIN_TOKEN not set)"}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), expected):
+        return jsonify({"error": "Invalid admin token"}), 401
+    return None
+
+def authenticate_request():
+    """
+    Resolves the bearer token on the current request to a Supabase user id.
+    Returns (user_id, None) on success or (None, error_response) otherwise.
+    """
+    auth_header = request.headers.get('Authorization')
+    if not auth_header:
+        return None, (jsonify({"error": "Missing Authorization header"}), 401)
+
+    token = auth_header.split(" ", 1)[1].strip() if " " in auth_header else auth_header
+    if not token:
+        return None, (jsonify({"error": "Missing token"}), 401)
 
-    # --- Load Ultrasound Model ---
     try:
-        if os.path.exists(ULTRA_MODEL_PATH):
-            print(f"🔹 Loading Ultrasound U-Net from {ULTRA_MODEL_PATH}...")
-            # compile=False is critical for avoiding custom loss function errors during inference
-            ultrasound_model = tf.keras.models.load_model(ULTRA_MODEL_PATH, compile=False)
-            print("✅ Ultrasound Model loaded.")
-        else:
-            print(f"⚠️ Warning: Ultrasound model NOT found at {ULTRA_MODEL_PATH}. (Skipping)")
+        with tracing.span("auth"):
+            user_response = supabase.auth.get_user(token)
+        return user_response.user.id, None
     except Exception as e:
-        print(f"❌ Error loading Ultrasound model: {e}")
+        print(f"Auth error: {e}")
+        return None, (jsonify({"error": "Invalid token"}), 401)
 
-load_model()
 
-def preprocess_image(image_bytes):
-    # Convert bytes to PIL Image
-    img = Image.open(io.BytesIO(image_bytes))
-    
-    # 1. Convert to Grayscale ('L')
-    img = img.convert('L')
-    
-    # 2. Resize to 224x224
-    target_size = (224, 224)
-    img = img.resize(target_size)
-    
-    # 3. Convert to array
-    img_array = np.array(img)
-    
-    # Expand dims to (1, 224, 224, 1)
-    img_array = np.expand_dims(img_array, axis=-1)
-    img_array = np.expand_dims(img_array, axis=0)
-    
-    # 4. Normalization (MATCHING TRAINING DATA)
-    # FIX: Do NOT divide by 255.0 here, because the notebook didn't.
-    img_array = img_array.astype("float32")
-    
-    # Apply the (x - mean) / sqrt(variance) formula used in training
-    # mean=0.5, variance=0.25 -> std_dev=0.5
-    img_array = (img_array - 0.5) / 0.5
-    
-    return img_array, img
+def storage_path_from_url(public_url):
+    """Recovers the 'mammo-scans' object path from its public URL."""
+    if not public_url or "mammo-scans/" not in public_url:
+        return None
+    # e.g. .../mammo-scans/userid/file.jpg?t=... -> userid/file.jpg
+    return public_url.split("mammo-scans/")[1].split("?")[0]
 
-def preprocess_ultrasound(image_bytes):
+def upload_derivatives(storage_path, pixels):
     """
-    Converts raw bytes -> RGB -> Resized (128x128) -> Normalized (0 to 1)
+    Uploads the preview/thumbnail for an already-decoded image next to the
+    original at storage_path. Returns ({"preview_url": ..., "thumbnail_url": ...},
+    [uploaded paths]); a failed derivative is simply left out so the scan
+    itself still saves.
     """
-    nparr = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR) # Keep RGB
-    
-    if img is None:
-        raise ValueError("Could not decode image")
-        
-    img_resized = cv2.resize(img, (128, 128))
-    img_norm = img_resized / 255.0 # Normalize to [0, 1]
-    img_input = np.expand_dims(img_norm, axis=0) # Add batch dim
-    
-    return img_input, img_resized
+    urls = {}
+    paths = []
+    stem = storage_path.rsplit('.', 1)[0]
+    try:
+        with tracing.span("encode_derivatives"):
+            derivatives = make_derivatives(pixels)
+    except Exception as e:
+        print(f"Derivative Error: {e}")
+        return urls, paths
+
+    for name, (data, ext, content_type) in derivatives.items():
+        derived_path = f"{stem}_{name}.{ext}"
+        try:
+            with tracing.span("storage_upload", object=name, bytes=len(data)):
+                supabase.storage.from_("mammo-scans").upload(
+                    path=derived_path,
+                    file=data,
+                    file_options={"content-type": content_type}
+                )
+                urls[f"{name}_url"] = supabase.storage.from_("mammo-scans").get_public_url(derived_path)
+            paths.append(derived_path)
+        except Exception as storage_err:
+            print(f"Storage Error ({name}): {storage_err}")
+    return urls, paths
+
+
+# Columns holding public URLs of objects stored for a scan
+SCAN_STORAGE_COLUMNS = ("original_image_url", "preview_url", "thumbnail_url")
+
+def scan_storage_paths(scan):
+    """Every 'mammo-scans' object belonging to a scan row."""
+    if scan.get("storage_paths"):
+        return list(scan["storage_paths"])
+    # Rows written before storage_paths existed only have public URLs
+    paths = [storage_path_from_url(scan.get(column)) for column in SCAN_STORAGE_COLUMNS]
+    return [path for path in paths if path]
+
+
+# --- Scan History Pagination ---
+
+# Columns a client may ask for via ?fields=. id and created_at are always
+# returned because the keyset cursor is built from them.
+SCAN_FIELDS = {
+    "id", "created_at", "prediction_label", "confidence_score",
+    "original_image_url", "annotated_image_url", "scan_type",
+    "thumbnail_url", "preview_url", "model_version",
+}
+SCAN_PAGE_DEFAULT = 20
+SCAN_PAGE_MAX = 100
+
+def encode_scan_cursor(row):
+    payload = json.dumps({"created_at": row["created_at"], "id": row["id"]})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def decode_scan_cursor(cursor):
+    payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    created_at, scan_id = str(payload["created_at"]), str(uuid.UUID(payload["id"]))
+    # The timestamp is interpolated into a PostgREST filter, so refuse anything
+    # that could escape its quoting.
+    if any(ch in created_at for ch in '"\\,()'):
+        raise ValueError("Malformed cursor timestamp")
+    return created_at, scan_id
 
 
 # ... health check ...
@@ -200,31 +351,133 @@ def health_check():
     return jsonify({
         "status": "healthy", 
         "models_status": {
-            "mammogram": "Active" if model else "Inactive",
-            "ultrasound": "Active" if ultrasound_model else "Inactive"
+            "mammogram": "Active" if model_registry.get("vit") else "Inactive",
+            "mammogram_vgg16": "Active" if model_registry.get("vgg16") else "Inactive",
+            "ultrasound": "Active" if model_registry.get("unet") else "Inactive"
+        },
+        "model_versions": {
+            name: handle.version for name, handle in model_registry.handles.items()
         }
     })
 
+# --- MODEL ADMIN ---
+@app.route('/admin/models', methods=['GET'])
+def list_models():
+    error = authenticate_admin()
+    if error:
+        return error
+    return jsonify(model_registry.status())
+
+@app.route('/admin/models/reload', methods=['POST'])
+def reload_models():
+    """
+    Loads a model version in the background and swaps it in once warm.
+    Body: {"model": "vit", "version": "2026-10-01"} activates that version in
+    the manifest (other workers follow via their watchers); an empty body
+    re-syncs every model with the manifest.
+    """
+    error = authenticate_admin()
+    if error:
+        return error
+
+    body = request.get_json(silent=True) or {}
+    name = body.get("model")
+    version = body.get("version")
+    if name is None:
+        model_registry.load_in_background()
+        return jsonify({"status": "syncing"}), 202
+    if name not in model_registry.specs:
+        return jsonify({"error": f"Unknown model '{name}'"}), 400
+
+    if version:
+        try:
+            model_registry.activate(name, version)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    model_registry.load_in_background(name, version)
+    return jsonify({"status": "loading", "model": name, "version": version}), 202
+
+@app.route('/admin/shadow', methods=['GET'])
+def shadow_summary():
+    """Agreement and latency of shadow candidates against production."""
+    error = authenticate_admin()
+    if error:
+        return error
+    return jsonify(shadow_runner.summary())
+
+@app.route('/admin/admission', methods=['GET'])
+def admission_stats():
+    """In-flight requests, inference-time estimates and shed counts per route, plus the decode budget."""
+    error = authenticate_admin()
+    if error:
+        return error
+    return jsonify({**admission.stats(), "decode": decode_limiter.stats()})
+
+@app.route('/admin/profile', methods=['POST'])
+def start_profile():
+    """
+    Profiles inference in this worker. Body: {"requests": 20} captures the
+    next 20 inference requests, {"seconds": 10} the next 10 seconds;
+    optional "sample_interval_ms" for the Python sampler (default 5).
+    Returns the directory the trace is written to; GET shows progress.
+    """
+    error = authenticate_admin()
+    if error:
+        return error
+
+    body = request.get_json(silent=True) or {}
+    try:
+        requests_count = int(body["requests"]) if body.get("requests") is not None else None
+        seconds = float(body["seconds"]) if body.get("seconds") is not None else None
+        interval = float(body.get("sample_interval_ms", 5)) / 1000
+    except (TypeError, ValueError):
+        return jsonify({"error": "requests, seconds and sample_interval_ms must be numbers"}), 400
+    if (requests_count is None) == (seconds is None):
+        return jsonify({"error": "Give exactly one of 'requests' or 'seconds'"}), 400
+    if requests_count is not None and not 1 <= requests_count <= 1000:
+        return jsonify({"error": "requests must be between 1 and 1000"}), 400
+    if seconds is not None and not 0 < seconds <= profile_capture.max_seconds:
+        return jsonify({"error": f"seconds must be in (0, {profile_capture.max_seconds:g}]"}), 400
+    if not 0.001 <= interval <= 1:
+        return jsonify({"error": "sample_interval_ms must be between 1 and 1000"}), 400
+
+    try:
+        capture = profile_capture.arm(requests=requests_count, seconds=seconds, sample_interval=interval)
+    except RuntimeError as e:
+        return jsonify({"error": str(e), "capture": profile_capture.status()}), 409
+    if capture["status"] == "failed":
+        return jsonify({"error": capture["error"]}), 500
+    return jsonify(capture), 202
+
+@app.route('/admin/profile', methods=['GET'])
+def profile_status():
+    """The current or most recent capture in this worker."""
+    error = authenticate_admin()
+    if error:
+        return error
+    return jsonify(profile_capture.status())
+
+@app.route('/admin/profile', methods=['DELETE'])
+def stop_profile():
+    """Ends the current capture early, keeping what it recorded so far."""
+    error = authenticate_admin()
+    if error:
+        return error
+    profile_capture.stop("stopped by admin")
+    return jsonify(profile_capture.status())
+
 @app.route('/predict', methods=['POST'])
 def predict():
     # ... checks ...
-    if not model:
+    # Pin the served versions for the whole request (a reload may swap them)
+    vit = model_registry.get("vit")
+    vgg = model_registry.get("vgg16")
+    if not vit:
          return jsonify({"error": "Model not loaded"}), 500
 
-    # ... auth checks (same as before) ...
-    # Verify Auth
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({"error": "Missing Authorization header"}), 401
-    
-    token = auth_header.split(" ")[1]
-    
-    try:
-        user_response = supabase.auth.get_user(token)
-        user_id = user_response.user.id
-    except Exception as e:
-        print(f"Auth error: {e}")
-        return jsonify({"error": "Invalid token"}), 401
+    user_id, error = authenticate_request()
+    if error:
+        return error
 
     if 'file' not in request.files:
         return jsonify({"error": "No file part"}), 400
@@ -234,17 +487,43 @@ def predict():
         return jsonify({"error": "No selected file"}), 400
 
     try:
-        file_bytes = file.read()
+        with tracing.span("read_upload") as upload_span:
+            file_bytes = file.read()
+            upload_span.set(bytes=len(file_bytes))
         filename = secure_filename(file.filename)
         
-        # Preprocess for ViT
-        processed_img, original_pil = preprocess_image(file_bytes)
+        # Preprocess for ViT (the decoded image is reused for every model)
+        with decode_limiter.reserve(file_bytes, decode_budget.GRAY_OUTPUT):
+            processed_img, original_pil = preprocess_image(file_bytes)
         
         # Predict
-        logits = model.predict(processed_img) # Model returns logits
-        
-        # Apply Softmax to get probabilities (since from_logits=True was used)
-        probabilities = keras.ops.softmax(logits).numpy()[0]
+        mode = request.values.get('mode', PREDICT_MODE)
+        ensemble_members = None
+        inference_started = time.perf_counter()
+        with tracing.span("inference", mode=mode) as inference_span:
+            if mode == "ensemble" and vgg:
+                # Start the ViT first, then build the 150x150 RGB input from the
+                # same decoded image while it runs
+                futures = {"vit": ensemble_scorer.submit("vit", vit_probabilities, vit.model, processed_img)}
+                vgg_input = input_buffers.get((1, VGG_INPUT_SIZE, VGG_INPUT_SIZE, 3))
+                vgg_input_into(original_pil, vgg_input[0])
+                futures["vgg16"] = ensemble_scorer.submit("vgg16", vgg_probabilities, vgg.model, vgg_input)
+                probabilities, ensemble_members = ensemble_scorer.combine(futures)
+                model_version = f"{vit.label}+{vgg.label}"
+            else:
+                probabilities = vit_probabilities(vit.model, processed_img)
+                model_version = vit.label
+            inference_span.set(model_version=model_version)
+        inference_ms = (time.perf_counter() - inference_started) * 1000
+        admission.record_inference("/predict", inference_ms / 1000)
+
+        shadow = model_registry.get("vit_shadow")
+        if shadow:
+            # Compare against the production ViT itself, not the ensemble blend
+            shadow_runner.submit(
+                "vit", shadow, processed_img, vit.label,
+                ensemble_members["vit"] if ensemble_members else probabilities, inference_ms
+            )
         
         prob_benign = float(probabilities[0])
         prob_malignant = float(probabilities[1])
@@ -265,13 +544,14 @@ def predict():
         
         # Reset file pointer or use bytes
         try:
-            res = supabase.storage.from_("mammo-scans").upload(
-                path=storage_path,
-                file=file_bytes,
-                file_options={"content-type": file.content_type}
-            )
-            # Get Public URL
-            public_url_res = supabase.storage.from_("mammo-scans").get_public_url(storage_path)
+            with tracing.span("storage_upload", bytes=len(file_bytes)):
+                res = supabase.storage.from_("mammo-scans").upload(
+                    path=storage_path,
+                    file=file_bytes,
+                    file_options={"content-type": file.content_type}
+                )
+                # Get Public URL
+                public_url_res = supabase.storage.from_("mammo-scans").get_public_url(storage_path)
             # Depending on supabase version, get_public_url might return string or string inside logic
             # Usually it returns the URL string directly
             image_url = public_url_res
@@ -284,7 +564,12 @@ def predict():
             image_url = ""
             print("Ensure 'mammo-scans' bucket exists and is public.")
 
-        # 2. Save to Database
+        # 2. Thumbnail + preview from the pixels we already decoded
+        derived_urls, derived_paths = {}, []
+        if image_url:
+            derived_urls, derived_paths = upload_derivatives(storage_path, np.asarray(original_pil))
+
+        # 3. Save to Database
         if image_url:
             db_data = {
                 "user_id": user_id,
@@ -292,17 +577,35 @@ def predict():
                 "prediction_label": label,
                 "confidence_score": confidence,
                 "annotated_image_url": image_url, # For now same as original
-                "scan_type": "mammogram"
+                "scan_type": "mammogram",
+                "model_version": model_version,
+                "storage_paths": [storage_path] + derived_paths,
+                **derived_urls
             }
-            db_res = supabase.table("scans").insert(db_data).execute()
+            with tracing.span("db_insert"):
+                db_res = supabase.table("scans").insert(db_data).execute()
+            if HEATMAP_PRECOMPUTE and db_res.data:
+                # Best effort: skipped when the worker is backed up, and the
+                # on-demand endpoint computes it later instead
+                scan = db_res.data[0]
+                heatmap_worker.submit(scan["id"], {"scan": scan, "gray": original_pil}, block=False)
         
         return jsonify({
             "prediction": label,
             "confidence": confidence,
             "image_url": image_url,
-            "raw_output": probabilities.tolist()
+            "thumbnail_url": derived_urls.get("thumbnail_url", ""),
+            "preview_url": derived_urls.get("preview_url", ""),
+            "raw_output": probabilities.tolist(),
+            "model_version": model_version,
+            **({"ensemble": {
+                "weights": {name: ensemble_scorer.weights.get(name, 0.0) for name in ensemble_members},
+                "members": {name: probs.tolist() for name, probs in ensemble_members.items()}
+            }} if ensemble_members else {})
         })
 
+    except DECODE_ERRORS as e:
+        return decode_error_response(e)
     except Exception as e:
         print(f"Error processing: {e}")
         import traceback
@@ -311,22 +614,12 @@ def predict():
 
 @app.route('/scans/<scan_id>', methods=['DELETE'])
 def delete_scan(scan_id):
-    if not model:
+    if not model_registry.get("vit"):
          return jsonify({"error": "Model not loaded"}), 500
 
-    # Verify Auth
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({"error": "Missing Authorization header"}), 401
-    
-    token = auth_header.split(" ")[1]
-    
-    try:
-        user_response = supabase.auth.get_user(token)
-        user_id = user_response.user.id
-    except Exception as e:
-        print(f"Auth error: {e}")
-        return jsonify({"error": "Invalid token"}), 401
+    user_id, error = authenticate_request()
+    if error:
+        return error
 
     try:
         # 1. Fetch scan to get storage path
@@ -340,18 +633,11 @@ def delete_scan(scan_id):
         if scan.get('user_id') != user_id:
              return jsonify({"error": "Unauthorized"}), 403
 
-        # 2. Delete from Storage
-        original_url = scan.get('original_image_url')
-        if original_url:
-            if "mammo-scans/" in original_url:
-                # Extract path after mammo-scans/
-                # e.g. .../mammo-scans/userid/file.jpg
-                # We need userid/file.jpg
-                storage_path = original_url.split("mammo-scans/")[1]
-                storage_path = storage_path.split("?")[0]
-                
-                print(f"Deleting file: {storage_path}")
-                supabase.storage.from_("mammo-scans").remove([storage_path])
+        # 2. Delete from Storage (original plus any derived images)
+        storage_paths = scan_storage_paths(scan)
+        if storage_paths:
+            print(f"Deleting files: {storage_paths}")
+            supabase.storage.from_("mammo-scans").remove(storage_paths)
 
         # 3. Delete from Database
         supabase.table("scans").delete().eq("id", scan_id).execute()
@@ -362,25 +648,343 @@ def delete_scan(scan_id):
         print(f"Delete error: {e}")
         return jsonify({"error": str(e)}), 500
 
+# --- ViT HEATMAPS ---
+
+# Queue an attention-rollout overlay for every new mammogram scan
+HEATMAP_PRECOMPUTE = os.environ.get("HEATMAP_PRECOMPUTE", "0") == "1"
+# Seconds /scans/<id>/heatmap waits before answering 202 (still rendering)
+HEATMAP_WAIT = float(os.environ.get("HEATMAP_WAIT", 20))
+# Scans rendered per explainer pass
+HEATMAP_BATCH_SIZE = int(os.environ.get("HEATMAP_BATCH_SIZE", explain.DEFAULT_BATCH_SIZE))
+
+def heatmap_cached(scan):
+    annotated = scan.get("annotated_image_url")
+    return bool(annotated) and annotated != scan.get("original_image_url")
+
+def render_heatmaps(jobs):
+    """
+    HeatmapWorker batch callback. jobs: [(scan_id, {"scan": row, "gray": PIL or None})].
+    Runs one explainer pass for the whole batch, then uploads each overlay
+    and points the scan's annotated_image_url at it.
+    """
+    vit = model_registry.get("vit")
+    if not vit:
+        raise RuntimeError("Model not loaded")
+
+    batch = input_buffers.get((HEATMAP_BATCH_SIZE, VIT_INPUT_SIZE, VIT_INPUT_SIZE, 1))
+    ready = []  # (scan_id, scan, gray) for rows filled in batch
+    for scan_id, job in jobs:
+        scan = job["scan"]
+        try:
+            if job["gray"] is not None:
+                gray = job["gray"]
+                vit_input_into(gray, batch[len(ready), :, :, 0])
+            else:
+                original_path = storage_path_from_url(scan.get("original_image_url"))
+                file_bytes = supabase.storage.from_("mammo-scans").download(original_path)
+                with decode_limiter.reserve(file_bytes, decode_budget.GRAY_OUTPUT):
+                    _, gray = preprocess_image(file_bytes, out=batch[len(ready):len(ready) + 1])
+            ready.append((scan_id, scan, gray))
+        except Exception as e:
+            print(f"Heatmap input error ({scan_id}): {e}")
+
+    if not ready:
+        return {}
+    _, scores = explain.explainer_for(vit.model)(batch[:len(ready)])
+    relevance = explain.attention_rollout(scores)
+
+    results = {}
+    for (scan_id, scan, gray), scan_relevance in zip(ready, relevance):
+        try:
+            overlay = explain.heatmap_overlay(gray, scan_relevance)
+            data, ext, content_type = encode_image(overlay)
+            stem = storage_path_from_url(scan.get("original_image_url")).rsplit('.', 1)[0]
+            heatmap_path = f"{stem}_heatmap.{ext}"
+            supabase.storage.from_("mammo-scans").upload(
+                path=heatmap_path,
+                file=data,
+                file_options={"content-type": content_type, "upsert": "true"}
+            )
+            heatmap_url = supabase.storage.from_("mammo-scans").get_public_url(heatmap_path)
+            storage_paths = scan_storage_paths(scan)
+            if heatmap_path not in storage_paths:
+                storage_paths.append(heatmap_path)
+            supabase.table("scans").update({
+                "annotated_image_url": heatmap_url,
+                "storage_paths": storage_paths,
+            }).eq("id", scan_id).execute()
+            results[scan_id] = {"heatmap_url": heatmap_url, "model_version": vit.label}
+        except Exception as e:
+            print(f"Heatmap error ({scan_id}): {e}")
+    return results
+
+heatmap_worker = explain.HeatmapWorker(
+    render_heatmaps,
+    batch_size=HEATMAP_BATCH_SIZE,
+    batch_wait=float(os.environ.get("HEATMAP_BATCH_WAIT", explain.DEFAULT_BATCH_WAIT)),
+)
+
+@app.route('/scans/<scan_id>/heatmap', methods=['GET'])
+def scan_heatmap(scan_id):
+    """
+    Attention-rollout overlay for a mammogram scan, rendered on first
+    request and cached as the scan's annotated_image_url.
+    """
+    user_id, error = authenticate_request()
+    if error:
+        return error
+
+    try:
+        res = supabase.table("scans").select("*").eq("id", scan_id).execute()
+        if not res.data:
+            return jsonify({"error": "Scan not found or access denied"}), 404
+        scan = res.data[0]
+        if scan.get('user_id') != user_id:
+            return jsonify({"error": "Unauthorized"}), 403
+        if scan.get('scan_type') != "mammogram":
+            return jsonify({"error": "Heatmaps are only available for mammogram scans"}), 400
+
+        if heatmap_cached(scan):
+            return jsonify({"heatmap_url": scan["annotated_image_url"], "cached": True})
+
+        if not model_registry.get("vit"):
+            return jsonify({"error": "Model not loaded"}), 500
+
+        future = heatmap_worker.submit(scan_id, {"scan": scan, "gray": None})
+        try:
+            result = future.result(timeout=HEATMAP_WAIT)
+        except FutureTimeoutError:
+            return jsonify({"status": "pending"}), 202
+        return jsonify(dict(result, cached=False))
+
+    except Exception as e:
+        print(f"Heatmap error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+# Upper bound on ids per bulk delete request
+BULK_DELETE_MAX = 1000
+# Paths per storage remove() call
+STORAGE_REMOVE_BATCH = 1000
+
+@app.route('/scans', methods=['DELETE'])
+def bulk_delete_scans():
+    """
+    Deletes many scans in one request. Body: {"ids": ["<uuid>", ...]}.
+
+    Ownership is checked with one filtered select, storage objects for all
+    owned scans are removed in one batched call, and the rows are deleted in
+    one statement. Returns a per-id outcome: deleted, not_found, invalid_id.
+    """
+    if not supabase:
+        return jsonify({"error": "Database not configured"}), 500
+
+    user_id, error = authenticate_request()
+    if error:
+        return error
+
+    body = request.get_json(silent=True) or {}
+    ids = body.get("ids")
+    if not isinstance(ids, list) or not ids:
+        return jsonify({"error": "Body must be {\"ids\": [...]} with at least one id"}), 400
+    if len(ids) > BULK_DELETE_MAX:
+        return jsonify({"error": f"At most {BULK_DELETE_MAX} ids per request"}), 400
+
+    results = {}
+    valid_ids = []
+    for scan_id in ids:
+        try:
+            valid_ids.append(str(uuid.UUID(str(scan_id))))
+        except ValueError:
+            results[str(scan_id)] = "invalid_id"
+    valid_ids = list(dict.fromkeys(valid_ids))
+
+    try:
+        owned = []
+        if valid_ids:
+            # 1. One query: only rows that exist AND belong to the caller
+            res = (
+                supabase.table("scans")
+                .select(",".join(("id", "storage_paths") + SCAN_STORAGE_COLUMNS))
+                .in_("id", valid_ids)
+                .eq("user_id", user_id)
+                .execute()
+            )
+            owned = res.data or []
+
+        owned_ids = [scan["id"] for scan in owned]
+        for scan_id in valid_ids:
+            # Someone else's scan is reported exactly like a missing one
+            results[scan_id] = "not_found"
+
+        if owned_ids:
+            # 2. Batched storage removal. A failure here leaves orphans for the
+            # storage GC rather than blocking the delete.
+            storage_paths = [path for scan in owned for path in scan_storage_paths(scan)]
+            for start in range(0, len(storage_paths), STORAGE_REMOVE_BATCH):
+                batch = storage_paths[start:start + STORAGE_REMOVE_BATCH]
+                try:
+                    supabase.storage.from_("mammo-scans").remove(batch)
+                except Exception as storage_err:
+                    print(f"Bulk storage delete error: {storage_err}")
+
+            # 3. One statement for all rows
+            supabase.table("scans").delete().in_("id", owned_ids).eq("user_id", user_id).execute()
+            for scan_id in owned_ids:
+                results[scan_id] = "deleted"
+
+        return jsonify({
+            "deleted": len(owned_ids),
+            "results": results
+        })
+
+    except Exception as e:
+        print(f"Bulk delete error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/scans', methods=['GET'])
+def list_scans():
+    """
+    Keyset-paginated scan history for the calling user, newest first.
+
+    Query params:
+      limit            page size (default 20, max 100)
+      cursor           opaque cursor from the previous page's next_cursor
+      fields           comma-separated column projection
+      scan_type        'mammogram' (including legacy rows without a type) / 'ultrasound'
+      prediction_label exact-match filter
+    """
+    if not supabase:
+        return jsonify({"error": "Database not configured"}), 500
+
+    user_id, error = authenticate_request()
+    if error:
+        return error
+
+    try:
+        limit = int(request.args.get('limit', SCAN_PAGE_DEFAULT))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    limit = max(1, min(limit, SCAN_PAGE_MAX))
+
+    fields = request.args.get('fields')
+    if fields:
+        requested = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = requested - SCAN_FIELDS
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(sorted(unknown))}"}), 400
+        columns = requested | {"id", "created_at"}
+    else:
+        columns = SCAN_FIELDS
+
+    try:
+        # Matches the (user_id, created_at desc, id desc) index, so every page
+        # is an index range scan regardless of how deep the user has paged.
+        query = (
+            supabase.table("scans")
+            .select(",".join(sorted(columns)))
+            .eq("user_id", user_id)
+        )
+
+        # Logic-tree conditions, sent as one and() so they can't be split
+        # across several or= parameters
+        conditions = []
+        scan_type = request.args.get('scan_type')
+        if scan_type == "mammogram":
+            # Rows from before scan_type existed are mammograms (as in scan_stats)
+            conditions.append("or(scan_type.eq.mammogram,scan_type.is.null)")
+        elif scan_type:
+            query = query.eq("scan_type", scan_type)
+        prediction_label = request.args.get('prediction_label')
+        if prediction_label:
+            query = query.eq("prediction_label", prediction_label)
+
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                created_at, last_id = decode_scan_cursor(cursor)
+            except Exception:
+                return jsonify({"error": "Invalid cursor"}), 400
+            # (created_at, id) < (cursor.created_at, cursor.id). The redundant
+            # lte bound is what lets Postgres start the index scan at the
+            # cursor; the or() only trims rows sharing the cursor timestamp.
+            query = query.lte("created_at", created_at)
+            conditions.append(
+                f'or(created_at.lt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.lt.{last_id}))'
+            )
+        if conditions:
+            query = query.or_(f"and({','.join(conditions)})")
+
+        # Fetch one extra row to learn whether another page exists
+        res = (
+            query.order("created_at", desc=True)
+            .order("id", desc=True)
+            .limit(limit + 1)
+            .execute()
+        )
+        rows = res.data or []
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_scan_cursor(rows[-1])
+
+        return jsonify({"scans": rows, "next_cursor": next_cursor})
+
+    except Exception as e:
+        print(f"List scans error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+STAT_COUNTERS = (
+    "total_scans", "mammogram_scans", "ultrasound_scans",
+    "malignant_count", "benign_count", "abnormality_count",
+    "high_confidence_count", "medium_confidence_count", "low_confidence_count",
+)
+
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    """
+    Dashboard counters for the calling user, read from the scan_stats row the
+    scans triggers maintain (see schema.sql) instead of the full history.
+    """
+    if not supabase:
+        return jsonify({"error": "Database not configured"}), 500
+
+    user_id, error = authenticate_request()
+    if error:
+        return error
+
+    try:
+        res = (
+            supabase.table("scan_stats")
+            .select(",".join(STAT_COUNTERS + ("confidence_sum", "updated_at")))
+            .eq("user_id", user_id)
+            .limit(1)
+            .execute()
+        )
+        row = res.data[0] if res.data else {}
+
+        stats = {counter: int(row.get(counter) or 0) for counter in STAT_COUNTERS}
+        total = stats["total_scans"]
+        stats["avg_confidence"] = (float(row.get("confidence_sum") or 0) / total) if total else 0.0
+        stats["updated_at"] = row.get("updated_at")
+
+        return jsonify(stats)
+
+    except Exception as e:
+        print(f"Stats error: {e}")
+        return jsonify({"error": str(e)}), 500
+
 # --- ULTRASOUND PREDICTION ---
 @app.route('/ultrasound', methods=['POST'])
 def predict_ultrasound():
-    if not ultrasound_model:
+    unet = model_registry.get("unet")
+    if not unet:
         return jsonify({"error": "Ultrasound model is not active on the server."}), 503
 
-    # Verify Auth
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({"error": "Missing Authorization header"}), 401
-    
-    token = auth_header.split(" ")[1]
-    
-    try:
-        user_response = supabase.auth.get_user(token)
-        user_id = user_response.user.id
-    except Exception as e:
-        print(f"Auth error: {e}")
-        return jsonify({"error": "Invalid token"}), 401
+    user_id, error = authenticate_request()
+    if error:
+        return error
 
     if 'file' not in request.files:
         return jsonify({"error": "No file uploaded"}), 400
@@ -390,27 +994,32 @@ def predict_ultrasound():
         return jsonify({"error": "No selected file"}), 400
 
     try:
-        file_bytes = file.read()
+        with tracing.span("read_upload") as upload_span:
+            file_bytes = file.read()
+            upload_span.set(bytes=len(file_bytes))
         filename = secure_filename(file.filename)
         
         # 1. Preprocess
-        input_tensor, original_img = preprocess_ultrasound(file_bytes)
+        with decode_limiter.reserve(file_bytes, decode_budget.BGR_OUTPUT, decoder="cv2"):
+            input_tensor, original_img = preprocess_ultrasound(file_bytes)
         
         # 2. Predict (Segmentation Map)
-        pred_mask = ultrasound_model.predict(input_tensor)
-        
-        # 3. Post-Process Mask
-        # Threshold at 0.5 (Pixels > 0.5 are tumor)
-        mask = (pred_mask > 0.5).astype(np.uint8) * 255
-        mask_2d = mask[0, :, :, 0] # Remove extra dims to get 128x128 image
-        
-        # 4. Check Diagnosis
-        has_tumor = np.sum(mask_2d) > 0 # If any white pixels exist, tumor is found
-        confidence = float(np.max(pred_mask)) # Max probability in the map
+        inference_started = time.perf_counter()
+        with tracing.span("inference", model_version=unet.label):
+            pred_mask = unet.model.predict(input_tensor)
+        inference_ms = (time.perf_counter() - inference_started) * 1000
+        admission.record_inference("/ultrasound", inference_ms / 1000)
+
+        shadow = model_registry.get("unet_shadow")
+        if shadow:
+            shadow_runner.submit("unet", shadow, input_tensor, unet.label, pred_mask[0, :, :, 0], inference_ms)
         
-        # 5. Convert Mask to Base64 (For frontend display)
-        _, buffer = cv2.imencode('.png', mask_2d)
-        mask_base64 = base64.b64encode(buffer).decode('utf-8')
+        with tracing.span("mask_encode"):
+            # 3-4. Post-Process Mask and Check Diagnosis
+            mask_2d, has_tumor, confidence = postprocess_mask(pred_mask)
+
+            # 5. Convert Mask to Base64 (For frontend display)
+            mask_base64 = mask_png_base64(mask_2d)
 
         label = "Potential Abnormality Detected" if has_tumor else "No Abnormality Detected"
         
@@ -424,18 +1033,23 @@ def predict_ultrasound():
             storage_path = f"{user_id}/ultrasound_{unique_id}.{file_ext}"
             
             try:
-                res = supabase.storage.from_("mammo-scans").upload(
-                    path=storage_path,
-                    file=file_bytes,
-                    file_options={"content-type": file.content_type}
-                )
-                public_url_res = supabase.storage.from_("mammo-scans").get_public_url(storage_path)
+                with tracing.span("storage_upload", bytes=len(file_bytes)):
+                    res = supabase.storage.from_("mammo-scans").upload(
+                        path=storage_path,
+                        file=file_bytes,
+                        file_options={"content-type": file.content_type}
+                    )
+                    public_url_res = supabase.storage.from_("mammo-scans").get_public_url(storage_path)
                 image_url = public_url_res
                 
             except Exception as storage_err:
                 print(f"Storage Error (Ultrasound): {storage_err}")
                 image_url = ""
 
+        derived_urls, derived_paths = {}, []
+        if image_url:
+            derived_urls, derived_paths = upload_derivatives(storage_path, original_img)
+
         # 7. Save to Database
         if image_url:
             db_data = {
@@ -444,9 +1058,13 @@ def predict_ultrasound():
                 "prediction_label": label,
                 "confidence_score": confidence,
                 "annotated_image_url": image_url, 
-                "scan_type": "ultrasound"
+                "scan_type": "ultrasound",
+                "model_version": unet.label,
+                "storage_paths": [storage_path] + derived_paths,
+                **derived_urls
             }
-            db_res = supabase.table("scans").insert(db_data).execute()
+            with tracing.span("db_insert"):
+                db_res = supabase.table("scans").insert(db_data).execute()
 
         return jsonify({
             "type": "ultrasound",
@@ -455,15 +1073,159 @@ def predict_ultrasound():
             "tumor_detected": bool(has_tumor),
             "confidence": confidence,
             "mask_image": f"data:image/png;base64,{mask_base64}",
-            "image_url": image_url
+            "image_url": image_url,
+            "thumbnail_url": derived_urls.get("thumbnail_url", ""),
+            "preview_url": derived_urls.get("preview_url", ""),
+            "model_version": unet.label
         })
 
+    except DECODE_ERRORS as e:
+        return decode_error_response(e)
     except Exception as e:
         print(f"Ultrasound Error: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+# --- ULTRASOUND CINE LOOP ---
+@app.route('/ultrasound/cine', methods=['POST'])
+def predict_ultrasound_cine():
+    """
+    Segments every (distinct) frame of a cine loop. Send either one video as
+    'file' or several still frames as 'frames'. Optional form fields:
+      skip_similar  '0' to analyse every frame (default: skip near-repeats)
+      batch_size    U-Net batch size (default 32)
+    """
+    unet = model_registry.get("unet")
+    if not unet:
+        return jsonify({"error": "Ultrasound model is not active on the server."}), 503
+
+    user_id, error = authenticate_request()
+    if error:
+        return error
+
+    video = request.files.get('file')
+    stills = [f for f in request.files.getlist('frames') if f.filename]
+    if not stills and (not video or video.filename == ''):
+        return jsonify({"error": "Upload a video as 'file' or images as 'frames'"}), 400
+
+    max_frames = int(os.environ.get("CINE_MAX_FRAMES", cine.DEFAULT_MAX_FRAMES))
+    if len(stills) > max_frames:
+        return jsonify({"error": f"At most {max_frames} frames per request"}), 400
+
+    try:
+        batch_size = max(1, min(int(request.form.get('batch_size', cine.DEFAULT_BATCH_SIZE)), 128))
+    except ValueError:
+        return jsonify({"error": "batch_size must be an integer"}), 400
+    diff_threshold = 0 if request.form.get('skip_similar') == '0' else float(
+        os.environ.get("CINE_DIFF_THRESHOLD", cine.DEFAULT_DIFF_THRESHOLD)
+    )
+
+    video_path = None
+    try:
+        if stills:
+            frames = cine.iter_image_frames(stills, decode_limiter)
+        else:
+            # VideoCapture needs a path; stream the upload to disk rather than into memory
+            suffix = os.path.splitext(secure_filename(video.filename))[1] or '.mp4'
+            with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+                video.save(tmp)
+                video_path = tmp.name
+            frames = cine.iter_video_frames(video_path)
+
+        # Counting wrapper so we can report how many frames were decoded
+        decoded = [0]
+        def counted(frames):
+            for frame in frames:
+                decoded[0] += 1
+                yield frame
+
+        # Frames are decoded lazily, so this span covers decode, selection and inference
+        inference_started = time.perf_counter()
+        with tracing.span("inference", model_version=unet.label, batch_size=batch_size) as inference_span:
+            selected = cine.select_frames(counted(frames), diff_threshold, max_frames)
+            result = cine.segment_frames(unet.model, selected, batch_size)
+            inference_span.set(frames_decoded=decoded[0], frames_analyzed=len(result.frames))
+        admission.record_inference("/ultrasound/cine", time.perf_counter() - inference_started)
+
+        if not result.frames:
+            return jsonify({"error": "No frames could be decoded"}), 400
+
+        _, best_confidence, best_index, best_frame, best_mask = result.best
+        with tracing.span("mask_encode"):
+            mask_base64 = mask_png_base64(best_mask)
+
+        has_tumor = result.tumor_detected
+        label = "Potential Abnormality Detected" if has_tumor else "No Abnormality Detected"
+
+        # Save the best frame as the scan image, like a single-image upload
+        image_url = ""
+        derived_urls, derived_paths = {}, []
+        if supabase:
+            unique_id = str(uuid.uuid4())
+            storage_path = f"{user_id}/ultrasound_cine_{unique_id}.png"
+            try:
+                _, frame_png = cv2.imencode('.png', best_frame)
+                with tracing.span("storage_upload", bytes=len(frame_png)):
+                    supabase.storage.from_("mammo-scans").upload(
+                        path=storage_path,
+                        file=frame_png.tobytes(),
+                        file_options={"content-type": "image/png"}
+                    )
+                    image_url = supabase.storage.from_("mammo-scans").get_public_url(storage_path)
+                derived_urls, derived_paths = upload_derivatives(storage_path, best_frame)
+            except Exception as storage_err:
+                print(f"Storage Error (Cine): {storage_err}")
+                image_url = ""
+
+        if image_url:
+            db_data = {
+                "user_id": user_id,
+                "original_image_url": image_url,
+                "prediction_label": label,
+                "confidence_score": best_confidence,
+                "annotated_image_url": image_url,
+                "scan_type": "ultrasound",
+                "model_version": unet.label,
+                "storage_paths": [storage_path] + derived_paths,
+                **derived_urls
+            }
+            with tracing.span("db_insert"):
+                supabase.table("scans").insert(db_data).execute()
+
+        return jsonify({
+            "type": "ultrasound_cine",
+            "prediction": label,
+            "diagnosis": label,
+            "tumor_detected": bool(has_tumor),
+            "confidence": best_confidence,
+            "frames_decoded": decoded[0],
+            "frames_analyzed": len(result.frames),
+            "frames": result.frames,
+            "best_frame": {
+                "index": best_index,
+                "confidence": best_confidence,
+                "mask_image": f"data:image/png;base64,{mask_base64}"
+            },
+            "image_url": image_url,
+            "thumbnail_url": derived_urls.get("thumbnail_url", ""),
+            "preview_url": derived_urls.get("preview_url", ""),
+            "model_version": unet.label
+        })
+
+    except DECODE_ERRORS as e:
+        return decode_error_response(e)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Cine Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if video_path:
+            os.remove(video_path)
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port)
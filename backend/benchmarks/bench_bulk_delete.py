@@ -0,0 +1,91 @@
+"""
+Bulk vs per-scan deletion benchmark.
+
+Boots app.py against the in-memory Supabase fake (with injected per-call
+latency) and, for each batch size, deletes N freshly seeded scans:
+
+  * single - N x DELETE /scans/<id> (select, storage remove, delete each)
+  * bulk   - one DELETE /scans with {"ids": [...]}
+
+Run from the backend directory:
+    python benchmarks/bench_bulk_delete.py --latency-ms 20 --sizes 10,100,1000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as backend  # noqa: E402
+from benchmarks.fake_supabase import FakeSupabase  # noqa: E402
+
+
+def seed(fake, user_id, count):
+    ids = []
+    for _ in range(count):
+        scan_id = str(uuid.uuid4())
+        row = {"id": scan_id, "user_id": user_id, "scan_type": "mammogram"}
+        for column, name in (("original_image_url", f"{scan_id}.jpg"),
+                             ("preview_url", f"{scan_id}_preview.webp"),
+                             ("thumbnail_url", f"{scan_id}_thumbnail.webp")):
+            path = f"{user_id}/{name}"
+            fake.buckets.setdefault("mammo-scans", {})[path] = {"size": 1, "created_at": ""}
+            row[column] = fake.public_url("mammo-scans", path)
+        fake.tables.setdefault("scans", {})[scan_id] = row
+        ids.append(scan_id)
+    return ids
+
+
+def run(client, fake, token, ids, mode):
+    headers = {"Authorization": f"Bearer {token}"}
+    fake.round_trips = 0
+    started = time.perf_counter()
+    # Keep the routes' per-delete log lines out of the results table
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == "single":
+            for scan_id in ids:
+                res = client.delete(f"/scans/{scan_id}", headers=headers)
+                assert res.status_code == 200, res.get_json()
+        else:
+            res = client.delete("/scans", headers=headers, json={"ids": ids})
+            assert res.status_code == 200, res.get_json()
+            assert res.get_json()["deleted"] == len(ids)
+    elapsed = time.perf_counter() - started
+    assert not fake.tables["scans"], "rows left behind"
+    assert not fake.buckets["mammo-scans"], "objects left behind"
+    return elapsed, fake.round_trips
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency-ms", type=float, default=20.0,
+                        help="Injected latency per Supabase call")
+    parser.add_argument("--sizes", default="10,100,1000")
+    args = parser.parse_args()
+
+    fake = FakeSupabase(latency_ms=args.latency_ms)
+    backend.supabase = fake
+    # delete_scan() refuses to run without a loaded model; the benchmark
+    # only exercises the database/storage path.
+    if not backend.model_registry.get("vit"):
+        backend.model_registry.put("vit", "standin", object())
+    client = backend.app.test_client()
+    token = "bench-token"
+    user_id = fake.add_user(token)
+
+    print(f"Injected latency: {args.latency_ms:.0f} ms per Supabase call\n")
+    print(f"{'ids':>6}{'mode':>8}{'seconds':>10}{'round trips':>13}{'ms / id':>10}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        for mode in ("single", "bulk"):
+            ids = seed(fake, user_id, size)
+            elapsed, trips = run(client, fake, token, ids, mode)
+            print(f"{size:>6}{mode:>8}{elapsed:>10.2f}{trips:>13}{elapsed * 1000 / size:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+ViT + VGG16 ensemble latency benchmark.
+
+Boots app.py with randomly initialised models of the served architectures
+(weights don't affect latency) and the in-memory Supabase fake, then times:
+
+  * vit / vgg16   - each model alone, preprocessed input ready
+  * sequential    - ViT then VGG16 on the calling thread
+  * concurrent    - both submitted to their own pools (what /predict does)
+  * /predict      - end to end with mode=vit and mode=ensemble
+
+The interesting number is how much "concurrent" adds over the slower of
+the two single-model rows.
+
+Run from the backend directory:
+    python benchmarks/bench_ensemble.py --repeat 30
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as backend  # noqa: E402
+from benchmarks.common import measure, print_table  # noqa: E402
+from benchmarks.fake_supabase import FakeSupabase  # noqa: E402
+from benchmarks.standin_models import vgg16  # noqa: E402
+from preprocessing import VGG_INPUT_SIZE, preprocess_image, vgg_input_into  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    vit = backend.model_registry.put("vit", "bench", backend.create_vit_classifier()).model
+    vgg = backend.model_registry.put("vgg16", "bench", vgg16()).model
+    fake = FakeSupabase()
+    backend.supabase = fake
+    token = "bench-token"
+    fake.add_user(token)
+
+    rng = np.random.default_rng(0)
+    ok, encoded = cv2.imencode(".png", rng.integers(0, 256, (2048, 1536), dtype=np.uint8))
+    assert ok
+    image_bytes = encoded.tobytes()
+
+    vit_input, gray = preprocess_image(image_bytes)
+    vit_input = vit_input.copy()
+    vgg_input = np.empty((1, VGG_INPUT_SIZE, VGG_INPUT_SIZE, 3), np.float32)
+    vgg_input_into(gray, vgg_input[0])
+
+    scorer = backend.ensemble_scorer
+
+    def sequential():
+        return backend.vit_probabilities(vit, vit_input), backend.vgg_probabilities(vgg, vgg_input)
+
+    def concurrent():
+        return scorer.combine({
+            "vit": scorer.submit("vit", backend.vit_probabilities, vit, vit_input),
+            "vgg16": scorer.submit("vgg16", backend.vgg_probabilities, vgg, vgg_input),
+        })
+
+    client = backend.app.test_client()
+
+    def predict(mode):
+        def call():
+            # Keep the route's log lines out of the results table
+            with contextlib.redirect_stdout(io.StringIO()):
+                res = client.post(
+                    f"/predict?mode={mode}",
+                    headers={"Authorization": f"Bearer {token}"},
+                    data={"file": (io.BytesIO(image_bytes), "scan.png")},
+                    content_type="multipart/form-data",
+                )
+            assert res.status_code == 200, res.get_json()
+            assert ("ensemble" in res.get_json()) == (mode == "ensemble")
+        return call
+
+    rows = [
+        ("vit", measure(lambda: backend.vit_probabilities(vit, vit_input), repeat=args.repeat)),
+        ("vgg16", measure(lambda: backend.vgg_probabilities(vgg, vgg_input), repeat=args.repeat)),
+        ("sequential", measure(sequential, repeat=args.repeat)),
+        ("concurrent", measure(concurrent, repeat=args.repeat)),
+        ("/predict mode=vit", measure(predict("vit"), repeat=args.repeat)),
+        ("/predict mode=ensemble", measure(predict("ensemble"), repeat=args.repeat)),
+    ]
+    print_table(rows, columns=("p50_ms", "mean_ms", "min_ms"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Attention-rollout heatmap cost relative to plain ViT inference.
+
+Uses a randomly initialised ViT of the served architecture (weights don't
+affect latency) and the in-memory Supabase fake, and times:
+
+  * predict              - what /predict runs (model.predict, batch 1)
+  * explainer            - forward pass that also returns attention scores
+  * rollout              - attention_rollout over the 8 blocks
+  * overlay + encode     - heatmap blend at preview size and WebP encode
+  * render_heatmaps xN   - the worker's batch callback end to end (download,
+                           preprocess, explain, overlay, upload, row update)
+                           for batches of 1 and N scans; divide by N for the
+                           per-scan cost
+
+Run from the backend directory:
+    python benchmarks/bench_heatmap.py --batch 8
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as backend  # noqa: E402
+import explain  # noqa: E402
+from benchmarks.common import measure, print_table  # noqa: E402
+from benchmarks.fake_supabase import FakeSupabase  # noqa: E402
+from preprocessing import preprocess_image  # noqa: E402
+from thumbnails import encode_image  # noqa: E402
+
+
+def seed_scans(fake, user_id, image_bytes, count):
+    scans = []
+    for i in range(count):
+        path = f"{user_id}/bench_{i}.png"
+        fake.buckets.setdefault("mammo-scans", {})[path] = {"data": image_bytes, "size": len(image_bytes), "created_at": ""}
+        url = fake.public_url("mammo-scans", path)
+        scan = {"id": f"scan-{i}", "user_id": user_id, "scan_type": "mammogram",
+                "original_image_url": url, "annotated_image_url": url, "storage_paths": [path]}
+        fake.tables.setdefault("scans", {})[scan["id"]] = scan
+        scans.append(scan)
+    return scans
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    vit = backend.model_registry.put("vit", "bench", backend.create_vit_classifier()).model
+    backend.HEATMAP_BATCH_SIZE = max(args.batch, backend.HEATMAP_BATCH_SIZE)
+    fake = FakeSupabase()
+    backend.supabase = fake
+    user_id = fake.add_user("bench-token")
+
+    rng = np.random.default_rng(0)
+    # Smoothed noise: closer to a mammogram than raw noise, which is a
+    # worst case for the WebP encoder and would dominate every row
+    pixels = cv2.GaussianBlur(rng.integers(0, 256, (2048, 1536), dtype=np.uint8), (0, 0), 8)
+    ok, encoded = cv2.imencode(".png", pixels)
+    assert ok
+    image_bytes = encoded.tobytes()
+    vit_input, gray = preprocess_image(image_bytes)
+    vit_input = vit_input.copy()
+
+    explainer = explain.explainer_for(vit)
+    logits, scores = explainer(vit_input)
+    assert np.allclose(logits, vit.predict(vit_input, verbose=0), atol=1e-5)
+    relevance = explain.attention_rollout(scores)[0]
+
+    scans = seed_scans(fake, user_id, image_bytes, args.batch)
+
+    def render(count):
+        def call():
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = backend.render_heatmaps([(scan["id"], {"scan": scan, "gray": None}) for scan in scans[:count]])
+            assert len(results) == count
+        return call
+
+    rows = [
+        ("predict", measure(lambda: vit.predict(vit_input, verbose=0), repeat=args.repeat)),
+        ("explainer", measure(lambda: explainer(vit_input), repeat=args.repeat)),
+        ("rollout", measure(lambda: explain.attention_rollout(scores), repeat=args.repeat)),
+        ("overlay + encode", measure(lambda: encode_image(explain.heatmap_overlay(gray, relevance)), repeat=args.repeat)),
+        ("render_heatmaps x1", measure(render(1), repeat=args.repeat)),
+        (f"render_heatmaps x{args.batch}", measure(render(args.batch), repeat=max(3, args.repeat // 4))),
+    ]
+    print_table(rows, columns=("p50_ms", "mean_ms", "min_ms"))
+
+
+if __name__ == "__main__":
+    main()
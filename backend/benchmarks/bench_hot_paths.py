@@ -0,0 +1,158 @@
+"""
+Micro-benchmarks for the request hot paths, with baseline comparison.
+
+Cases (CPU, synthetic inputs, randomly initialised models of the served
+architectures):
+
+  preprocess_image / preprocess_ultrasound on
+    small.jpg   640x480 JPEG
+    4k.png      3840x2160 8-bit PNG
+    16bit.png   2560x2048 16-bit grayscale PNG (detector output)
+  vit forward           predict_on_batch at batch 1 / 8 / 32
+  vit serving           vit_probabilities (model.predict + softmax), batch 1
+  unet forward          predict_on_batch, batch 1
+  unet postprocess      postprocess_mask (threshold, diagnosis, confidence)
+  mask png + base64     mask_png_base64
+
+Each case reports p50 / min wall time and peak allocation per call (see
+common.measure). TensorFlow is pinned to --threads threads so numbers stay
+comparable between runs on the same machine.
+
+    python benchmarks/bench_hot_paths.py --save benchmarks/hot_paths_baseline.json
+    python benchmarks/bench_hot_paths.py --baseline benchmarks/hot_paths_baseline.json
+
+With --baseline, a case whose p50 (or allocation) grew by more than
+--tolerance is flagged and the script exits with status 1.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def configure_threads(threads):
+    # Must run before TensorFlow creates its thread pools
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    cv2.setNumThreads(threads)
+
+
+def synthetic_inputs(seed=0):
+    """{name: encoded bytes}, smoothed noise so codecs behave like on real scans."""
+    rng = np.random.default_rng(seed)
+
+    def smooth(shape, sigma, dtype=np.uint8, high=256):
+        noise = rng.integers(0, high, shape, dtype=dtype).astype(np.float32)
+        return cv2.GaussianBlur(noise, (0, 0), sigma).astype(dtype)
+
+    encoded = {}
+    ok, data = cv2.imencode(".jpg", smooth((480, 640, 3), 2), [cv2.IMWRITE_JPEG_QUALITY, 90])
+    assert ok
+    encoded["small.jpg"] = data.tobytes()
+    ok, data = cv2.imencode(".png", smooth((2160, 3840), 6))
+    assert ok
+    encoded["4k.png"] = data.tobytes()
+    ok, data = cv2.imencode(".png", smooth((2048, 2560), 6, np.uint16, 65536))
+    assert ok
+    encoded["16bit.png"] = data.tobytes()
+    return encoded
+
+
+def build_cases(backend, standin_models, inputs):
+    """[(name, fn, repeat)]"""
+    from preprocessing import preprocess_image, preprocess_ultrasound
+
+    cases = []
+    for name, data in inputs.items():
+        repeat = 50 if name == "small.jpg" else 10
+        cases.append((f"preprocess_image {name}", lambda data=data: preprocess_image(data), repeat))
+        cases.append((f"preprocess_ultrasound {name}", lambda data=data: preprocess_ultrasound(data), repeat))
+
+    rng = np.random.default_rng(1)
+    vit = backend.create_vit_classifier()
+    for batch in (1, 8, 32):
+        x = rng.standard_normal((batch, 224, 224, 1)).astype(np.float32)
+        cases.append((f"vit forward b{batch}", lambda x=x: vit.predict_on_batch(x), max(5, 40 // batch)))
+    vit_input = rng.standard_normal((1, 224, 224, 1)).astype(np.float32)
+    cases.append(("vit serving b1", lambda: backend.vit_probabilities(vit, vit_input), 20))
+
+    unet = standin_models.unet()
+    unet_input = rng.random((1, 128, 128, 3), dtype=np.float32)
+    cases.append(("unet forward b1", lambda: unet.predict_on_batch(unet_input), 20))
+    pred_mask = np.asarray(unet.predict_on_batch(unet_input))
+    cases.append(("unet postprocess", lambda: backend.postprocess_mask(pred_mask), 500))
+    mask_2d, _, _ = backend.postprocess_mask(pred_mask)
+    cases.append(("mask png + base64", lambda: backend.mask_png_base64(mask_2d), 500))
+    return cases
+
+
+def compare(results, baseline, tolerance, noise_ms=0.05, noise_kb=16):
+    """Returns [(case, metric, old, new)] for regressions beyond tolerance."""
+    regressions = []
+    for name, stats in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        for metric, floor in (("p50_ms", noise_ms), ("alloc_peak_kb", noise_kb)):
+            old, new = before[metric], stats[metric]
+            if new > old * (1 + tolerance) and new - old > floor:
+                regressions.append((name, metric, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot-path micro-benchmarks")
+    parser.add_argument("--threads", type=int, default=1, help="TensorFlow / OpenCV threads")
+    parser.add_argument("--filter", help="Only run cases whose name contains this")
+    parser.add_argument("--repeat-scale", type=float, default=1.0, help="Multiply every case's repeat count")
+    parser.add_argument("--save", help="Write results as JSON (e.g. a new baseline)")
+    parser.add_argument("--baseline", help="Compare against an earlier --save file")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative slowdown")
+    args = parser.parse_args()
+
+    configure_threads(args.threads)
+    import app as backend  # noqa: E402 (after thread config)
+    from benchmarks import standin_models
+    from benchmarks.common import measure, print_table
+
+    cases = build_cases(backend, standin_models, synthetic_inputs())
+    if args.filter:
+        cases = [case for case in cases if args.filter in case[0]]
+
+    results = {}
+    for name, fn, repeat in cases:
+        results[name] = measure(fn, repeat=max(3, int(repeat * args.repeat_scale)))
+    print_table(list(results.items()), columns=("p50_ms", "min_ms", "alloc_peak_kb"))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "host": {"platform": platform.platform(), "python": platform.python_version(),
+                         "cpus": os.cpu_count(), "threads": args.threads},
+                "results": results,
+            }, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("host", {}).get("threads") != args.threads:
+            print(f"\nNote: baseline used {baseline.get('host', {}).get('threads')} thread(s), this run {args.threads}")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%}:")
+            for name, metric, old, new in regressions:
+                print(f"  {name}: {metric} {old:.3f} -> {new:.3f} ({(new - old) / old:+.0%})")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
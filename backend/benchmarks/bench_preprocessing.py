@@ -0,0 +1,79 @@
+"""
+Preprocessing micro-benchmark: the previous preprocess_image /
+preprocess_ultrasound implementations against the buffer-reusing float32
+versions in preprocessing.py. Checks that outputs match bit-for-bit, then
+reports time and peak allocation per call.
+
+Run from the backend directory:
+    python benchmarks/bench_preprocessing.py
+"""
+
+import io
+import os
+import sys
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import preprocessing  # noqa: E402
+from benchmarks.common import measure, print_table  # noqa: E402
+
+
+def legacy_preprocess_image(image_bytes):
+    img = Image.open(io.BytesIO(image_bytes)).convert('L')
+    img_array = np.array(img.resize((224, 224)))
+    img_array = np.expand_dims(img_array, axis=-1)
+    img_array = np.expand_dims(img_array, axis=0)
+    img_array = img_array.astype("float32")
+    img_array = (img_array - 0.5) / 0.5
+    return img_array, img
+
+
+def legacy_preprocess_ultrasound(image_bytes):
+    img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    img_resized = cv2.resize(img, (128, 128))
+    img_input = np.expand_dims(img_resized / 255.0, axis=0)
+    # What Keras feeds the model after its implicit downcast
+    return img_input.astype(np.float32), img
+
+
+def encode(pixels, ext):
+    ok, buffer = cv2.imencode(ext, pixels)
+    assert ok
+    return buffer.tobytes()
+
+
+def main():
+    rng = np.random.default_rng(0)
+    mammogram = encode(rng.integers(0, 256, (2048, 1536), dtype=np.uint8), ".png")
+    ultrasound = encode(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8), ".jpg")
+
+    assert np.array_equal(legacy_preprocess_image(mammogram)[0], preprocessing.preprocess_image(mammogram)[0])
+    assert np.array_equal(legacy_preprocess_ultrasound(ultrasound)[0], preprocessing.preprocess_ultrasound(ultrasound)[0])
+    print("Outputs match bit-for-bit.\n")
+
+    # Normalisation alone, on already-resized pixels: isolates the part the
+    # change affects from the (unchanged) decode and resize cost.
+    gray = rng.integers(0, 256, (224, 224), dtype=np.uint8)
+    bgr = rng.integers(0, 256, (128, 128, 3), dtype=np.uint8)
+    vit_out = np.empty((1, 224, 224, 1), np.float32)
+    us_out = np.empty((1, 128, 128, 3), np.float32)
+
+    rows = [
+        ("vit normalize, legacy", measure(lambda: (np.expand_dims(np.expand_dims(gray, -1), 0).astype("float32") - 0.5) / 0.5, repeat=500)),
+        ("vit normalize, lut", measure(lambda: preprocessing.normalize_into(gray, preprocessing.VIT_LUT, vit_out[0, :, :, 0]), repeat=500)),
+        ("ultrasound normalize, legacy", measure(lambda: np.expand_dims(bgr / 255.0, 0), repeat=500)),
+        ("ultrasound normalize, lut", measure(lambda: preprocessing.normalize_into(bgr, preprocessing.ULTRASOUND_LUT, us_out[0]), repeat=500)),
+        ("preprocess_image, legacy", measure(lambda: legacy_preprocess_image(mammogram), repeat=30)),
+        ("preprocess_image", measure(lambda: preprocessing.preprocess_image(mammogram), repeat=30)),
+        ("preprocess_ultrasound, legacy", measure(lambda: legacy_preprocess_ultrasound(ultrasound), repeat=100)),
+        ("preprocess_ultrasound", measure(lambda: preprocessing.preprocess_ultrasound(ultrasound), repeat=100)),
+    ]
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Scan history pagination benchmark.
+
+First walks GET /scans page by page against FakeSupabase, unfiltered and
+per scan_type, over a user whose scans share created_at values across
+page boundaries, and checks every row comes back exactly once and in order.
+
+Then seeds a local SQLite database (standing in for the Supabase Postgres
+table) with N scans spread across a handful of users and compares:
+
+  * full fetch   - the old client history load (every row)
+  * offset page  - LIMIT/OFFSET paging, for reference
+  * keyset page  - the /scans query as PostgREST sends it:
+                   created_at <= c and (created_at < c or (created_at = c and id < i))
+
+Run from the backend directory:
+    python benchmarks/bench_scan_history.py --rows 1000000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCHEMA = """
+create table scans (
+  id text primary key,
+  user_id text not null,
+  original_image_url text not null,
+  annotated_image_url text,
+  prediction_label text,
+  confidence_score real,
+  created_at text not null,
+  scan_type text
+)
+"""
+
+INDEXES = [
+    "create index scans_user_created_id_idx on scans (user_id, created_at desc, id desc)",
+    "create index scans_user_type_created_id_idx on scans (user_id, scan_type, created_at desc, id desc)",
+]
+
+COLUMNS = "id, created_at, prediction_label, confidence_score, original_image_url, scan_type"
+
+
+def seed(conn, rows, users, heavy_share):
+    """Inserts `rows` scans; the first user owns `heavy_share` of them."""
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    heavy_user = user_ids[0]
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rng = random.Random(42)
+
+    def generate():
+        for i in range(rows):
+            user_id = heavy_user if rng.random() < heavy_share else rng.choice(user_ids[1:])
+            created_at = start + timedelta(seconds=i * 7 + rng.randint(0, 6))
+            scan_type = "ultrasound" if rng.random() < 0.3 else "mammogram"
+            label = rng.choice(["Benign", "Malignant"])
+            scan_id = str(uuid.uuid4())
+            url = f"https://example.supabase.co/storage/v1/object/public/mammo-scans/{user_id}/{scan_id}.jpg"
+            yield (scan_id, user_id, url, url, label, rng.random(),
+                   created_at.isoformat(), scan_type)
+
+    conn.executemany("insert into scans values (?, ?, ?, ?, ?, ?, ?, ?)", generate())
+    conn.commit()
+    return heavy_user
+
+
+def timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), result
+
+
+def full_fetch(conn, user_id):
+    return conn.execute(
+        "select * from scans where user_id = ? order by created_at desc",
+        (user_id,),
+    ).fetchall()
+
+
+def offset_page(conn, user_id, limit, offset):
+    return conn.execute(
+        f"select {COLUMNS} from scans where user_id = ? "
+        "order by created_at desc, id desc limit ? offset ?",
+        (user_id, limit, offset),
+    ).fetchall()
+
+
+def keyset_page(conn, user_id, limit, cursor=None, scan_type=None):
+    sql = f"select {COLUMNS} from scans where user_id = ?"
+    params = [user_id]
+    if scan_type:
+        sql += " and scan_type = ?"
+        params.append(scan_type)
+    if cursor:
+        # What PostgREST builds from list_scans' lte() + or_() filters
+        sql += " and created_at <= ? and (created_at < ? or (created_at = ? and id < ?))"
+        params += [cursor[0], cursor[0], cursor[0], cursor[1]]
+    sql += " order by created_at desc, id desc limit ?"
+    params.append(limit + 1)
+    return conn.execute(sql, params).fetchall()
+
+
+def check_cursor_pages(page_size=3, scan_type=None):
+    """
+    Walks GET /scans (optionally filtered by scan_type) over FakeSupabase;
+    returns (rows, pages) or raises AssertionError.
+    """
+    import app as backend
+    from benchmarks.fake_supabase import FakeSupabase
+
+    fake = FakeSupabase()
+    backend.supabase = fake
+    token = "bench-token"
+    user_id = fake.add_user(token)
+    other_user = fake.add_user()
+
+    # Runs of 1-4 scans per timestamp, so page boundaries land inside runs
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    scans = fake.tables.setdefault("scans", {})
+    rng = random.Random(7)
+    for minute in range(12):
+        created_at = (start + timedelta(minutes=minute)).isoformat()
+        for owner in [user_id] * rng.randint(1, 4) + [other_user]:
+            scan_id = str(uuid.uuid4())
+            # None: a legacy row from before scan_type, which counts as a mammogram
+            row_type = rng.choice(["mammogram", "ultrasound", None])
+            scans[scan_id] = {"id": scan_id, "user_id": owner, "created_at": created_at,
+                              "scan_type": row_type, "prediction_label": "Benign",
+                              "confidence_score": 0.9, "original_image_url": ""}
+    expected = [row["id"] for row in sorted(
+        (row for row in scans.values() if row["user_id"] == user_id
+         and scan_type in (None, row["scan_type"] or "mammogram")),
+        key=lambda row: (row["created_at"], row["id"]), reverse=True)]
+
+    client = backend.app.test_client()
+    seen, pages, cursor = [], 0, None
+    while True:
+        query = (f"/scans?limit={page_size}" + (f"&scan_type={scan_type}" if scan_type else "")
+                 + (f"&cursor={cursor}" if cursor else ""))
+        res = client.get(query, headers={"Authorization": f"Bearer {token}"})
+        assert res.status_code == 200, res.get_json()
+        body = res.get_json()
+        seen += [row["id"] for row in body["scans"]]
+        pages += 1
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+        assert pages <= len(expected), "cursor is not advancing"
+    assert len(seen) == len(set(seen)), "rows repeated across pages"
+    assert seen == expected, "rows skipped or out of order"
+    return len(seen), pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--heavy-share", type=float, default=0.2,
+                        help="Fraction of rows owned by the benchmarked user")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for scan_type in (None, "mammogram", "ultrasound"):
+        rows, pages = check_cursor_pages(scan_type=scan_type)
+        print(f"GET /scans cursor walk ({scan_type or 'all'}): {rows} rows over {pages} pages, "
+              "none skipped or repeated")
+    print()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "scans.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(SCHEMA)
+
+    print(f"Seeding {args.rows:,} rows into {db_path} ...")
+    t0 = time.perf_counter()
+    user_id = seed(conn, args.rows, args.users, args.heavy_share)
+    print(f"  seeded in {time.perf_counter() - t0:.1f}s")
+
+    user_rows = conn.execute("select count(*) from scans where user_id = ?", (user_id,)).fetchone()[0]
+    print(f"Benchmarked user owns {user_rows:,} scans\n")
+
+    results = []
+
+    ms, rows = timed(lambda: full_fetch(conn, user_id), args.repeat)
+    results.append(("full fetch, no index", ms, len(rows)))
+
+    for statement in INDEXES:
+        conn.execute(statement)
+    conn.execute("analyze")
+
+    ms, rows = timed(lambda: full_fetch(conn, user_id), args.repeat)
+    results.append(("full fetch, indexed", ms, len(rows)))
+
+    ms, rows = timed(lambda: keyset_page(conn, user_id, args.page_size), args.repeat)
+    results.append(("keyset first page", ms, min(len(rows), args.page_size)))
+
+    # Walk to a deep page once, then time fetching the page after it
+    deep_offset = (user_rows // 2 // args.page_size) * args.page_size
+    anchor = offset_page(conn, user_id, 1, max(deep_offset - 1, 0))[0]
+    cursor = (anchor[1], anchor[0])
+
+    ms, rows = timed(lambda: offset_page(conn, user_id, args.page_size, deep_offset), args.repeat)
+    results.append((f"offset page @ {deep_offset:,}", ms, len(rows)))
+
+    ms, rows = timed(lambda: keyset_page(conn, user_id, args.page_size, cursor), args.repeat)
+    results.append((f"keyset page @ {deep_offset:,}", ms, min(len(rows), args.page_size)))
+
+    ms, rows = timed(lambda: keyset_page(conn, user_id, args.page_size, scan_type="ultrasound"), args.repeat)
+    results.append(("keyset page, scan_type filter", ms, min(len(rows), args.page_size)))
+
+    print(f"{'query':<34}{'median ms':>12}{'rows':>10}")
+    for name, ms, count in results:
+        print(f"{name:<34}{ms:>12.2f}{count:>10,}")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
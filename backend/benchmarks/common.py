@@ -0,0 +1,81 @@
+"""Shared timing / allocation helpers for the benchmark scripts."""
+
+import gc
+import math
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+
+def measure(fn, repeat=50, warmup=3):
+    """
+    Calls fn() repeatedly and returns per-call statistics:
+      p50_ms / mean_ms / min_ms  wall time
+      alloc_peak_kb              peak traced bytes allocated during one call
+
+    Time is measured with tracing off; allocations in a separate traced pass,
+    since tracemalloc itself slows allocation-heavy code down.
+    """
+    for _ in range(warmup):
+        fn()
+
+    gc.collect()
+    gc.disable()
+    try:
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t0) * 1000)
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    try:
+        peaks = []
+        for _ in range(min(repeat, 10)):
+            baseline, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            result = fn()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - baseline)
+            del result
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "p50_ms": statistics.median(samples),
+        "mean_ms": statistics.fmean(samples),
+        "min_ms": min(samples),
+        "alloc_peak_kb": statistics.median(peaks) / 1024,
+    }
+
+
+def print_table(rows, columns=("p50_ms", "min_ms", "alloc_peak_kb")):
+    """rows: list of (name, stats dict)."""
+    width = max(len(name) for name, _ in rows) + 2
+    print(f"{'case':<{width}}" + "".join(f"{c:>16}" for c in columns))
+    for name, stats in rows:
+        print(f"{name:<{width}}" + "".join(f"{stats[c]:>16.3f}" for c in columns))
+
+
+def percentile(sorted_samples, q):
+    """Nearest-rank percentile (q in 0-100) of an ascending list; None if empty."""
+    if not sorted_samples:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def rss_kb():
+    """Current resident set size of this process in KiB (Linux), else peak RSS."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * (os.sysconf("SC_PAGE_SIZE") // 1024)
+    except (OSError, ValueError):
+        import resource  # POSIX only
+        # ru_maxrss is KiB on Linux but bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == "darwin" else peak
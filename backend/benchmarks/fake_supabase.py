@@ -0,0 +1,312 @@
+"""
+In-memory stand-in for the parts of the Supabase client that app.py uses
+(auth.get_user, storage.from_(...), table(...) queries and rpc), with a
+configurable per-call latency to mimic the network hop to Supabase.
+
+Only the query builder methods the backend actually calls are supported.
+Every call that would be an HTTP request is counted in `round_trips`.
+"""
+
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+
+class FakeSupabase:
+    def __init__(self, latency_ms=0.0, base_url="http://fake-supabase.local"):
+        self.latency = latency_ms / 1000.0
+        self.base_url = base_url
+        self.lock = threading.Lock()
+        self.round_trips = 0
+        self.tokens = {}    # token -> user id
+        self.tables = {}    # name -> {id: row}
+        self.buckets = {}   # name -> {path: object}
+        self.auth = FakeAuth(self)
+        self.storage = FakeStorage(self)
+
+    # --- helpers for benchmarks ---
+
+    def hop(self):
+        """Simulates one HTTP round trip."""
+        with self.lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def add_user(self, token=None):
+        user_id = str(uuid.uuid4())
+        self.tokens[token or user_id] = user_id
+        return user_id
+
+    def public_url(self, bucket, path):
+        return f"{self.base_url}/storage/v1/object/public/{bucket}/{path}"
+
+    # --- client API ---
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params=None):
+        return FakeRpc(self, name, params or {})
+
+
+class FakeAuth:
+    def __init__(self, client):
+        self.client = client
+
+    def get_user(self, token):
+        self.client.hop()
+        user_id = self.client.tokens.get(token)
+        if not user_id:
+            raise ValueError("invalid JWT")
+        return SimpleNamespace(user=SimpleNamespace(id=user_id))
+
+
+class FakeStorage:
+    def __init__(self, client):
+        self.client = client
+
+    def from_(self, bucket):
+        return FakeBucket(self.client, bucket)
+
+
+class FakeBucket:
+    def __init__(self, client, bucket):
+        self.client = client
+        self.bucket = bucket
+
+    @property
+    def objects(self):
+        return self.client.buckets.setdefault(self.bucket, {})
+
+    def upload(self, path, file, file_options=None):
+        self.client.hop()
+        upsert = str((file_options or {}).get("upsert", "")).lower() == "true"
+        with self.client.lock:
+            if path in self.objects and not upsert:
+                raise ValueError("The resource already exists")
+            self.objects[path] = {
+                "name": path,
+                "data": file,
+                "size": len(file),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "content_type": (file_options or {}).get("content-type"),
+            }
+        return SimpleNamespace(path=path)
+
+    def get_public_url(self, path):
+        # Built client-side by the real SDK, so no round trip
+        return self.client.public_url(self.bucket, path)
+
+    def remove(self, paths):
+        self.client.hop()
+        removed = []
+        with self.client.lock:
+            for path in paths:
+                if self.objects.pop(path, None) is not None:
+                    removed.append({"name": path})
+        return removed
+
+    def download(self, path):
+        self.client.hop()
+        if path not in self.objects:
+            raise ValueError("Object not found")
+        return self.objects[path].get("data", b"")
+
+    def list(self, path=None, options=None):
+        """Lists one folder level, sorted by name, like the storage API."""
+        self.client.hop()
+        options = options or {}
+        prefix = f"{path.rstrip('/')}/" if path else ""
+        entries = {}
+        for name, meta in self.objects.items():
+            if not name.startswith(prefix):
+                continue
+            rest = name[len(prefix):]
+            if "/" in rest:
+                folder = rest.split("/", 1)[0]
+                entries[folder] = {"name": folder, "id": None, "created_at": None, "metadata": None}
+            else:
+                entries[rest] = {
+                    "name": rest,
+                    "id": rest,
+                    "created_at": meta["created_at"],
+                    "metadata": {"size": meta["size"]},
+                }
+        names = sorted(entries)
+        offset = options.get("offset", 0)
+        limit = options.get("limit", 100)
+        return [entries[name] for name in names[offset:offset + limit]]
+
+
+FILTER_OPERATORS = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+}
+
+
+def split_top_level(text):
+    """Splits on commas outside parentheses and double quotes."""
+    parts, depth, quoted, current = [], 0, False, ""
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and ch == ",":
+            parts.append(current)
+            current = ""
+            continue
+        current += ch
+    parts.append(current)
+    return [part.strip() for part in parts if part.strip()]
+
+
+def parse_logic(operator, conditions):
+    """Row predicate for and(...)/or(...) over PostgREST conditions; values compare as strings."""
+    predicates = []
+    for condition in split_top_level(conditions):
+        nested = condition.split("(", 1)[0]
+        if nested in ("and", "or") and condition.endswith(")"):
+            predicates.append(parse_logic(nested, condition[len(nested) + 1:-1]))
+            continue
+        column, op, value = condition.split(".", 2)
+        if len(value) >= 2 and value[0] == value[-1] == '"':
+            value = value[1:-1]
+        if op == "is" and value == "null":
+            predicates.append(lambda row, column=column: row.get(column) is None)
+            continue
+        compare = FILTER_OPERATORS[op]
+        predicates.append(lambda row, column=column, compare=compare, value=value:
+                          row.get(column) is not None and compare(str(row.get(column)), value))
+    combine = all if operator == "and" else any
+    return lambda row: combine(predicate(row) for predicate in predicates)
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.action = "select"
+        self.columns = None
+        self.payload = None
+        self.filters = []
+        self.orders = []
+        self.row_limit = None
+        self.row_offset = 0
+
+    @property
+    def rows(self):
+        return self.client.tables.setdefault(self.table, {})
+
+    def select(self, columns="*", **kwargs):
+        self.columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        return self
+
+    def insert(self, data):
+        self.action = "insert"
+        self.payload = data if isinstance(data, list) else [data]
+        return self
+
+    def update(self, data):
+        self.action = "update"
+        self.payload = data
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: str(row.get(column)) == str(value))
+        return self
+
+    def in_(self, column, values):
+        allowed = {str(v) for v in values}
+        self.filters.append(lambda row: str(row.get(column)) in allowed)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) > value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) < value)
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) <= value)
+        return self
+
+    def or_(self, filters):
+        """PostgREST logic tree: 'a.lt.1,and(a.eq.1,b.lt.2)' (values may be double-quoted)."""
+        self.filters.append(parse_logic("or", filters))
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def range(self, start, end):
+        self.row_offset = start
+        self.row_limit = end - start + 1
+        return self
+
+    def _matching(self):
+        rows = [row for row in self.rows.values() if all(f(row) for f in self.filters)]
+        for column, desc in reversed(self.orders):
+            rows.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+        return rows
+
+    def execute(self):
+        self.client.hop()
+        with self.client.lock:
+            if self.action == "insert":
+                inserted = []
+                for data in self.payload:
+                    row = dict(data)
+                    row.setdefault("id", str(uuid.uuid4()))
+                    row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+                    self.rows[row["id"]] = row
+                    inserted.append(dict(row))
+                return SimpleNamespace(data=inserted)
+
+            rows = self._matching()
+            if self.action == "update":
+                for row in rows:
+                    row.update(self.payload)
+                return SimpleNamespace(data=[dict(row) for row in rows])
+            if self.action == "delete":
+                for row in rows:
+                    self.rows.pop(row["id"], None)
+                return SimpleNamespace(data=rows)
+
+            rows = rows[self.row_offset:]
+            if self.row_limit is not None:
+                rows = rows[:self.row_limit]
+            if self.columns:
+                rows = [{c: row.get(c) for c in self.columns} for row in rows]
+            return SimpleNamespace(data=[dict(row) for row in rows])
+
+
+class FakeRpc:
+    def __init__(self, client, name, params):
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        self.client.hop()
+        return SimpleNamespace(data=None)
@@ -0,0 +1,364 @@
+"""
+End-to-end load test for app.py against the in-memory Supabase fake.
+
+Boots the Flask app in a threaded HTTP server on localhost, with every
+Supabase call going to FakeSupabase (auth, storage, tables) with injected
+per-call latency, and drives it over real HTTP from a pool of client
+threads. Each scenario runs once per concurrency level:
+
+  predict     POST /predict with a synthetic mammogram PNG
+  ultrasound  POST /ultrasound with a synthetic ultrasound JPEG
+  delete      DELETE /scans with --delete-batch freshly seeded scan ids
+  mixed       ultrasounds, with one request in four a /predict, half of
+              those full-field 16-bit mammograms (4096x5120): the load
+              the decode memory budget is for
+
+Reported per run: throughput (successful requests/s), p50/p95/p99/max
+latency, error rate, status codes, Supabase round trips per request,
+process RSS (start / peak / end) and the decode limiter's counters. Results go to a JSON file (one per run)
+so runs can be compared over time; --compare prints the change against an
+earlier file.
+
+Without trained weights, --models standin (the default) serves randomly
+initialised models of the served architectures; --models served keeps
+whatever the registry loaded.
+
+Run from the backend directory:
+    python benchmarks/load_test.py --scenarios predict,ultrasound,delete \\
+        --concurrency 1,4,16 --duration 20 --latency-ms 20
+
+Peak RSS with and without the decode budget (0 = unlimited), with
+admission control off so every upload is decoded and glibc's mmap
+threshold pinned (see decode_budget.py):
+    export ADMISSION_WAIT_TARGETS=/predict:0,/ultrasound:0 MALLOC_MMAP_THRESHOLD_=131072
+    python benchmarks/load_test.py --scenarios mixed --concurrency 8 --decode-budget-mb 0
+    python benchmarks/load_test.py --scenarios mixed --concurrency 8 --decode-budget-mb 128
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+import cv2
+import numpy as np
+import requests
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as backend  # noqa: E402
+from decode_budget import DecodeLimiter  # noqa: E402
+from benchmarks import standin_models  # noqa: E402
+from benchmarks.common import percentile, rss_kb  # noqa: E402
+from benchmarks.fake_supabase import FakeSupabase  # noqa: E402
+
+TOKEN = "load-test-token"
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+# --- synthetic corpus ---
+
+def smooth_noise(rng, shape, sigma):
+    """Blurred noise: compresses and resizes more like a scan than raw noise."""
+    return cv2.GaussianBlur(rng.integers(0, 256, shape, dtype=np.uint8), (0, 0), sigma)
+
+
+def build_corpus(size, seed=0):
+    """
+    {"mammogram": [(filename, bytes, content_type)], "ultrasound": [...], "full_field": [...]}
+    Mammograms are grayscale PNGs of a few typical detector sizes;
+    ultrasounds are 640x480-ish colour JPEGs; full_field holds two 16-bit
+    4096x5120 PNGs, the largest uploads the service sees.
+    """
+    rng = np.random.default_rng(seed)
+    mammogram_sizes = [(1024, 768), (2048, 1536), (3328, 2560)]
+    corpus = {"mammogram": [], "ultrasound": [], "full_field": []}
+    for i in range(size):
+        height, width = mammogram_sizes[i % len(mammogram_sizes)]
+        ok, png = cv2.imencode(".png", smooth_noise(rng, (height, width), 6))
+        assert ok
+        corpus["mammogram"].append((f"mammogram_{i}.png", png.tobytes(), "image/png"))
+
+        height, width = 480 + 16 * (i % 4), 640
+        ok, jpg = cv2.imencode(".jpg", smooth_noise(rng, (height, width, 3), 2), [cv2.IMWRITE_JPEG_QUALITY, 90])
+        assert ok
+        corpus["ultrasound"].append((f"ultrasound_{i}.jpg", jpg.tobytes(), "image/jpeg"))
+
+    for i in range(2):
+        full_field = smooth_noise(rng, (5120, 4096), 6).astype(np.uint16) * 257
+        ok, png = cv2.imencode(".png", full_field, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        assert ok
+        corpus["full_field"].append((f"full_field_{i}.png", png.tobytes(), "image/png"))
+    return corpus
+
+
+# --- scenarios ---
+
+def seed_scans(fake, user_id, count):
+    """Inserts scan rows + storage objects straight into the fake; returns ids."""
+    ids = []
+    with fake.lock:
+        bucket = fake.buckets.setdefault("mammo-scans", {})
+        scans = fake.tables.setdefault("scans", {})
+        for _ in range(count):
+            scan_id = str(uuid.uuid4())
+            paths = [f"{user_id}/{scan_id}.png", f"{user_id}/{scan_id}_preview.webp",
+                     f"{user_id}/{scan_id}_thumbnail.webp"]
+            for path in paths:
+                bucket[path] = {"size": 1, "created_at": ""}
+            scans[scan_id] = {
+                "id": scan_id, "user_id": user_id, "scan_type": "mammogram",
+                "original_image_url": fake.public_url("mammo-scans", paths[0]),
+                "storage_paths": paths,
+            }
+            ids.append(scan_id)
+    return ids
+
+
+def make_request_fn(scenario, base_url, corpus, fake, user_id, delete_batch):
+    """Returns send(session, rng) -> status code for one request of a scenario."""
+    headers = {"Authorization": f"Bearer {TOKEN}"}
+
+    if scenario in ("predict", "ultrasound"):
+        route = "/predict" if scenario == "predict" else "/ultrasound"
+        images = corpus["mammogram" if scenario == "predict" else "ultrasound"]
+
+        def send(session, rng):
+            filename, data, content_type = rng.choice(images)
+            res = session.post(base_url + route, headers=headers,
+                               files={"file": (filename, data, content_type)})
+            return res.status_code
+        return send
+
+    if scenario == "mixed":
+        def send(session, rng):
+            draw = rng.random()
+            if draw < 0.125:
+                route, images = "/predict", corpus["full_field"]
+            elif draw < 0.25:
+                route, images = "/predict", corpus["mammogram"]
+            else:
+                route, images = "/ultrasound", corpus["ultrasound"]
+            filename, data, content_type = rng.choice(images)
+            res = session.post(base_url + route, headers=headers,
+                               files={"file": (filename, data, content_type)})
+            return res.status_code
+        return send
+
+    if scenario == "delete":
+        def send(session, rng):
+            # Seeding is a dict insert; it sits outside the measured request
+            ids = seed_scans(fake, user_id, delete_batch)
+            res = session.delete(base_url + "/scans", headers=headers, json={"ids": ids})
+            return res.status_code
+        return send
+
+    raise ValueError(f"Unknown scenario '{scenario}'")
+
+
+def run_level(send, fake, concurrency, duration, max_requests, warmup):
+    """Runs send() from concurrency threads; returns the result dict."""
+    stop = threading.Event()
+    lock = threading.Lock()
+    latencies, statuses = [], Counter()
+    issued = [0]
+    # Warmup runs before the clock starts; everyone starts timing together
+    ready = threading.Barrier(concurrency + 1)
+
+    def worker(index):
+        rng = random.Random(index)
+        session = requests.Session()
+        for _ in range(warmup):
+            try:
+                send(session, rng)
+            except requests.RequestException:
+                pass
+        ready.wait()
+        while not stop.is_set():
+            with lock:
+                if max_requests and issued[0] >= max_requests:
+                    return
+                issued[0] += 1
+            started = time.perf_counter()
+            try:
+                status = send(session, rng)
+            except requests.RequestException as e:
+                status = type(e).__name__
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] += 1
+
+    def sample_rss():
+        while not stop.is_set():
+            rss["peak_kb"] = max(rss["peak_kb"], rss_kb())
+            # Often enough to catch a decode's peak, which lasts a few hundred ms
+            time.sleep(0.02)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    fake.round_trips = 0
+    rss = {"start_kb": rss_kb(), "peak_kb": 0}
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    deadline = started + duration
+    while any(thread.is_alive() for thread in threads) and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    sampler.join()
+    rss["end_kb"] = rss_kb()
+    rss["peak_kb"] = max(rss["peak_kb"], rss["end_kb"])
+
+    total = sum(statuses.values())
+    ok = sum(count for status, count in statuses.items() if isinstance(status, int) and status < 300)
+    ordered = sorted(latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "seconds": round(wall, 3),
+        "throughput_rps": ok / wall if wall else 0.0,
+        "error_rate": (total - ok) / total if total else 0.0,
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "latency_ms": {
+            "p50": percentile(ordered, 50),
+            "p95": percentile(ordered, 95),
+            "p99": percentile(ordered, 99),
+            "max": ordered[-1] if ordered else None,
+            "mean": sum(ordered) / len(ordered) if ordered else None,
+        },
+        "supabase_round_trips_per_request": fake.round_trips / total if total else 0.0,
+        "rss_kb": rss,
+        "decode": backend.decode_limiter.stats(),
+    }
+
+
+# --- reporting ---
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    previous = {}
+    for row in (baseline or {}).get("results", []):
+        previous[(row["scenario"], row["concurrency"])] = row
+
+    header = (f"{'scenario':<12}{'conc':>6}{'req/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'err%':>8}"
+              f"{'rss MiB':>10}{'decode MiB':>12}")
+    if baseline:
+        header += f"{'Δ req/s':>10}{'Δ p95':>10}"
+    print(header)
+    for row in results:
+        latency = row["latency_ms"]
+        line = (f"{row['scenario']:<12}{row['concurrency']:>6}{row['throughput_rps']:>10.2f}"
+                f"{latency['p50'] or 0:>10.1f}{latency['p95'] or 0:>10.1f}{latency['p99'] or 0:>10.1f}"
+                f"{row['error_rate'] * 100:>8.1f}{row['rss_kb']['peak_kb'] / 1024:>10.1f}"
+                f"{row.get('decode', {}).get('peak_bytes', 0) / 2 ** 20:>12.1f}")
+        before = previous.get((row["scenario"], row["concurrency"]))
+        if before:
+            def change(new, old):
+                return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            line += (f"{change(row['throughput_rps'], before['throughput_rps']):>10}"
+                     f"{change(latency['p95'] or 0, before['latency_ms']['p95'] or 0):>10}")
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test app.py against a fake Supabase")
+    parser.add_argument("--scenarios", default="predict,ultrasound,delete")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated client thread counts")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per scenario and level")
+    parser.add_argument("--requests", type=int, default=0, help="Stop a level after this many requests")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed requests per client thread")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Injected latency per Supabase call")
+    parser.add_argument("--corpus-size", type=int, default=12, help="Synthetic images per modality")
+    parser.add_argument("--delete-batch", type=int, default=50, help="Scan ids per DELETE /scans")
+    parser.add_argument("--models", choices=("standin", "served"), default="standin")
+    parser.add_argument("--decode-budget-mb", type=float, default=None,
+                        help="Decode memory budget for the run, 0 for unlimited (default: DECODE_MEMORY_BUDGET_MB)")
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/load_<timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier results JSON to diff against")
+    args = parser.parse_args()
+
+    if args.models == "standin":
+        standin_models.install(backend.model_registry, backend.create_vit_classifier)
+    fake = FakeSupabase(latency_ms=args.latency_ms)
+    backend.supabase = fake
+    user_id = fake.add_user(TOKEN)
+    corpus = build_corpus(args.corpus_size)
+
+    # Werkzeug logs every request to stderr
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, backend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    results = []
+    try:
+        for scenario in args.scenarios.split(","):
+            send = make_request_fn(scenario, base_url, corpus, fake, user_id, args.delete_batch)
+            for concurrency in (int(c) for c in args.concurrency.split(",")):
+                print(f"{scenario} x{concurrency}...", file=sys.stderr)
+                # Fresh limiter per level so its counters cover this run only
+                limiter = backend.decode_limiter
+                budget = limiter.budget_bytes if args.decode_budget_mb is None else (
+                    int(args.decode_budget_mb * 1024 * 1024) or sys.maxsize)
+                backend.decode_limiter = DecodeLimiter(budget, limiter.max_pixels, limiter.timeout)
+                # The routes log every request; keep that out of the report
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = run_level(send, fake, concurrency, args.duration, args.requests, args.warmup)
+                results.append(dict(scenario=scenario, **result))
+                # Uploads pile up in the fake between levels otherwise
+                with fake.lock:
+                    fake.buckets.clear()
+                    fake.tables.clear()
+    finally:
+        server.shutdown()
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "config": vars(args),
+        "model_versions": {name: handle.version for name, handle in backend.model_registry.handles.items()},
+        "results": results,
+    }
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"load_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
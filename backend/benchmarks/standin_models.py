@@ -0,0 +1,30 @@
+"""
+Randomly initialised models with the served architectures, for benchmarks
+on machines without the trained weights. Weights don't change inference
+cost, so latency and memory numbers carry over; predictions are noise.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocessing import ULTRASOUND_INPUT_SIZE, VGG_INPUT_SIZE  # noqa: E402
+from training.architectures import create_vgg16_transfer, simple_unet_model  # noqa: E402
+
+
+def unet(size=ULTRASOUND_INPUT_SIZE, channels=3):
+    """simple_unet_model() from models/Ultrasound.py (32-512 filters, 4 levels)."""
+    return simple_unet_model(size, size, channels)
+
+
+def vgg16():
+    """The transfer notebook's VGG16 + head, without downloading ImageNet weights."""
+    return create_vgg16_transfer((VGG_INPUT_SIZE, VGG_INPUT_SIZE, 3), weights=None)
+
+
+def install(registry, create_vit_classifier, names=("vit", "unet")):
+    """Puts stand-ins into a ModelRegistry under version 'standin'."""
+    builders = {"vit": create_vit_classifier, "unet": unet, "vgg16": vgg16}
+    for name in names:
+        registry.put(name, "standin", builders[name]())
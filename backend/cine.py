@@ -0,0 +1,134 @@
+"""
+Cine-loop (multi-frame) ultrasound segmentation.
+
+Frames are decoded one at a time, optionally thinned out with a cheap
+frame-difference check, and pushed through the U-Net in fixed-size batches
+written into a reused input buffer. Only the running per-frame statistics
+and the current best frame are kept, so memory does not grow with clip
+length.
+"""
+
+import cv2
+import numpy as np
+
+from decode_budget import BGR_OUTPUT
+from preprocessing import ULTRASOUND_INPUT_SIZE, input_buffers, ultrasound_input_into
+
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_MAX_FRAMES = 600
+# Mean absolute difference (0-255 scale) on a 32x32 grayscale signature
+# below which a frame counts as a repeat of the last analysed one
+DEFAULT_DIFF_THRESHOLD = 2.0
+SIGNATURE_SIZE = 32
+MASK_THRESHOLD = 0.5
+
+
+def iter_video_frames(path):
+    """Decodes a video file frame by frame (BGR)."""
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError("Could not open video")
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                return
+            yield frame
+    finally:
+        capture.release()
+
+
+def iter_image_frames(files, limiter=None):
+    """
+    Decodes uploaded still frames (werkzeug FileStorage) one at a time,
+    each under the decode_budget.DecodeLimiter if one is given.
+    """
+    for file in files:
+        data = file.read()
+        if limiter is None:
+            frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        else:
+            with limiter.reserve(data, BGR_OUTPUT, decoder="cv2"):
+                frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError(f"Could not decode frame '{file.filename}'")
+        yield frame
+
+
+def frame_signature(frame):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, (SIGNATURE_SIZE, SIGNATURE_SIZE), interpolation=cv2.INTER_AREA)
+
+
+def select_frames(frames, diff_threshold=DEFAULT_DIFF_THRESHOLD, max_frames=DEFAULT_MAX_FRAMES):
+    """
+    Yields (index, frame) for frames that differ enough from the last kept
+    one. A threshold of 0 keeps every frame. Stops after max_frames decoded
+    frames so a long clip can't tie up a worker indefinitely.
+    """
+    last_signature = None
+    for index, frame in enumerate(frames):
+        if index >= max_frames:
+            return
+        if diff_threshold > 0:
+            signature = frame_signature(frame)
+            if last_signature is not None and cv2.absdiff(signature, last_signature).mean() < diff_threshold:
+                continue
+            last_signature = signature
+        yield index, frame
+
+
+class CineResult:
+    """Per-frame statistics plus the single best frame seen so far."""
+
+    def __init__(self):
+        self.frames = []
+        self.best = None  # (lesion_pixels, confidence, index, frame, mask)
+
+    def add(self, index, frame, prob_map):
+        mask = (prob_map > MASK_THRESHOLD).astype(np.uint8) * 255
+        lesion_pixels = int(np.count_nonzero(mask))
+        confidence = float(prob_map.max())
+        self.frames.append({
+            "index": index,
+            "tumor_detected": lesion_pixels > 0,
+            "lesion_pixels": lesion_pixels,
+            "lesion_fraction": lesion_pixels / mask.size,
+            "confidence": confidence,
+        })
+        # Largest lesion wins; confidence breaks ties (e.g. all-empty masks)
+        key = (lesion_pixels, confidence)
+        if self.best is None or key > self.best[:2]:
+            self.best = (lesion_pixels, confidence, index, frame.copy(), mask)
+
+    @property
+    def tumor_detected(self):
+        return any(frame["tumor_detected"] for frame in self.frames)
+
+
+def segment_frames(model, frames, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Runs the U-Net over (index, frame) pairs in batches of batch_size.
+    Returns a CineResult.
+    """
+    size = ULTRASOUND_INPUT_SIZE
+    batch = input_buffers.get((batch_size, size, size, 3))
+    pending = []  # (index, frame) for the rows currently filled in batch
+    result = CineResult()
+
+    def flush():
+        if not pending:
+            return
+        prob_maps = np.asarray(model.predict_on_batch(batch[:len(pending)]))
+        for (index, frame), prob_map in zip(pending, prob_maps):
+            result.add(index, frame, prob_map[:, :, 0])
+        pending.clear()
+
+    for index, frame in frames:
+        ultrasound_input_into(frame, batch[len(pending)])
+        pending.append((index, frame))
+        if len(pending) == batch_size:
+            flush()
+    flush()
+
+    return result
@@ -0,0 +1,231 @@
+"""
+Memory budget for image decodes.
+
+Decoding is where an upload's memory peaks. For a mammogram,
+preprocess_image() holds the fully decoded image in its native mode
+alongside its 'L' copy. A 16-bit full-field image is ~60 MB before the
+model sees a pixel, so a handful decoding together can push a worker out
+of memory, while ultrasound frames are a few MB each. DecodeLimiter sits
+in front of every decode:
+
+  * it reads the dimensions and mode from the image header (PIL opens
+    lazily, so no pixel data is decoded) and estimates the decode's peak
+    bytes: width x height x (bytes per pixel of the decoded mode + bytes
+    per pixel of the output)
+  * images over max_pixels are refused outright (ImageTooLarge). The
+    header is all it takes to reject a decompression bomb: a few KB of
+    PNG declaring 50000x50000 never reaches the decoder
+  * the rest wait, first come first served, until their estimate fits
+    in what is left of the process budget. Strict FIFO order means a big
+    mammogram is not starved by a stream of small ultrasounds that would
+    always fit. An image whose estimate alone exceeds the budget runs
+    once nothing else is decoding
+  * a decode that can't start within timeout seconds gives up
+    (DecodeBusy)
+
+The cv2 paths also take formats PIL has no reader for (PFM, Radiance
+HDR, EXR where OpenCV is built with it). OpenCV has no header-only read,
+so when PIL can't open a file but OpenCV recognises its signature the
+size is unknown: it reserves the whole budget, i.e. it decodes alone,
+and max_pixels is not checked for it.
+
+The reservation covers decode and preprocessing. What a request keeps
+afterwards (the full-res 'L' image for storage and heatmaps) is one byte
+per pixel and is not counted.
+
+RSS only follows the budget if freed decode buffers go back to the OS.
+glibc raises its mmap threshold after each large free and then serves
+later decodes from heap it keeps, so run workers with
+MALLOC_MMAP_THRESHOLD_=131072 to pin the threshold. Eight threads
+decoding 16-bit 4096x5120 PNGs: +440 MiB peak RSS unbudgeted, +122 MiB
+with a 128 MiB budget, +64 MiB with 64 MiB.
+"""
+
+import io
+import tempfile
+import threading
+import time
+from collections import deque
+
+import cv2
+from PIL import Image
+
+import tracing
+
+# Bytes per pixel PIL uses for an image of each mode; multi-band modes
+# (RGB, RGBA, CMYK, YCbCr, LA, ...) are stored as 4 bytes per pixel
+MODE_BYTES = {"1": 1, "L": 1, "P": 1, "I;16": 2, "I;16B": 2, "I;16L": 2, "I;16N": 2}
+DEFAULT_MODE_BYTES = 4
+
+# Bytes per pixel of what each preprocessing path keeps from the decode
+GRAY_OUTPUT = 1  # preprocess_image: PIL convert('L')
+BGR_OUTPUT = 3   # preprocess_ultrasound / cine stills: cv2.imdecode(IMREAD_COLOR)
+
+DEFAULT_BUDGET_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_PIXELS = 60_000_000  # comfortably above any full-field mammogram (~30 MP)
+
+
+class ImageTooLarge(ValueError):
+    def __init__(self, width, height, max_pixels):
+        self.width, self.height, self.max_pixels = width, height, max_pixels
+        super().__init__(f"Image is {width}x{height} ({width * height:,} pixels); the limit is {max_pixels:,}")
+
+
+class DecompressionBomb(ImageTooLarge):
+    """PIL refused to open the image: its header declares more than 2 x Image.MAX_IMAGE_PIXELS."""
+
+    def __init__(self):
+        self.width = self.height = None
+        self.max_pixels = 2 * Image.MAX_IMAGE_PIXELS
+        ValueError.__init__(self, "Image header declares too many pixels to decode safely (possible decompression bomb)")
+
+
+class UnreadableImage(ValueError):
+    pass
+
+
+class DecodeBusy(RuntimeError):
+    pass
+
+
+def cv2_can_read(image_bytes):
+    """Whether OpenCV has a decoder for this file's signature (nothing is decoded)."""
+    # haveImageReader only takes a path and only reads the signature
+    with tempfile.NamedTemporaryFile() as f:
+        f.write(image_bytes[:1024])
+        f.flush()
+        return cv2.haveImageReader(f.name)
+
+
+def image_header(image_bytes, decoder="pil"):
+    """
+    (width, height, mode) from the image header, without decoding pixels.
+    With decoder="cv2", a file only OpenCV can read gives (None, None, None).
+    """
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            return img.width, img.height, img.mode
+    except Image.DecompressionBombError as e:
+        raise DecompressionBomb() from e
+    except Exception as e:
+        if decoder == "cv2" and cv2_can_read(image_bytes):
+            return None, None, None
+        raise UnreadableImage("Unsupported or corrupt image file") from e
+
+
+def estimate_decode_bytes(width, height, mode, output_bytes):
+    return width * height * (MODE_BYTES.get(mode, DEFAULT_MODE_BYTES) + output_bytes)
+
+
+class Reservation:
+    """Holds nbytes of the budget until the with-block (or release()) ends."""
+
+    __slots__ = ("limiter", "nbytes", "width", "height", "waited")
+
+    def __init__(self, limiter, nbytes, width, height, waited):
+        self.limiter = limiter
+        self.nbytes = nbytes
+        self.width = width
+        self.height = height
+        self.waited = waited
+
+    def release(self):
+        if self.nbytes:
+            self.limiter._release(self.nbytes)
+            self.nbytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class DecodeLimiter:
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_BYTES, max_pixels=DEFAULT_MAX_PIXELS, timeout=30.0):
+        self.budget_bytes = budget_bytes
+        self.max_pixels = max_pixels
+        self.timeout = timeout
+        self.cond = threading.Condition()
+        self.queue = deque()  # tickets of waiting decodes, oldest first
+        self.in_use = 0
+        self.counts = {"admitted": 0, "queued": 0, "too_large": 0, "unreadable": 0, "unknown_size": 0,
+                       "timed_out": 0, "over_budget": 0, "peak_bytes": 0, "max_wait_ms": 0.0}
+
+    def reserve(self, image_bytes, output_bytes, decoder="pil"):
+        """
+        Checks the image header and blocks until its decode fits in the
+        budget. Use as `with limiter.reserve(data, GRAY_OUTPUT): decode...`;
+        pass decoder="cv2" when the bytes go to cv2.imdecode.
+        Raises ImageTooLarge (DecompressionBomb), UnreadableImage or DecodeBusy.
+        """
+        try:
+            width, height, mode = image_header(image_bytes, decoder)
+        except UnreadableImage:
+            with self.cond:
+                self.counts["unreadable"] += 1
+            raise
+        except DecompressionBomb:
+            with self.cond:
+                self.counts["too_large"] += 1
+            raise
+        if width is None:
+            # Only OpenCV reads it and its size is unknown: decode alone
+            with self.cond:
+                self.counts["unknown_size"] += 1
+            nbytes = self.budget_bytes
+        elif width * height > self.max_pixels:
+            with self.cond:
+                self.counts["too_large"] += 1
+            raise ImageTooLarge(width, height, self.max_pixels)
+        else:
+            nbytes = estimate_decode_bytes(width, height, mode, output_bytes)
+        with tracing.span("decode_wait", width=width, height=height, bytes=nbytes):
+            waited = self._acquire(nbytes)
+        return Reservation(self, nbytes, width, height, waited)
+
+    def _fits(self, nbytes):
+        # Called with the lock held; an oversized decode may run alone
+        return self.in_use + nbytes <= self.budget_bytes or self.in_use == 0
+
+    def _acquire(self, nbytes):
+        """Waits for this decode's turn; returns the seconds spent waiting."""
+        ticket = object()
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self.cond:
+            self.queue.append(ticket)
+            try:
+                while self.queue[0] is not ticket or not self._fits(nbytes):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.counts["timed_out"] += 1
+                        raise DecodeBusy(f"No decode memory free after {self.timeout:g}s")
+                    self.cond.wait(remaining)
+            finally:
+                self.queue.remove(ticket)
+                # The next in line may fit too (or be the new head after a timeout)
+                self.cond.notify_all()
+
+            waited = time.monotonic() - started
+            self.in_use += nbytes
+            counts = self.counts
+            counts["admitted"] += 1
+            if waited > 0.001:
+                counts["queued"] += 1
+            if nbytes > self.budget_bytes:
+                counts["over_budget"] += 1
+            counts["peak_bytes"] = max(counts["peak_bytes"], self.in_use)
+            counts["max_wait_ms"] = max(counts["max_wait_ms"], waited * 1000)
+            return waited
+
+    def _release(self, nbytes):
+        with self.cond:
+            self.in_use -= nbytes
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            return dict(self.counts, budget_bytes=self.budget_bytes, max_pixels=self.max_pixels,
+                        in_use_bytes=self.in_use, waiting=len(self.queue))
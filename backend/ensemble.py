@@ -0,0 +1,67 @@
+"""
+Concurrent multi-model scoring for the mammogram ensemble.
+
+Each member model gets its own thread pool, so the ViT and the VGG16 run
+side by side (TensorFlow releases the GIL inside ops) and one slow model
+can't starve the other's workers. Member probabilities are combined as a
+weighted average.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+DEFAULT_WEIGHTS = {"vit": 0.5, "vgg16": 0.5}
+
+
+def parse_weights(spec):
+    """'vit:0.6,vgg16:0.4' -> {'vit': 0.6, 'vgg16': 0.4}"""
+    if not spec:
+        return dict(DEFAULT_WEIGHTS)
+    weights = {}
+    for part in spec.split(","):
+        name, _, value = part.partition(":")
+        weights[name.strip()] = float(value)
+    if any(w < 0 for w in weights.values()) or not sum(weights.values()):
+        raise ValueError(f"Invalid ensemble weights: {spec!r}")
+    return weights
+
+
+class EnsembleScorer:
+    def __init__(self, weights=None, workers_per_model=None):
+        self.weights = weights or dict(DEFAULT_WEIGHTS)
+        self.workers = workers_per_model or int(os.environ.get("ENSEMBLE_WORKERS", 2))
+        self.pools = {}
+        self.lock = threading.Lock()
+
+    def pool(self, name):
+        pool = self.pools.get(name)
+        if pool:
+            return pool
+        # Request threads race to create a member's pool; only one may win
+        with self.lock:
+            if name not in self.pools:
+                self.pools[name] = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix=f"ensemble-{name}"
+                )
+            return self.pools[name]
+
+    def submit(self, name, predict_fn, *args):
+        """Starts one member; predict_fn(*args) must return class probabilities."""
+        return self.pool(name).submit(predict_fn, *args)
+
+    def combine(self, futures):
+        """
+        Waits for {name: future} and returns (combined_probs, {name: probs}).
+        Members are weighted by self.weights; the weights of the members that
+        actually ran are renormalised to sum to 1.
+        """
+        member_probs = {name: np.asarray(future.result(), dtype=np.float64)
+                        for name, future in futures.items()}
+        total = sum(self.weights.get(name, 0.0) for name in member_probs)
+        if not total:
+            raise ValueError("None of the ensemble members has a positive weight")
+        combined = sum(self.weights.get(name, 0.0) * probs for name, probs in member_probs.items()) / total
+        return combined, member_probs
@@ -0,0 +1,206 @@
+"""
+Attention-rollout heatmaps for the mammogram ViT.
+
+AttentionExplainer runs the served model's own layers (shared weights, no
+copy) in a forward pass that also returns the attention scores of every
+MultiHeadAttention block, so one pass yields both the logits and
+everything rollout needs.
+
+Rollout (Abnar & Zuidema, 2020) averages each block's attention over the
+heads, mixes in the residual connection as 0.5 * A + 0.5 * I, and
+multiplies the blocks together. This ViT has no class token (the head
+flattens every patch), so a patch's relevance is its mean rolled-out
+attention over all output tokens.
+
+HeatmapWorker batches requests from the on-demand endpoint and the
+optional post-upload precompute into a single explainer call.
+"""
+
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+import cv2
+import keras
+import numpy as np
+import tensorflow as tf
+
+from thumbnails import DERIVATIVE_SIZES, downscale
+
+HEATMAP_ALPHA = 0.45
+DEFAULT_BATCH_SIZE = 8
+# How long the worker waits for more jobs to fill a batch
+DEFAULT_BATCH_WAIT = 0.05
+
+_explainers = weakref.WeakKeyDictionary()
+_explainers_lock = threading.Lock()
+
+
+class AttentionExplainer:
+    """
+    Runs a functional ViT layer by layer, calling each MultiHeadAttention
+    block with return_attention_scores=True. The walk is compiled once
+    with tf.function.
+
+    (Re-wiring the layers into a second keras.Model would be neater, but
+    Keras drops return_attention_scores when an attention layer that has
+    already been called is called again symbolically.)
+    """
+
+    def __init__(self, model):
+        # (layer, input tensor id(s), output tensor id), read from the graph once
+        self.steps = []
+        for layer in model.layers:
+            if isinstance(layer, keras.layers.InputLayer):
+                continue
+            inputs = layer.input
+            if isinstance(inputs, (list, tuple)):
+                input_ids = [id(t) for t in inputs]
+            else:
+                input_ids = id(inputs)
+            self.steps.append((layer, input_ids, id(layer.output)))
+        self.input_id = id(model.inputs[0])
+        self.output_id = id(model.outputs[0])
+        self.forward = tf.function(self._forward, reduce_retracing=True)
+
+    def _forward(self, images):
+        computed = {self.input_id: images}
+        scores = []
+        for layer, input_ids, output_id in self.steps:
+            if isinstance(input_ids, list):
+                inputs = [computed[i] for i in input_ids]
+            else:
+                inputs = computed[input_ids]
+            if isinstance(layer, keras.layers.MultiHeadAttention):
+                query, value = inputs
+                result, block_scores = layer(query, value, return_attention_scores=True)
+                scores.append(block_scores)
+            else:
+                result = layer(inputs)
+            computed[output_id] = result
+        return computed[self.output_id], scores
+
+    def __call__(self, images):
+        """images (batch, 224, 224, 1) -> (logits, [scores per block]) as numpy."""
+        logits, scores = self.forward(tf.convert_to_tensor(images))
+        return logits.numpy(), [block.numpy() for block in scores]
+
+
+def explainer_for(model):
+    """Cached AttentionExplainer; entries go away with the served model."""
+    with _explainers_lock:
+        explainer = _explainers.get(model)
+        if explainer is None:
+            explainer = _explainers[model] = AttentionExplainer(model)
+        return explainer
+
+
+def attention_rollout(scores):
+    """
+    scores: list of (batch, heads, tokens, tokens) arrays, first block first.
+    Returns (batch, tokens) relevance, scaled to [0, 1] per image.
+    """
+    rollout = None
+    for block in scores:
+        attention = np.asarray(block, dtype=np.float32).mean(axis=1)
+        identity = np.eye(attention.shape[-1], dtype=np.float32)
+        attention = 0.5 * attention + 0.5 * identity
+        attention /= attention.sum(axis=-1, keepdims=True)
+        rollout = attention if rollout is None else attention @ rollout
+
+    relevance = rollout.mean(axis=1)
+    low = relevance.min(axis=1, keepdims=True)
+    span = relevance.max(axis=1, keepdims=True) - low
+    return (relevance - low) / np.where(span > 0, span, 1.0)
+
+
+def heatmap_overlay(gray, relevance, alpha=HEATMAP_ALPHA, max_side=DERIVATIVE_SIZES["preview"]):
+    """
+    Blends a (tokens,) relevance vector over a grayscale image as a JET
+    heatmap. The output is capped at preview size; returns a BGR array.
+    """
+    base = downscale(np.asarray(gray), max_side)
+    grid = int(round(np.sqrt(relevance.size)))
+    heat = relevance.reshape(grid, grid).astype(np.float32)
+    heat = cv2.resize(heat, (base.shape[1], base.shape[0]), interpolation=cv2.INTER_CUBIC)
+    heat = cv2.applyColorMap(np.clip(heat * 255, 0, 255).astype(np.uint8), cv2.COLORMAP_JET)
+    return cv2.addWeighted(cv2.cvtColor(base, cv2.COLOR_GRAY2BGR), 1 - alpha, heat, alpha, 0)
+
+
+class HeatmapWorker:
+    """
+    Background thread that runs jobs in batches. Jobs are keyed (e.g. by
+    scan id); submitting a key that is already queued or running returns
+    the existing future instead of doing the work twice.
+    """
+
+    def __init__(self, process_batch, batch_size=DEFAULT_BATCH_SIZE,
+                 batch_wait=DEFAULT_BATCH_WAIT, queue_size=256):
+        """process_batch(jobs) -> {key: result}; a missing key fails its job."""
+        self.process_batch = process_batch
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.pending = {}  # key -> Future
+        self.worker = None
+
+    def submit(self, key, job, block=True):
+        """
+        Queues job under key and returns its Future. With block=False a full
+        queue returns None instead of waiting (used for best-effort precompute).
+        """
+        with self.lock:
+            future = self.pending.get(key)
+            if future is not None:
+                return future
+            future = self.pending[key] = Future()
+        try:
+            self.queue.put((key, job), block=block)
+        except queue.Full:
+            with self.lock:
+                self.pending.pop(key, None)
+            return None
+        self.start()
+        return future
+
+    def start(self):
+        if self.worker:
+            return
+        with self.lock:
+            if self.worker:
+                return
+            self.worker = threading.Thread(target=self.run, name="heatmap-worker", daemon=True)
+            self.worker.start()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.finish(batch)
+
+    def finish(self, batch):
+        try:
+            results = self.process_batch(batch)
+            error = None
+        except Exception as e:
+            results, error = {}, e
+        for key, _ in batch:
+            with self.lock:
+                future = self.pending.pop(key, None)
+            if future is None:
+                continue
+            if key in results:
+                future.set_result(results[key])
+            else:
+                future.set_exception(error or RuntimeError(f"Heatmap failed for {key}"))
@@ -0,0 +1,276 @@
+"""
+Versioned model registry with hot reload.
+
+Artifacts live under a registry directory next to a manifest that names
+the active version of each model:
+
+    models/registry/
+      manifest.json
+      vit/2026-10-01/vit_mammogram_model.keras
+      unet/2026-09-12/ultrasound_unet_model.h5
+
+    {
+      "vit": {
+        "active": "2026-10-01",
+        "versions": {
+          "2026-10-01": {"path": "vit/2026-10-01/vit_mammogram_model.keras",
+                         "sha256": "..."}
+        }
+      }
+    }
+
+Requests take a ModelHandle (model + version) once and use it to the end,
+so a reload builds and warms the new version in the background and then
+replaces the handle in one assignment: in-flight requests finish on the
+old model, new ones get the new one, and nothing waits on the load.
+
+Each worker process polls the manifest (start_watcher), so activating a
+version in the manifest rolls it out to every worker. A model missing from
+the manifest is loaded from its legacy fixed path with version "legacy"
+(models with no legacy path are simply left unloaded).
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import traceback
+from collections import namedtuple
+
+import numpy as np
+
+MANIFEST_NAME = "manifest.json"
+LEGACY_VERSION = "legacy"
+
+# load(path) -> model; warm_shape is a dummy batch run once before swap-in
+ModelSpec = namedtuple("ModelSpec", ["load", "warm_shape", "legacy_path"])
+
+
+class ModelHandle:
+    """An immutable (name, version, model) triple handed to requests."""
+
+    def __init__(self, name, version, model, path):
+        self.name = name
+        self.version = version
+        self.model = model
+        self.path = path
+        self.loaded_at = time.time()
+
+    @property
+    def label(self):
+        """e.g. 'vit@2026-10-01', the value recorded in responses and scans."""
+        return f"{self.name}@{self.version}"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    def __init__(self, root, specs):
+        self.root = root
+        self.specs = specs
+        self.handles = {}       # name -> ModelHandle currently served
+        self.state = {}         # name -> last load attempt, for /admin/models
+        self.load_lock = threading.Lock()  # one load at a time bounds peak memory
+        self.manifest_mtime = None
+        self.watcher = None
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.root, MANIFEST_NAME)
+
+    # --- serving ---
+
+    def get(self, name):
+        """The handle to use for one request, or None if the model isn't loaded."""
+        return self.handles.get(name)
+
+    def put(self, name, version, model, path=None):
+        """Installs an already built model (e.g. in benchmarks)."""
+        handle = ModelHandle(name, version, model, path)
+        self.handles[name] = handle
+        return handle
+
+    # --- manifest ---
+
+    def read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def write_manifest(self, manifest):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def resolve(self, name, version=None, manifest=None):
+        """
+        Returns (version, artifact_path, sha256 or None) for a model. With no
+        version, the manifest's active one (or the legacy path) is used.
+        """
+        entry = (manifest if manifest is not None else self.read_manifest()).get(name)
+        if not entry:
+            if version not in (None, LEGACY_VERSION):
+                raise ValueError(f"No versions of '{name}' in the registry")
+            return LEGACY_VERSION, self.specs[name].legacy_path, None
+
+        version = version or entry.get("active")
+        artifact = entry.get("versions", {}).get(version)
+        if not artifact:
+            raise ValueError(f"Unknown version '{version}' for model '{name}'")
+        return version, os.path.join(self.root, artifact["path"]), artifact.get("sha256")
+
+    def activate(self, name, version):
+        """Marks version active in the manifest (picked up by every worker's watcher)."""
+        manifest = self.read_manifest()
+        self.resolve(name, version, manifest)
+        if name not in manifest:
+            # Nothing registered yet: the legacy path is already what resolve() serves
+            return
+        manifest[name]["active"] = version
+        self.write_manifest(manifest)
+
+    # --- loading ---
+
+    def load(self, name, version=None):
+        """
+        Loads, verifies and warms a version, then swaps it in. On failure the
+        previous version keeps serving and the error is recorded in state.
+        Returns the new handle or None.
+        """
+        spec = self.specs[name]
+        with self.load_lock:
+            try:
+                version, path, sha256 = self.resolve(name, version)
+            except ValueError as e:
+                self.state[name] = {"status": "failed", "error": str(e)}
+                print(f"❌ {name}: {e}")
+                return None
+            current = self.handles.get(name)
+            if current and current.version == version:
+                return current
+            if not path:
+                # Optional model (e.g. a shadow candidate) not in the manifest;
+                # removing its entry unloads it
+                if self.handles.pop(name, None):
+                    print(f"{name} unloaded.")
+                self.state[name] = {"status": "not configured"}
+                return None
+            if not os.path.exists(path):
+                self.state[name] = {"status": "missing", "version": version, "path": path}
+                print(f"⚠️ Warning: {name} model NOT found at {path}. (Skipping)")
+                return None
+
+            self.state[name] = {"status": "loading", "version": version, "path": path}
+            started = time.time()
+            try:
+                if sha256 and file_sha256(path) != sha256:
+                    raise ValueError(f"Checksum mismatch for {path}")
+                print(f"🔹 Loading {name} {version} from {path}...")
+                model = spec.load(path)
+                loaded = time.time()
+                # First predict builds the inference function; pay for it here
+                # rather than on the first clinician request
+                model.predict(np.zeros(spec.warm_shape, dtype=np.float32), verbose=0)
+                warmed = time.time()
+            except Exception as e:
+                self.state[name] = {"status": "failed", "version": version, "path": path, "error": str(e)}
+                print(f"❌ Error loading {name} {version}: {e}")
+                traceback.print_exc()
+                return None
+
+            handle = ModelHandle(name, version, model, path)
+            self.handles[name] = handle
+            self.state[name] = {
+                "status": "active",
+                "version": version,
+                "path": path,
+                "load_seconds": round(loaded - started, 3),
+                "warm_seconds": round(warmed - loaded, 3),
+            }
+            previous = f" (was {current.version})" if current else ""
+            print(f"✅ {name} {version} active{previous}.")
+            return handle
+
+    def load_all(self):
+        for name in self.specs:
+            self.load(name)
+
+    def sync(self):
+        """Loads every model whose manifest version differs from the one served."""
+        try:
+            manifest = self.read_manifest()
+        except (OSError, ValueError) as e:
+            print(f"Model manifest unreadable, keeping current models: {e}")
+            return
+        for name in self.specs:
+            try:
+                version, _, _ = self.resolve(name, manifest=manifest)
+            except ValueError as e:
+                print(f"❌ {name}: {e}")
+                continue
+            current = self.handles.get(name)
+            if not current or current.version != version:
+                self.load(name, version)
+
+    def load_in_background(self, name=None, version=None):
+        """Starts load(name, version), or sync() with no name, on a daemon thread."""
+        target = self.sync if name is None else (lambda: self.load(name, version))
+        thread = threading.Thread(target=target, name="model-reload", daemon=True)
+        thread.start()
+        return thread
+
+    # --- watcher ---
+
+    def start_watcher(self, interval):
+        """Polls the manifest every interval seconds and syncs on change."""
+        if self.watcher or interval <= 0:
+            return
+        self.manifest_mtime = self._manifest_mtime()
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                mtime = self._manifest_mtime()
+                if mtime != self.manifest_mtime:
+                    self.manifest_mtime = mtime
+                    print("Model manifest changed, syncing...")
+                    self.sync()
+
+        self.watcher = threading.Thread(target=watch, name="model-watcher", daemon=True)
+        self.watcher.start()
+
+    def _manifest_mtime(self):
+        try:
+            return os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    # --- reporting ---
+
+    def status(self):
+        try:
+            manifest = self.read_manifest()
+        except (OSError, ValueError) as e:
+            manifest = {}
+            print(f"Model manifest unreadable: {e}")
+        report = {}
+        for name in self.specs:
+            handle = self.handles.get(name)
+            entry = manifest.get(name, {})
+            report[name] = {
+                "serving": handle.version if handle else None,
+                "loaded_at": handle.loaded_at if handle else None,
+                "manifest_active": entry.get("active"),
+                "available": sorted(entry.get("versions", {})),
+                "last_load": self.state.get(name),
+            }
+        return report
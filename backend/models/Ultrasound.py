@@ -28,52 +28,22 @@ IMG_CHANNELS = 3
 
 print("Libraries imported.")
 
-def load_data(root_path):
-    images = []
-    masks = []
-
-    print("Scanning for images and masks...")
-
-    for root, dirs, files in os.walk(root_path):
-        for file in files:
-            # We look for original images (not masks) first
-            if 'mask' not in file and file.lower().endswith('.png'):
-
-                # Construct the path to the image
-                img_path = os.path.join(root, file)
-
-                # Construct the expected path to the mask
-                # (Assumes mask has same name but adds '_mask')
-                mask_name = file.replace('.png', '_mask.png')
-                mask_path = os.path.join(root, mask_name)
-
-                # Only proceed if the mask actually exists
-                if os.path.exists(mask_path):
-                    # Load and Resize Image
-                    img = cv2.imread(img_path)
-                    img = cv2.resize(img, (IMG_WIDTH, IMG_HEIGHT))
-
-                    # Load and Resize Mask (Load as grayscale)
-                    mask = cv2.imread(mask_path, 0)
-                    mask = cv2.resize(mask, (IMG_WIDTH, IMG_HEIGHT))
-                    mask = np.expand_dims(mask, axis=-1) # Add depth for AI processing
-
-                    images.append(img)
-                    masks.append(mask)
-
-    return np.array(images), np.array(masks)
-
-# Load the data from the folder we created in Cell 1
-X, y = load_data('./dataset')
-
-print(f"Successfully loaded {len(X)} image/mask pairs.")
-
-# Normalize the pixel data (0 to 1 range)
-X = X / 255.0
-y = y / 255.0 # Masks become 0 or 1
-
-# Split into Training (90%) and Test (10%) sets
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.1, random_state=42)
+# Stream image/mask pairs from disk instead of loading the whole dataset
+# into RAM (upload backend/training next to this notebook on Colab)
+from training import ultrasound_data
+
+pairs = ultrasound_data.find_pairs('./dataset')
+print(f"Found {len(pairs)} image/mask pairs.")
+
+# Split the file list into Training (81%), Validation (9%) and Test (10%)
+train_pairs, test_pairs = train_test_split(pairs, test_size=0.1, random_state=42)
+train_pairs, val_pairs = train_test_split(train_pairs, test_size=0.1, random_state=42)
+
+# Decoded, jointly augmented and normalised (0 to 1) one batch at a time
+train_ds = ultrasound_data.make_dataset(train_pairs, batch_size=16, augment=True, shuffle=True)
+val_ds = ultrasound_data.make_dataset(val_pairs, batch_size=16)
+# The test set is small enough to hold for plotting
+X_test, y_test = ultrasound_data.load_arrays(test_pairs)
 print("Data ready for training.")
 
 def build_unet(input_shape):
@@ -132,9 +102,8 @@ model = build_unet((IMG_WIDTH, IMG_HEIGHT, IMG_CHANNELS))
 print("Model built successfully.")
 
 print("Starting training...")
-history = model.fit(X_train, y_train,
-                    validation_split=0.1,
-                    batch_size=16,
+history = model.fit(train_ds,
+                    validation_data=val_ds,
                     epochs=15,
                     verbose=1)
 print("Training finished.")
@@ -226,56 +195,32 @@ IMG_CHANNELS = 3
 
 print("Libraries imported. GPU Available: ", len(tf.config.list_physical_devices('GPU')) > 0)
 
-"""Smart Data Loading
+"""Streaming Data Loading
 Notes for Colab:
 
-This is the same robust loader as before. It scans the dataset_intense folder.
+Only the file list is kept in memory. Images and masks are decoded in parallel, one batch at a time, and stay uint8 until they are batched.
 
-It normalizes images (dividing by 255) immediately to save RAM.
+Training pairs get the same random flip/rotation/zoom/shift applied to the image and its mask, so the labels stay aligned.
 """
 
-def load_data(root_path):
-    images = []
-    masks = []
-
-    print("Scanning for data...")
-    for root, dirs, files in os.walk(root_path):
-        for file in files:
-            if 'mask' not in file and file.lower().endswith('.png'):
-                img_path = os.path.join(root, file)
-                mask_name = file.replace('.png', '_mask.png')
-                mask_path = os.path.join(root, mask_name)
-
-                if os.path.exists(mask_path):
-                    # Load Image
-                    img = cv2.imread(img_path)
-                    img = cv2.resize(img, (IMG_WIDTH, IMG_HEIGHT))
-                    images.append(img)
+from training import ultrasound_data
 
-                    # Load Mask (Grayscale)
-                    mask = cv2.imread(mask_path, 0)
-                    mask = cv2.resize(mask, (IMG_WIDTH, IMG_HEIGHT))
-                    mask = np.expand_dims(mask, axis=-1)
-                    masks.append(mask)
-
-    return np.array(images), np.array(masks)
-
-# Load data
-X, y = load_data('./dataset_intense')
+pairs = ultrasound_data.find_pairs('./dataset_intense')
 
 # Check if data loaded correctly
-if len(X) == 0:
+if len(pairs) == 0:
     print("ERROR: No images found. Check your zip file structure.")
 else:
-    print(f"Loaded {len(X)} images and masks.")
+    print(f"Found {len(pairs)} image/mask pairs.")
 
-    # Normalize
-    X = X / 255.0
-    y = y / 255.0
+    # Split Data (by file, before anything is decoded)
+    train_pairs, test_pairs = train_test_split(pairs, test_size=0.1, random_state=42)
+    train_pairs, val_pairs = train_test_split(train_pairs, test_size=0.1, random_state=42)
 
-    # Split Data
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.1, random_state=42)
-    print("Data normalized and split ready for intense training.")
+    train_ds = ultrasound_data.make_dataset(train_pairs, batch_size=16, augment=True, shuffle=True)
+    val_ds = ultrasound_data.make_dataset(val_pairs, batch_size=16)
+    X_test, y_test = ultrasound_data.load_arrays(test_pairs)
+    print("Data pipeline ready for intense training.")
 
 """Filters: We start at 32 filters (instead of 16) for deeper feature detection.
 
@@ -377,11 +322,10 @@ early_stopper = EarlyStopping(patience=10, verbose=1)
 reduce_lr = ReduceLROnPlateau(factor=0.1, patience=5, min_lr=0.00001, verbose=1)
 
 print("Starting intense training...")
-history = model.fit(X_train, y_train,
-                    batch_size=16,
+history = model.fit(train_ds,
+                    validation_data=val_ds,
                     epochs=50,
                     verbose=1,
-                    validation_split=0.1,
                     callbacks=[early_stopper, reduce_lr])
 
 print("Training finished.")
@@ -435,33 +379,23 @@ Standard "Accuracy" is misleading in cancer detection because most of the image
 You need Dice Coefficient and IoU (Intersection over Union). These measure the overlap between the Doctor's mask and the AI's mask.
 """
 
-from tensorflow.keras import backend as K
-
-def dice_coef(y_true, y_pred):
-    y_true_f = K.flatten(y_true)
-    y_pred_f = K.flatten(y_pred)
-    intersection = K.sum(y_true_f * y_pred_f)
-    return (2. * intersection + 1) / (K.sum(y_true_f) + K.sum(y_pred_f) + 1)
-
-def iou_coef(y_true, y_pred):
-    y_true_f = K.flatten(y_true)
-    y_pred_f = K.flatten(y_pred)
-    intersection = K.sum(y_true_f * y_pred_f)
-    union = K.sum(y_true_f) + K.sum(y_pred_f) - intersection
-    return (intersection + 1) / (union + 1)
+# Stream the test set batch by batch: Dice/IoU are accumulated from pixel
+# counts, so nothing but the current batch is held in memory
+from training import evaluation
 
-# Calculate on the test set
-# Note: We use the raw predictions (probabilities), not the thresholded ones, for smoother calculation
-results = model.evaluate(X_test, y_test, verbose=0)
+test_ds = ultrasound_data.make_dataset(test_pairs, batch_size=16)
+results = model.evaluate(test_ds, verbose=0)
 print(f"Standard Accuracy: {results[1]*100:.2f}%")
 
-# Calculate specific Dice/IoU
-predictions = model.predict(X_test, verbose=0)
-dice = dice_coef(tf.cast(y_test, tf.float32), tf.cast(predictions, tf.float32))
-iou = iou_coef(tf.cast(y_test, tf.float32), tf.cast(predictions, tf.float32))
+# Masks and predictions are thresholded at 0.5 before comparing
+seg_results = evaluation.evaluate({"unet": ("unet", model)}, test_ds.as_numpy_iterator())
+evaluation.write_report(seg_results, "ultrasound_test_report.json")
+dice, iou = seg_results["unet"]["dice"], seg_results["unet"]["iou"]
 
-print(f"Dice Score (Overlap Accuracy): {dice.numpy():.4f}")
-print(f"IoU Score (Intersection over Union): {iou.numpy():.4f}")
+print(f"Dice Score (Overlap Accuracy): {dice:.4f}")
+print(f"IoU Score (Intersection over Union): {iou:.4f}")
+print(f"Per-image Dice: mean {seg_results['unet']['mean_image_dice']:.4f}, "
+      f"median {seg_results['unet']['median_image_dice']:.2f}")
 
 """Test on a Single New Image (Simulation)
 Imagine you are a doctor and you just took a new ultrasound. You want to see if the AI can handle a raw image that it has never seen before (and that doesn't have a mask yet).
@@ -277,99 +277,34 @@ print("--- 🩺 Building the Mammogram Dataset for Modeling (Fixing Merge) ---")
 image_dir = 'cbis_ddsm/jpeg'
 csv_dir = 'cbis_ddsm/csv'
 
-# 2. Load ALL FOUR description CSVs
-print("Loading all 4 label CSVs (calc/mass, train/test)...")
+# 2. Build (or refresh) the labelled manifest: merges the four label CSVs
+# with dicom_info.csv, fixes the paths and checks which files exist.
+# The folder index is cached next to the manifest, so later runs only
+# re-list folders that changed (upload backend/training next to this
+# notebook on Colab/Kaggle)
+from training import cbis_manifest
+
+manifest_path = 'cbis_ddsm/manifest.csv'
+print("Building the image manifest (cached at", manifest_path, ")...")
 try:
-    calc_train_df = pd.read_csv(os.path.join(csv_dir, 'calc_case_description_train_set.csv'))
-    mass_train_df = pd.read_csv(os.path.join(csv_dir, 'mass_case_description_train_set.csv'))
-    calc_test_df = pd.read_csv(os.path.join(csv_dir, 'calc_case_description_test_set.csv'))
-    mass_test_df = pd.read_csv(os.path.join(csv_dir, 'mass_case_description_test_set.csv'))
+    final_data_df = cbis_manifest.build_manifest(
+        csv_dir, image_dir, manifest_path,
+        dicom_data=dicom_data if 'dicom_data' in locals() else None,
+    )
 except FileNotFoundError as e:
     print(f"❌ Error loading CSVs: {e}\nPlease check the dataset path. Stopping.")
     raise e
 
-# 3. Combine them to get a PatientID-to-Label mapping
-all_labels_df = pd.concat([calc_train_df, mass_train_df, calc_test_df, mass_test_df], ignore_index=True)
-all_labels_df = all_labels_df[['patient_id', 'pathology']]
-# Clean the 'patient_id' column by removing any hidden spaces
-all_labels_df['patient_id'] = all_labels_df['patient_id'].str.strip()
-all_labels_df = all_labels_df.drop_duplicates(subset=['patient_id']).dropna()
-print(f"✅ Found {len(all_labels_df)} unique patient-pathology labels.")
-
-
-# 4. Load the main 'dicom_info.csv' to get all file paths
-try:
-    if 'dicom_data' not in locals():
-         print("Re-loading dicom_info.csv...")
-         dicom_csv_path = os.path.join(csv_dir, 'dicom_info.csv')
-         dicom_data = pd.read_csv(dicom_csv_path)
-
-    # 5. Filter dicom_data to get ONLY the cropped images
-    cropped_df = dicom_data[dicom_data.SeriesDescription == 'cropped images'].copy()
-
-    # --- THIS IS THE FIX ---
-    # Extract the 'P_XXXXX' pattern from the long PatientID string
-    # This creates a new column with just the simple ID
-    print("Extracting simple patient IDs (e.g., 'P_00001') from 'dicom_info'...")
-    cropped_df['extracted_patient_id'] = cropped_df['PatientID'].str.extract(r'(P_\d{5})')
-    # -----------------------
-
-    print(f"🖼️ Found {len(cropped_df)} total 'cropped image' paths in dicom_info.csv")
-
-    # --- DEBUGGING: Let's look at the *new* keys before merging ---
-    print("\n--- DEBUGGING INFO ---")
-    print("Example 'patient_id' from labels CSVs:\n", all_labels_df['patient_id'].head(3))
-    print("\nExample 'extracted_patient_id' from dicom_info CSV:\n", cropped_df['extracted_patient_id'].head(3))
-    print("------------------------\n")
-
-    # 6. Merge the cropped image paths with the patient labels
-    final_data_df = cropped_df.merge(
-        all_labels_df,
-        left_on='extracted_patient_id',  # <-- Use the new extracted ID
-        right_on='patient_id',          # <-- Use the simple ID
-        how='left'
-    )
-
-    # 7. Clean the merged data
-    final_data_df = final_data_df.dropna(subset=['image_path', 'pathology'])
-    print(f"✅ Merged paths and labels. Found {len(final_data_df)} cropped images with a matching pathology label.")
-
-except Exception as e:
-    print(f"❌ Error: Could not load or process 'dicom_info.csv'. Please re-run Cell 2 first.")
-    print(f"Details: {e}")
-    raise
-
-# 8. Create the full, correct file paths
-def fix_dicom_path(dicom_path):
-    try:
-        full_path = dicom_path.replace('CBIS-DDSM/jpeg', image_dir)
-        return full_path
-    except:
-        return None
-
-final_data_df['full_path'] = final_data_df['image_path'].apply(fix_dicom_path)
-print("Created full file paths for all images.")
-
-# 9. Sort the *valid* file paths into cancer/non-cancer lists
-non_cancer_imgs = []
-cancer_imgs = []
-
-print("Verifying all file paths actually exist (this may take a moment)...")
-for index, row in final_data_df.iterrows():
-    pathology = row['pathology']
-    full_path = row['full_path']
-
-    if full_path and os.path.exists(full_path):
-        if pathology == 'MALIGNANT':
-            cancer_imgs.append(full_path)
-        elif pathology == 'BENIGN' or pathology == 'BENIGN_WITHOUT_CALLBACK':
-            non_cancer_imgs.append(full_path)
+# 3. Sort the *valid* file paths into cancer/non-cancer lists
+valid_df = final_data_df[final_data_df['exists']]
+non_cancer_imgs = valid_df.loc[valid_df['label'] == 0, 'full_path'].tolist()
+cancer_imgs = valid_df.loc[valid_df['label'] == 1, 'full_path'].tolist()
 
 print(f"\n--- ✅ Verification Complete ---")
 print(f"Total valid Non-Cancer (Benign) paths found: {len(non_cancer_imgs)}")
 print(f"Total valid Cancer (Malignant) paths found: {len(cancer_imgs)}")
 
-# 10. Balance the dataset by sampling
+# 4. Balance the dataset by sampling
 min_class_size = min(len(non_cancer_imgs), len(cancer_imgs))
 
 if min_class_size > 0:
@@ -407,53 +342,28 @@ import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 
-def read_and_resize_mammogram(path, size=(50,50)):
-    """
-    Reads a grayscale mammogram, resizes it,
-    and converts it to a 3-channel image to match the CNN input.
-    """
-    try:
-        # Read the image in grayscale mode
-        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
-        if img is None:
-            return None
-
-        # Convert the 1-channel grayscale to 3-channel
-        # (This just duplicates the gray channel 3 times)
-        img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
-
-        # Resize to the (50, 50) size your model expects
-        img = cv2.resize(img, size, interpolation=cv2.INTER_LINEAR)
-        return img
-    except Exception as e:
-        # print(f"Error reading or processing {path}: {e}") # Uncomment to debug
-        return None
-
-# --- Now, loop through our 'non_cancer_imgs' and 'cancer_imgs' lists from Cell 7 ---
+# --- Decode every image from Cell 7 once, at every size this notebook uses ---
+# The 50x50 (CNN) and 150x150 (VGG16) versions land in uint8 memmaps under
+# cache_dir, so this cell and Cell 16 slice arrays instead of re-reading
+# files, and re-running the notebook skips decoding entirely
+from training import image_cache
 
-non_img_arr = []
-can_img_arr = []
+cache_dir = 'cbis_ddsm/image_cache'
+cache_variants = {name: image_cache.DEFAULT_VARIANTS[name] for name in ('cnn_50', 'vgg_150')}
 
-print(f"\n--- ⏳ Loading {len(non_cancer_imgs)} Non-Cancer (Benign) images... ---")
-# Use tqdm for a nice progress bar
-for img_path in tqdm(non_cancer_imgs, desc="Loading Non-Cancer", unit="img"):
-    img = read_and_resize_mammogram(img_path, (50,50))
-    if img is not None:
-        non_img_arr.append([img, 0]) # 0 for Non-Cancer (Benign)
-
-print(f"\n--- ⏳ Loading {len(cancer_imgs)} Cancer (Malignant) images... ---")
-for img_path in tqdm(cancer_imgs, desc="Loading Cancer", unit="img"):
-    img = read_and_resize_mammogram(img_path, (50,50))
-    if img is not None:
-        can_img_arr.append([img, 1]) # 1 for Cancer (Malignant)
+print(f"\n--- ⏳ Caching {len(non_cancer_imgs) + len(cancer_imgs)} images (50x50 and 150x150)... ---")
+mammo_cache = image_cache.ensure_cache(non_cancer_imgs + cancer_imgs, cache_dir, cache_variants,
+                                       workers=os.cpu_count())
 
 # --- Combine, shuffle, and convert to final arrays ---
 print("\nCombining and shuffling the dataset...")
-breast_img_arr = non_img_arr + can_img_arr
+breast_img_arr = [(path, 0) for path in non_cancer_imgs] + [(path, 1) for path in cancer_imgs]
 random.shuffle(breast_img_arr)
+# Drop images that failed to decode, as the old loader did
+breast_img_arr = [item for item, ok in zip(breast_img_arr, mammo_cache.valid([i[0] for i in breast_img_arr])) if ok]
 
 # Create the final X and y arrays
-X = np.array([i[0] for i in breast_img_arr], dtype=np.float32)
+X = mammo_cache.take('cnn_50', [i[0] for i in breast_img_arr]).astype(np.float32)
 y = np.array([i[1] for i in breast_img_arr], dtype=np.int32)
 
 print('✅ Done.')
@@ -491,7 +401,7 @@ if len(X) > 0:
     print("\n✅ Cell 8: Successfully loaded, processed, and verified the image data.")
 else:
     print("\n❌ Error: The 'X' array is empty. No images were loaded.")
-    print("This likely means the 'read_and_resize_mammogram' function failed.")
+    print("This likely means the image cache could not decode any of the files.")
 
 # --------------------------
 # 7) Preprocess (normalize) (CELL 9)
@@ -861,28 +771,10 @@ from PIL import Image # --- Import PIL (Pillow) ---
 IMG_SIZE = 150
 print(f"--- 🖼️ Reloading all images at {IMG_SIZE}x{IMG_SIZE} ---")
 
-# --- 1. Re-define the loading function using PIL ---
-def read_and_resize_mammogram_large(path, size=(IMG_SIZE, IMG_SIZE)):
-    """
-    Reads a mammogram using PIL, resizes it,
-    and converts it to a 3-channel image.
-    """
-    try:
-        # Open the image file with PIL
-        img = Image.open(path)
-
-        # Convert to 3-channel RGB
-        # (PIL handles grayscale-to-RGB conversion correctly)
-        img = img.convert("RGB")
-
-        # Resize to the new, larger (150, 150) size
-        img = img.resize(size, Image.LANCZOS) # Use a high-quality resizer
-
-        # Convert the PIL image to a numpy array
-        return np.array(img)
-    except Exception as e:
-        print(f"Error opening {path}: {e}")
-        return None
+# --- 1. The 150x150 images were decoded in Cell 8 (PIL, RGB, LANCZOS) ---
+# They are read back from the image cache instead of re-opening every file
+if 'mammo_cache' not in locals():
+    mammo_cache = image_cache.ensure_cache(non_cancer_imgs + cancer_imgs, cache_dir, cache_variants)
 
 # --- 2. Re-create the master list using the PATHS from Cell 7 ---
 all_paths_list = []
@@ -898,18 +790,14 @@ else:
     print("❌ Error: 'non_cancer_imgs' or 'cancer_imgs' lists not found. Please re-run Cell 7.")
     raise NameError("Missing path lists from Cell 7")
 
-# --- 3. Loop through all paths and load them ---
-new_image_list = []
-for img_path, label in tqdm(all_paths_list, desc="Reloading images at 150x150"):
-    img = read_and_resize_mammogram_large(img_path, (IMG_SIZE, IMG_SIZE))
-    if img is not None:
-        new_image_list.append([img, label]) # [image_array, label]
+# --- 3. Slice them out of the cache (no decoding) ---
+all_paths_list = [item for item, ok in zip(all_paths_list, mammo_cache.valid([p for p, _ in all_paths_list])) if ok]
 
 # --- 4. Create new X and y arrays ---
-if len(new_image_list) > 0:
+if len(all_paths_list) > 0:
     # This will overwrite our old 50x50 X and y
-    X_large = np.array([i[0] for i in new_image_list], dtype=np.float32)
-    y_large = np.array([i[1] for i in new_image_list], dtype=np.int32)
+    X_large = mammo_cache.take('vgg_150', [p for p, _ in all_paths_list]).astype(np.float32)
+    y_large = np.array([label for _, label in all_paths_list], dtype=np.int32)
 
     print("\n✅ Reload complete.")
     print("New X_large shape:", X_large.shape)
@@ -112,26 +112,9 @@ for i, category in enumerate(categories):
 plt.tight_layout()
 plt.show()
 
-from sklearn.utils import resample
-
-max_count = df['label'].value_counts().max()
-
-dfs = []
-for category in df['label'].unique():
-    class_subset = df[df['label'] == category]
-    class_upsampled = resample(class_subset,
-                               replace=True,
-                               n_samples=max_count,
-                               random_state=42)
-    dfs.append(class_upsampled)
-
-df_balanced = pd.concat(dfs).sample(frac=1, random_state=42).reset_index(drop=True)
-
-df_balanced
-
-df = df_balanced
-
-df
+# Classes are balanced at batch time (training.sampling.BalancedBatchSampler)
+# after the train/validation split, instead of duplicating minority rows here:
+# duplicates made every epoch longer and leaked copies across the split
 
 import os
 os.environ["KERAS_BACKEND"] = "jax"
@@ -142,13 +125,18 @@ import numpy as np
 import pandas as pd
 from PIL import Image
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import precision_score, recall_score, f1_score
 import matplotlib.pyplot as plt
 
 class MammogramDataset(keras.utils.Sequence):
-    def __init__(self, dataframe, batch_size=32, image_size=224, shuffle=True, **kwargs):
+    def __init__(self, dataframe, batch_size=32, image_size=224, shuffle=True, cache=None, sampler=None, **kwargs):
         super().__init__(**kwargs)
         self.dataframe = dataframe
+        # Optional training.image_cache.ImageCache holding a 'vit_224' variant:
+        # batches are sliced from it instead of decoding every file each epoch
+        self.cache = cache
+        # Optional training.sampling.BalancedBatchSampler over the dataframe's
+        # rows; replaces the plain shuffled order with class-balanced batches
+        self.sampler = sampler
         self.batch_size = batch_size
         self.image_size = image_size
         self.shuffle = shuffle
@@ -164,12 +152,22 @@ class MammogramDataset(keras.utils.Sequence):
         ])
 
     def __len__(self):
+        if self.sampler is not None:
+            return len(self.sampler)
         return int(np.ceil(len(self.dataframe) / self.batch_size))
 
     def __getitem__(self, idx):
-        start_idx = idx * self.batch_size
-        end_idx = min((idx + 1) * self.batch_size, len(self.dataframe))
-        batch_indexes = self.indexes[start_idx:end_idx]
+        if self.sampler is not None:
+            batch_indexes = self.sampler[idx]
+        else:
+            start_idx = idx * self.batch_size
+            end_idx = min((idx + 1) * self.batch_size, len(self.dataframe))
+            batch_indexes = self.indexes[start_idx:end_idx]
+        if self.cache is not None:
+            batch = self.dataframe.iloc[batch_indexes]
+            images = self.cache.take("vit_224", batch["image_path"]).astype(np.float32)
+            labels = batch["label"].map(self.label_map).to_numpy(dtype=np.int32)
+            return self.transform(images), labels
         images = []
         labels = []
         for i in batch_indexes:
@@ -187,7 +185,9 @@ class MammogramDataset(keras.utils.Sequence):
         return images, labels
 
     def on_epoch_end(self):
-        if self.shuffle:
+        if self.sampler is not None:
+            self.sampler.new_epoch()
+        elif self.shuffle:
             np.random.shuffle(self.indexes)
 
 def mlp(x, hidden_units, dropout_rate):
@@ -271,8 +271,25 @@ def create_vit_classifier():
 
 train_df, val_df = train_test_split(df, test_size=0.2, stratify=df["label"], random_state=42)
 
-train_dataset = MammogramDataset(train_df, batch_size=32, image_size=224, shuffle=True)
-val_dataset = MammogramDataset(val_df, batch_size=32, image_size=224, shuffle=False)
+# Decode each (unique) image once at 224x224 grayscale instead of every epoch
+# (upload backend/training next to this notebook on Kaggle/Colab)
+from training import image_cache
+vit_cache = image_cache.ensure_cache(
+    df["image_path"].unique(), "/kaggle/working/image_cache",
+    {"vit_224": image_cache.DEFAULT_VARIANTS["vit_224"]},
+)
+
+# Class-balanced batches drawn from the un-duplicated training rows, reshuffled every epoch
+from training.sampling import BalancedBatchSampler
+train_sampler = BalancedBatchSampler(train_df["label"].to_numpy(), batch_size=32, seed=42)
+balance = train_sampler.summary()
+print(f"Training rows per class: {balance['class_counts']}")
+print(f"Rows per epoch: {balance['rows_per_epoch']} "
+      f"(upsampling to the largest class: {balance['upsampled_rows_per_epoch']}, "
+      f"{1 - balance['rows_per_epoch_ratio']:.0%} fewer rows per epoch)")
+
+train_dataset = MammogramDataset(train_df, batch_size=32, image_size=224, shuffle=True, cache=vit_cache, sampler=train_sampler)
+val_dataset = MammogramDataset(val_df, batch_size=32, image_size=224, shuffle=False, cache=vit_cache)
 
 model = create_vit_classifier()
 optimizer = keras.optimizers.AdamW(learning_rate=0.001, weight_decay=0.0001)
@@ -306,17 +323,13 @@ history = model.fit(
 )
 
 model.load_weights(checkpoint_filepath)
-val_images, val_labels = [], []
-for images, labels in val_dataset:
-    val_images.append(images)
-    val_labels.append(labels)
-val_images = np.concatenate(val_images, axis=0)
-val_labels = np.concatenate(val_labels, axis=0)
-predictions = model.predict(val_images)
-predicted_labels = np.argmax(predictions, axis=1)
-precision = precision_score(val_labels, predicted_labels)
-recall = recall_score(val_labels, predicted_labels)
-f1 = f1_score(val_labels, predicted_labels)
+# Stream the validation batches through the model; only running counts are
+# kept, so memory doesn't grow with the validation set
+from training import evaluation
+val_results = evaluation.evaluate({"vit": ("vit", model)}, val_dataset)
+evaluation.print_report(val_results)
+evaluation.write_report(val_results, "validation_report.json")
+precision, recall, f1 = (val_results["vit"][k] for k in ("precision", "recall", "f1"))
 print(f"Validation Precision: {precision:.4f}, Recall: {recall:.4f}, F1-Score: {f1:.4f}")
 
 model.save("vit_mammogram_model.keras")
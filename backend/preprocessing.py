@@ -0,0 +1,121 @@
+import io
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import tracing
+
+VIT_INPUT_SIZE = 224
+ULTRASOUND_INPUT_SIZE = 128
+VGG_INPUT_SIZE = 150
+
+# uint8 -> float32 lookup tables. Normalising through a 256-entry table is a
+# single pass that writes float32 straight into the model input, and because
+# every entry is computed exactly as the old per-request arithmetic was, the
+# results are bit-for-bit identical:
+#   ViT:        (float32(x) - 0.5) / 0.5    (training used Normalization(0.5, 0.25))
+#   Ultrasound: float32(x / 255.0)          (float64 divide, then Keras' downcast)
+#   VGG16:      float32(x / 255.0)          (the transfer notebook's X / 255.0)
+VIT_LUT = (np.arange(256, dtype=np.float32) - 0.5) / 0.5
+ULTRASOUND_LUT = (np.arange(256) / 255.0).astype(np.float32)
+VGG_LUT = ULTRASOUND_LUT
+
+
+class InputBuffers(threading.local):
+    """
+    Per-thread float32 model inputs, keyed by shape and reused across
+    requests. A buffer handed out by get() stays valid until the same thread
+    asks for that shape again, so callers that keep a tensor beyond the
+    request (e.g. to queue it) must copy it.
+    """
+
+    def __init__(self):
+        self.buffers = {}
+
+    def get(self, shape):
+        buffer = self.buffers.get(shape)
+        if buffer is None:
+            buffer = self.buffers[shape] = np.empty(shape, dtype=np.float32)
+        return buffer
+
+
+input_buffers = InputBuffers()
+
+
+def normalize_into(pixels, lut, out):
+    """Maps uint8 pixels through lut into the float32 array out (same shape)."""
+    # cv2.LUT writes a float32 table lookup straight into dst with no
+    # temporaries (np.take would buffer the whole output first)
+    result = cv2.LUT(pixels, lut, dst=out)
+    if not np.shares_memory(result, out):
+        # OpenCV reallocates when it can't use dst as-is (e.g. odd strides)
+        np.copyto(out, result.reshape(out.shape))
+    return out
+
+
+def vit_input_into(gray_img, out):
+    """Resizes a PIL 'L' image to 224x224 and normalises it into out (224, 224)."""
+    small = gray_img.resize((VIT_INPUT_SIZE, VIT_INPUT_SIZE))
+    return normalize_into(np.asarray(small), VIT_LUT, out)
+
+
+def vgg_input_into(gray_img, out):
+    """
+    Resizes a PIL 'L' image to 150x150 and normalises it into out (150, 150, 3).
+
+    Training converted each mammogram to RGB and LANCZOS-resized it; for a
+    grayscale source that is the same as resizing the single channel and
+    replicating it, at a third of the resize cost.
+    """
+    small = gray_img.resize((VGG_INPUT_SIZE, VGG_INPUT_SIZE), Image.LANCZOS)
+    rgb = cv2.cvtColor(np.asarray(small), cv2.COLOR_GRAY2RGB)
+    return normalize_into(rgb, VGG_LUT, out)
+
+
+def ultrasound_input_into(img_bgr, out):
+    """Resizes a decoded BGR image to 128x128 and normalises it into out (128, 128, 3)."""
+    small = cv2.resize(img_bgr, (ULTRASOUND_INPUT_SIZE, ULTRASOUND_INPUT_SIZE))
+    return normalize_into(small, ULTRASOUND_LUT, out)
+
+
+def preprocess_image(image_bytes, out=None):
+    """
+    Bytes -> grayscale -> 224x224 -> normalised (1, 224, 224, 1) float32.
+
+    Writes into out if given, otherwise into this thread's reusable buffer.
+    Returns (input_tensor, full_res_grayscale_pil).
+    """
+    # Convert bytes to PIL Image, then to Grayscale ('L')
+    with tracing.span("decode"):
+        img = Image.open(io.BytesIO(image_bytes)).convert('L')
+
+    if out is None:
+        out = input_buffers.get((1, VIT_INPUT_SIZE, VIT_INPUT_SIZE, 1))
+    with tracing.span("preprocess", width=img.width, height=img.height):
+        vit_input_into(img, out[0, :, :, 0])
+
+    return out, img
+
+
+def preprocess_ultrasound(image_bytes, out=None):
+    """
+    Bytes -> BGR -> 128x128 -> normalised (1, 128, 128, 3) float32 in [0, 1].
+
+    Writes into out if given, otherwise into this thread's reusable buffer.
+    Returns (input_tensor, full_res_bgr_image).
+    """
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    with tracing.span("decode"):
+        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)  # BGR, as in training (cv2.imread)
+
+    if img is None:
+        raise ValueError("Could not decode image")
+
+    if out is None:
+        out = input_buffers.get((1, ULTRASOUND_INPUT_SIZE, ULTRASOUND_INPUT_SIZE, 3))
+    with tracing.span("preprocess", width=img.shape[1], height=img.shape[0]):
+        ultrasound_input_into(img, out[0])
+
+    return out, img
@@ -0,0 +1,255 @@
+"""
+On-demand profiling of live inference requests (POST /admin/profile).
+
+arm() sets up a single capture, either for the next N inference requests
+or for a fixed number of seconds. While it runs:
+
+  * TensorFlow's profiler records op execution, per-thread activity and
+    host memory into <path>/tf/plugins/profile/<run>/*.xplane.pb (open
+    with TensorBoard's Profile tab: tensorboard --logdir <path>/tf)
+  * a sampling profiler thread snapshots every Python thread's stack
+    each sample_interval and writes python_stacks.txt (collapsed stacks
+    for flamegraph.pl / speedscope) and python_profile.json (busiest
+    functions, samples per thread)
+
+capture.json next to them records the window: mode, requests seen,
+start/stop times and why it stopped.
+
+Outside a capture the request hooks only read one attribute, and neither
+profiler is running. A capture started by requests stops after N
+requests that began inside it have finished, or after max_seconds,
+whichever comes first. An armed capture that sees no traffic expires
+after arm_timeout.
+
+The capture covers this process only: under several workers, only the
+worker that took the admin request is profiled (the path includes its
+pid).
+"""
+
+import collections
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+
+import tensorflow as tf
+
+DEFAULT_SAMPLE_INTERVAL = 0.005
+TOP_FUNCTIONS = 30
+
+
+class StackSampler:
+    """Counts the Python stacks of every other thread, sampled every interval seconds."""
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[(names.get(ident, str(ident)), tuple(reversed(stack)))] += 1
+            self.samples += 1
+
+    def summary(self):
+        threads = collections.Counter()
+        own = collections.Counter()
+        total = collections.Counter()
+        for (thread, stack), count in self.stacks.items():
+            threads[thread] += count
+            if stack:
+                own[stack[-1]] += count
+            for function in set(stack):
+                total[function] += count
+        seen = sum(threads.values()) or 1
+
+        def top(counter):
+            return [{"function": function, "samples": count, "pct": round(100 * count / seen, 2)}
+                    for function, count in counter.most_common(TOP_FUNCTIONS)]
+
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "threads": dict(threads.most_common()),
+            "top_self": top(own),
+            "top_total": top(total),
+        }
+
+    def write(self, path):
+        with open(os.path.join(path, "python_stacks.txt"), "w") as f:
+            for (thread, stack), count in self.stacks.most_common():
+                f.write(";".join((thread,) + stack) + f" {count}\n")
+        summary = self.summary()
+        with open(os.path.join(path, "python_profile.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+
+class ProfileCapture:
+    def __init__(self, base_dir, max_seconds=120.0, arm_timeout=600.0):
+        self.base_dir = base_dir
+        self.max_seconds = max_seconds
+        self.arm_timeout = arm_timeout
+        self.lock = threading.Lock()
+        self.capture = None
+        self.active = False  # armed or running; the only thing request hooks read when idle
+        self.sampler = None
+        self.timer = None
+
+    def busy(self):
+        return self.capture is not None and self.capture["status"] in ("armed", "running", "writing")
+
+    def arm(self, requests=None, seconds=None, sample_interval=DEFAULT_SAMPLE_INTERVAL):
+        """
+        Starts a capture over the next `requests` inference requests, or
+        for `seconds` from now. Returns the capture's status dict; raises
+        RuntimeError if one is already in progress.
+        """
+        with self.lock:
+            if self.busy():
+                raise RuntimeError("A profile capture is already in progress")
+            capture_id = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+            self.capture = {
+                "id": capture_id,
+                "path": os.path.abspath(os.path.join(self.base_dir, capture_id)),
+                "mode": "requests" if requests else "seconds",
+                "target": requests or seconds,
+                "sample_interval_ms": sample_interval * 1000,
+                "status": "armed",
+                "armed_at": time.time(),
+                "started_at": None,
+                "stopped_at": None,
+                "requests_started": 0,
+                "requests_finished": 0,
+                "stop_reason": None,
+                "error": None,
+            }
+            self.sampler = StackSampler(sample_interval)
+            if seconds:
+                if self._start():
+                    self._schedule(seconds, "window elapsed")
+            else:
+                self.active = True
+                self._schedule(self.arm_timeout, "expired")
+            return dict(self.capture)
+
+    def _schedule(self, seconds, reason):
+        if self.timer:
+            self.timer.cancel()
+        self.timer = threading.Timer(seconds, self.stop, args=(reason,))
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _start(self):
+        # Called with the lock held
+        path = self.capture["path"]
+        os.makedirs(path, exist_ok=True)
+        try:
+            options = tf.profiler.experimental.ProfilerOptions(
+                host_tracer_level=2, python_tracer_level=0, device_tracer_level=1
+            )
+            tf.profiler.experimental.start(os.path.join(path, "tf"), options=options)
+        except Exception as e:
+            self.capture.update(status="failed", error=f"TensorFlow profiler did not start: {e}")
+            self.active = False
+            print(f"Profile capture {self.capture['id']} failed: {e}")
+            return False
+        self.sampler.start()
+        self.capture.update(status="running", started_at=time.time())
+        self.active = True
+        print(f"Profile capture {self.capture['id']} started ({self.capture['mode']}: {self.capture['target']})")
+        return True
+
+    def request_started(self):
+        """Request hook; True if this request is part of the capture (call request_finished for it)."""
+        if not self.active:
+            return False
+        with self.lock:
+            capture = self.capture
+            if capture is None or capture["mode"] != "requests":
+                return False
+            if capture["status"] == "armed":
+                if not self._start():
+                    return False
+                self._schedule(self.max_seconds, "max_seconds reached")
+            if capture["status"] != "running" or capture["requests_started"] >= capture["target"]:
+                return False
+            capture["requests_started"] += 1
+            return True
+
+    def request_finished(self):
+        with self.lock:
+            capture = self.capture
+            if capture is None or capture["status"] != "running":
+                return
+            capture["requests_finished"] += 1
+            done = capture["requests_finished"] >= capture["target"]
+        if done:
+            # Writing the trace takes a moment; keep it off the request thread
+            threading.Thread(target=self.stop, args=("requests done",), daemon=True).start()
+
+    def stop(self, reason="stopped"):
+        """Ends the capture and writes its files (no-op if none is running)."""
+        with self.lock:
+            capture = self.capture
+            self.active = False
+            if capture is None or capture["status"] not in ("armed", "running"):
+                return
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+            if capture["status"] == "armed":
+                capture.update(status="expired" if reason == "expired" else "cancelled", stop_reason=reason)
+                return
+            capture.update(status="writing", stopped_at=time.time(), stop_reason=reason)
+            sampler = self.sampler
+
+        try:
+            sampler.stop()
+            tf.profiler.experimental.stop()
+            python_summary = sampler.write(capture["path"])
+            with self.lock:
+                capture.update(status="done", python_samples=python_summary["samples"])
+        except Exception as e:
+            traceback.print_exc()
+            with self.lock:
+                capture.update(status="failed", error=str(e))
+        with open(os.path.join(capture["path"], "capture.json"), "w") as f:
+            json.dump(capture, f, indent=2)
+        print(f"Profile capture {capture['id']} {capture['status']} ({reason}): {capture['path']}")
+
+    def status(self):
+        with self.lock:
+            if self.capture is None:
+                return {"status": "idle"}
+            status = dict(self.capture)
+        if status["status"] == "done":
+            summary_path = os.path.join(status["path"], "python_profile.json")
+            if os.path.exists(summary_path):
+                with open(summary_path) as f:
+                    summary = json.load(f)
+                status["python_top_self"] = summary["top_self"][:10]
+        return status
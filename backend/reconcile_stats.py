@@ -0,0 +1,57 @@
+"""
+Repairs drift between public.scan_stats and public.scans.
+
+The counters are maintained by triggers, so drift should only come from
+manual edits or restores. This job calls the reconcile_scan_stats() SQL
+function, which recounts from scans and reports how many rows it fixed.
+Only the service role may execute it, so SUPABASE_KEY must be the
+service_role key here.
+
+    python reconcile_stats.py                    # one pass over all users
+    python reconcile_stats.py --user <uuid>      # a single user
+    python reconcile_stats.py --interval 3600    # keep running hourly
+"""
+
+import argparse
+import os
+import time
+
+from dotenv import load_dotenv
+from supabase import create_client
+
+load_dotenv()
+
+
+def reconcile(client, user_id=None):
+    res = client.rpc("reconcile_scan_stats", {"p_user_id": user_id}).execute()
+    return int(res.data or 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recount scan_stats from scans")
+    parser.add_argument("--user", help="Only reconcile this user id")
+    parser.add_argument("--interval", type=int, default=0,
+                        help="Seconds between passes; 0 runs once and exits")
+    args = parser.parse_args()
+
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_KEY")
+    if not url or not key:
+        raise SystemExit("SUPABASE_URL and SUPABASE_KEY must be set")
+    client = create_client(url, key)
+
+    while True:
+        started = time.time()
+        try:
+            repaired = reconcile(client, args.user)
+            print(f"Reconciled scan_stats in {time.time() - started:.1f}s, repaired {repaired} row(s)")
+        except Exception as e:
+            print(f"Reconcile error: {e}")
+
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
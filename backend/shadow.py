@@ -0,0 +1,256 @@
+"""
+Shadow inference: score a candidate model on live uploads off the request path.
+
+A route that has a shadow candidate hands the preprocessed tensor and its
+own production output to submit(), which copies the tensor onto a bounded
+queue and returns immediately. One background worker scores queued items
+with the candidate and records agreement and latency in a local SQLite file.
+
+Shadow work is dropped rather than allowed to slow production down:
+
+  * full      - the queue is at capacity
+  * load      - more than max_inflight production requests are running
+                (checked on submit and again just before scoring)
+  * stale     - the item waited longer than max_age seconds
+  * sampled   - not picked by sample_rate
+
+TensorFlow shares its compute threads between the request threads and the
+shadow worker, so the in-flight check is what keeps shadow inference out
+of the way of busy periods.
+"""
+
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+import traceback
+
+import numpy as np
+
+from cine import MASK_THRESHOLD
+
+SCHEMA = """
+create table if not exists shadow_results (
+  created_at real not null,
+  kind text not null,
+  production_version text,
+  candidate_version text,
+  agree integer not null,
+  score_delta real,
+  production_ms real,
+  candidate_ms real
+);
+create index if not exists shadow_results_group_idx
+  on shadow_results (kind, production_version, candidate_version);
+"""
+
+
+def compare_classification(production_probs, candidate_probs):
+    """Same predicted class, and how far the malignant probability moved."""
+    return {
+        "agree": int(np.argmax(production_probs)) == int(np.argmax(candidate_probs)),
+        "score_delta": abs(float(production_probs[1]) - float(candidate_probs[1])),
+    }
+
+
+def compare_segmentation(production_map, candidate_map):
+    """Same tumour/no-tumour call, and 1 - Dice between the two masks."""
+    production_mask = production_map > MASK_THRESHOLD
+    candidate_mask = candidate_map > MASK_THRESHOLD
+    total = int(production_mask.sum()) + int(candidate_mask.sum())
+    dice = 1.0 if total == 0 else 2.0 * int((production_mask & candidate_mask).sum()) / total
+    return {
+        "agree": bool(production_mask.any()) == bool(candidate_mask.any()),
+        "score_delta": 1.0 - dice,
+    }
+
+
+class ShadowRunner:
+    def __init__(self, scorers, db_path, queue_size=32, max_inflight=1,
+                 max_age=30.0, sample_rate=1.0, flush_every=50):
+        """
+        scorers: kind -> (score_fn(model, tensor) -> output, compare_fn(production, candidate) -> dict)
+        """
+        self.scorers = scorers
+        self.db_path = db_path
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.max_inflight = max_inflight
+        self.max_age = max_age
+        self.sample_rate = sample_rate
+        self.flush_every = flush_every
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.counters = {
+            "submitted": 0, "scored": 0, "errors": 0, "write_errors": 0,
+            "dropped_full": 0, "dropped_load": 0, "dropped_stale": 0, "dropped_sampled": 0,
+        }
+        self.worker = None
+
+    # --- production load tracking (wired to Flask request hooks) ---
+
+    def request_started(self):
+        with self.lock:
+            self.inflight += 1
+
+    def request_finished(self):
+        with self.lock:
+            self.inflight -= 1
+
+    def overloaded(self):
+        return self.inflight > self.max_inflight
+
+    def count(self, counter, n=1):
+        with self.lock:
+            self.counters[counter] += n
+
+    # --- request side ---
+
+    def submit(self, kind, candidate, tensor, production_version, production_output, production_ms):
+        """
+        Queues one shadow comparison; never blocks. candidate is a registry
+        ModelHandle. tensor and production_output are copied only if the
+        item is accepted (request input buffers are reused per thread).
+        """
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.count("dropped_sampled")
+            return False
+        if self.overloaded():
+            self.count("dropped_load")
+            return False
+        if self.queue.full():
+            self.count("dropped_full")
+            return False
+        item = (time.time(), kind, candidate, np.array(tensor, copy=True),
+                production_version, np.array(production_output, copy=True), production_ms)
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.count("dropped_full")
+            return False
+        self.count("submitted")
+        self.start()
+        return True
+
+    # --- worker ---
+
+    def start(self):
+        if self.worker:
+            return
+        with self.lock:
+            if self.worker:
+                return
+            self.worker = threading.Thread(target=self.run, name="shadow-worker", daemon=True)
+            self.worker.start()
+
+    def open_db(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("pragma journal_mode=wal")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def run(self):
+        # Nothing here may end the thread: submit() would keep queueing
+        # work that no one scores
+        conn = None
+        pending = []
+        while True:
+            try:
+                item = self.queue.get(timeout=1.0)
+            except queue.Empty:
+                item = None
+            if item is not None:
+                try:
+                    row = self.score(item)
+                except Exception as e:
+                    self.count("errors")
+                    print(f"Shadow error: {e}")
+                    traceback.print_exc()
+                    row = None
+                if row:
+                    pending.append(row)
+            # Commit in batches, or whenever the queue goes idle
+            if pending and (len(pending) >= self.flush_every or self.queue.empty()):
+                try:
+                    conn = conn or self.open_db()
+                    conn.executemany("insert into shadow_results values (?, ?, ?, ?, ?, ?, ?, ?)", pending)
+                    conn.commit()
+                except Exception as e:
+                    # e.g. database locked or disk full: drop this batch and
+                    # reconnect for the next one
+                    self.count("write_errors", len(pending))
+                    print(f"Shadow results not recorded ({len(pending)} rows): {e}")
+                    traceback.print_exc()
+                    if conn is not None:
+                        conn.close()
+                    conn = None
+                pending.clear()
+
+    def score(self, item):
+        queued_at, kind, candidate, tensor, production_version, production_output, production_ms = item
+        if time.time() - queued_at > self.max_age:
+            self.count("dropped_stale")
+            return None
+        if self.overloaded():
+            self.count("dropped_load")
+            return None
+        score_fn, compare_fn = self.scorers[kind]
+        try:
+            started = time.perf_counter()
+            candidate_output = score_fn(candidate.model, tensor)
+            candidate_ms = (time.perf_counter() - started) * 1000
+            comparison = compare_fn(production_output, np.asarray(candidate_output))
+        except Exception as e:
+            self.count("errors")
+            print(f"Shadow error ({candidate.label}): {e}")
+            traceback.print_exc()
+            return None
+        self.count("scored")
+        return (queued_at, kind, production_version, candidate.label, int(comparison["agree"]),
+                comparison["score_delta"], production_ms, candidate_ms)
+
+    # --- reporting ---
+
+    def summary(self):
+        """Runner counters plus per (kind, production, candidate) agreement and latency."""
+        with self.lock:
+            report = dict(self.counters, queue_depth=self.queue.qsize(), inflight=self.inflight)
+        report["results"] = []
+        if not os.path.exists(self.db_path):
+            return report
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.executescript(SCHEMA)
+            groups = conn.execute("""
+                select kind, production_version, candidate_version, count(*),
+                       avg(agree), avg(score_delta), avg(production_ms), avg(candidate_ms)
+                from shadow_results
+                group by kind, production_version, candidate_version
+            """).fetchall()
+            for kind, production, candidate, n, agree, delta, prod_ms, cand_ms in groups:
+                p95 = {}
+                for column in ("production_ms", "candidate_ms"):
+                    row = conn.execute(
+                        f"select {column} from shadow_results "
+                        "where kind = ? and production_version is ? and candidate_version is ? "
+                        f"order by {column} limit 1 offset ?",
+                        (kind, production, candidate, int(n * 0.95)),
+                    ).fetchone()
+                    p95[column] = row[0] if row else None
+                report["results"].append({
+                    "kind": kind,
+                    "production_version": production,
+                    "candidate_version": candidate,
+                    "samples": n,
+                    "agreement": agree,
+                    "mean_score_delta": delta,
+                    "production_ms_mean": prod_ms,
+                    "production_ms_p95": p95["production_ms"],
+                    "candidate_ms_mean": cand_ms,
+                    "candidate_ms_p95": p95["candidate_ms"],
+                })
+        finally:
+            conn.close()
+        return report
@@ -0,0 +1,283 @@
+"""
+Garbage collector for orphaned objects in the 'mammo-scans' bucket.
+
+Objects become orphans when an upload succeeds but the scans insert fails,
+or when a scan row is deleted but the storage call errors. The collector
+walks the bucket one user folder at a time and, for each folder, merges two
+name-sorted streams page by page:
+
+  * the bucket listing for the folder
+  * the paths referenced by scans (the scan_storage_objects view)
+
+so memory stays bounded by the page size however large a folder is. Objects
+that no scan references and that are older than the grace period are
+deleted in batches. Progress is checkpointed after every folder, so an
+interrupted run resumes where it stopped.
+
+    python storage_gc.py --dry-run
+    python storage_gc.py --grace-hours 24 --report gc_report.json
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+from supabase import create_client
+
+load_dotenv()
+
+BUCKET = "mammo-scans"
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_DELETE_BATCH = 100
+DEFAULT_GRACE_HOURS = 24
+
+
+def parse_timestamp(value):
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def iter_listing(client, folder, page_size, removed=lambda: 0):
+    """
+    Yields entries of one bucket folder level in name order, page by page.
+
+    The listing is offset-paged, so objects the caller deletes behind the
+    cursor would shift later entries back; removed() reports how many have
+    been deleted so far and the next offset is corrected by that amount.
+    """
+    listed = 0
+    while True:
+        page = client.storage.from_(BUCKET).list(folder, {
+            "limit": page_size,
+            "offset": listed - removed(),
+            "sortBy": {"column": "name", "order": "asc"},
+        })
+        if not page:
+            return
+        yield from page
+        if len(page) < page_size:
+            return
+        listed += len(page)
+
+
+def iter_user_folders(client, page_size):
+    """Top-level folders of the bucket (one per user id)."""
+    for entry in iter_listing(client, None, page_size):
+        # Folders come back without an object id
+        if entry.get("id") is None:
+            yield entry["name"]
+
+
+def iter_bucket_objects(client, folder, page_size, removed=lambda: 0):
+    for entry in iter_listing(client, folder, page_size, removed):
+        if entry.get("id") is None:
+            continue
+        yield {
+            "path": f"{folder}/{entry['name']}",
+            "size": int((entry.get("metadata") or {}).get("size") or 0),
+            "created_at": parse_timestamp(entry.get("created_at")),
+        }
+
+
+def iter_referenced_paths(client, user_id, page_size):
+    """Paths referenced by the user's scans, in name order (keyset paged)."""
+    last = None
+    while True:
+        query = (
+            client.table("scan_storage_objects")
+            .select("path")
+            .eq("user_id", user_id)
+        )
+        if last is not None:
+            query = query.gt("path", last)
+        rows = query.order("path").limit(page_size).execute().data or []
+        for row in rows:
+            yield row["path"]
+        if len(rows) < page_size:
+            return
+        last = rows[-1]["path"]
+
+
+def find_orphans(objects, referenced):
+    """
+    Sorted merge of bucket objects against referenced paths; yields the
+    objects with no reference. Both inputs must be ascending by path.
+    """
+    ref = next(referenced, None)
+    previous = None
+    for obj in objects:
+        path = obj["path"]
+        if previous is not None:
+            if path == previous:
+                # An upload landed before the cursor and shifted the page
+                continue
+            if path < previous:
+                # Listing order disagrees with ours; stop rather than risk
+                # deleting something that is referenced further on.
+                raise RuntimeError(f"Bucket listing out of order at {path!r}")
+        previous = path
+
+        while ref is not None and ref < path:
+            ref = next(referenced, None)
+        if ref == path:
+            continue
+        yield obj
+
+
+class Checkpoint:
+    """JSON file recording the last fully processed folder and run totals."""
+
+    def __init__(self, path):
+        self.path = path
+        self.state = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def resume_after(self):
+        if self.state.get("finished", True):
+            return None
+        return self.state.get("last_folder")
+
+    def start(self, resumed):
+        if not resumed:
+            self.state = {
+                "started_at": datetime.now(timezone.utc).isoformat(),
+                "folders": 0,
+                "objects_scanned": 0,
+                "orphans_deleted": 0,
+                "bytes_reclaimed": 0,
+            }
+        self.state["finished"] = False
+        self.save()
+
+    def folder_done(self, folder, scanned, deleted, reclaimed):
+        self.state["last_folder"] = folder
+        self.state["folders"] += 1
+        self.state["objects_scanned"] += scanned
+        self.state["orphans_deleted"] += deleted
+        self.state["bytes_reclaimed"] += reclaimed
+        self.save()
+
+    def finish(self):
+        self.state["finished"] = True
+        self.state["finished_at"] = datetime.now(timezone.utc).isoformat()
+        self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def collect_folder(client, folder, cutoff, page_size, delete_batch, dry_run):
+    """Returns (objects scanned, orphans deleted, bytes reclaimed) for one folder."""
+    scanned = deleted = reclaimed = 0
+    removed = 0  # objects actually gone from the listing (0 on a dry run)
+    pending = []
+
+    def flush():
+        nonlocal deleted, reclaimed, removed
+        if not pending:
+            return
+        if not dry_run:
+            client.storage.from_(BUCKET).remove([obj["path"] for obj in pending])
+            removed += len(pending)
+        deleted += len(pending)
+        reclaimed += sum(obj["size"] for obj in pending)
+        pending.clear()
+
+    def counted(objects):
+        nonlocal scanned
+        for obj in objects:
+            scanned += 1
+            yield obj
+
+    objects = counted(iter_bucket_objects(client, folder, page_size, lambda: removed))
+    referenced = iter_referenced_paths(client, folder, page_size)
+    for orphan in find_orphans(objects, referenced):
+        # Unknown age counts as too young: never delete what we can't date
+        if orphan["created_at"] is None or orphan["created_at"] > cutoff:
+            continue
+        pending.append(orphan)
+        if len(pending) >= delete_batch:
+            flush()
+    flush()
+
+    return scanned, deleted, reclaimed
+
+
+def run(client, grace_hours=DEFAULT_GRACE_HOURS, page_size=DEFAULT_PAGE_SIZE,
+        delete_batch=DEFAULT_DELETE_BATCH, checkpoint_path=None, dry_run=False):
+    checkpoint = Checkpoint(checkpoint_path)
+    resume_after = checkpoint.resume_after()
+    checkpoint.start(resumed=resume_after is not None)
+    if resume_after:
+        print(f"Resuming after folder {resume_after}")
+
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=grace_hours)
+    started = time.time()
+
+    for folder in iter_user_folders(client, page_size):
+        if resume_after is not None and folder <= resume_after:
+            continue
+        try:
+            scanned, deleted, reclaimed = collect_folder(
+                client, folder, cutoff, page_size, delete_batch, dry_run
+            )
+        except Exception as e:
+            # Leave the checkpoint on the previous folder so a rerun retries this one
+            print(f"GC error in folder {folder}: {e}")
+            raise
+        checkpoint.folder_done(folder, scanned, deleted, reclaimed)
+        if deleted:
+            print(f"{folder}: {deleted} orphan(s), {reclaimed} bytes")
+
+    checkpoint.finish()
+    report = dict(checkpoint.state, dry_run=dry_run, seconds=round(time.time() - started, 2))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete orphaned objects from the mammo-scans bucket")
+    parser.add_argument("--grace-hours", type=float, default=DEFAULT_GRACE_HOURS,
+                        help="Only delete orphans older than this")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument("--delete-batch", type=int, default=DEFAULT_DELETE_BATCH)
+    parser.add_argument("--checkpoint", default="storage_gc_checkpoint.json",
+                        help="Progress file used to resume an interrupted run")
+    parser.add_argument("--report", help="Write the run summary as JSON to this path")
+    parser.add_argument("--dry-run", action="store_true", help="Report orphans without deleting")
+    args = parser.parse_args()
+
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_KEY")
+    if not url or not key:
+        raise SystemExit("SUPABASE_URL and SUPABASE_KEY must be set")
+
+    report = run(
+        create_client(url, key),
+        grace_hours=args.grace_hours,
+        page_size=args.page_size,
+        delete_batch=args.delete_batch,
+        checkpoint_path=args.checkpoint,
+        dry_run=args.dry_run,
+    )
+
+    verb = "Would reclaim" if args.dry_run else "Reclaimed"
+    print(f"{verb} {report['bytes_reclaimed']} bytes from {report['orphans_deleted']} orphan(s) "
+          f"across {report['folders']} folder(s) in {report['seconds']}s")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import cv2
+
+# Longest side, in pixels, of each derived image. The preview is what the
+# lightbox shows; the thumbnail is what the history cards show.
+DERIVATIVE_SIZES = {
+    "preview": 1024,
+    "thumbnail": 256,
+}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+
+def downscale(pixels, max_side):
+    """
+    Shrinks an image so its longest side is at most max_side, keeping the
+    aspect ratio. Images already within the limit are returned unchanged.
+    """
+    height, width = pixels.shape[:2]
+    longest = max(height, width)
+    if longest <= max_side:
+        return pixels
+
+    scale = max_side / longest
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    # INTER_AREA is the right filter for large downscales (no aliasing)
+    return cv2.resize(pixels, size, interpolation=cv2.INTER_AREA)
+
+
+def encode_image(pixels):
+    """
+    Encodes a grayscale or BGR array as WebP, falling back to JPEG when the
+    OpenCV build has no WebP encoder. Returns (bytes, ext, content_type).
+    """
+    ok, buffer = cv2.imencode('.webp', pixels, [cv2.IMWRITE_WEBP_QUALITY, WEBP_QUALITY])
+    if ok:
+        return buffer.tobytes(), "webp", "image/webp"
+
+    ok, buffer = cv2.imencode('.jpg', pixels, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    if not ok:
+        raise ValueError("Could not encode derived image")
+    return buffer.tobytes(), "jpg", "image/jpeg"
+
+
+def make_derivatives(pixels):
+    """
+    Builds the preview and thumbnail for an already-decoded image.
+
+    Sizes are produced largest first and each one is resized from the
+    previous result, so the full-resolution image is only read once.
+    Returns {name: (bytes, ext, content_type)}.
+    """
+    derivatives = {}
+    current = pixels
+    for name, max_side in sorted(DERIVATIVE_SIZES.items(), key=lambda item: -item[1]):
+        current = downscale(current, max_side)
+        derivatives[name] = encode_image(current)
+    return derivatives
@@ -0,0 +1,290 @@
+"""
+Request tracing: trace-context propagation plus sampled, batched span export.
+
+Every request gets a trace id. It comes from an incoming W3C traceparent
+header (00-<32 hex trace id>-<16 hex parent span id>-<flags>), falls back
+to a 32-hex X-Request-ID, and is otherwise generated. It is returned on
+the response as X-Request-ID and as a traceresponse header
+(00-<trace id>-<server span id>-<flags>), so a client can match its own
+timings to the server's spans.
+
+A request is sampled when the caller's traceparent has the sampled flag
+set, or when its trace id falls under sample_rate (the same trace-id
+ratio rule other services use, so sampling decisions agree). Unsampled
+requests only pay for header parsing: span() hands back a shared no-op.
+
+Sampled requests record a root span for the request and child spans for
+each `with span("name"):` block run in the request's context. Finished
+spans go onto a bounded queue without blocking; a background thread
+sends them in batches as OTLP/JSON, either POSTed to a collector
+(e.g. http://localhost:4318/v1/traces) or appended one batch per line to
+a file. When the queue is full, spans are dropped and counted.
+"""
+
+import contextvars
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+TRACE_ID_RATIO_BOUND = 1 << 64
+
+# Set on every response; browsers need them listed in Access-Control-Expose-Headers
+RESPONSE_HEADERS = ("X-Request-ID", "traceresponse")
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_ERROR = 2
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def parse_traceparent(value):
+    """(trace_id, parent_span_id, sampled) from a traceparent header, or None if malformed."""
+    parts = (value or "").strip().lower().split("-")
+    if len(parts) < 4 or len(parts[0]) != 2 or parts[0] == "ff":
+        return None
+    version, trace_id, span_id, flags = parts[:4]
+    if (len(trace_id) != 32 or len(span_id) != 16 or len(flags) != 2
+            or trace_id == "0" * 32 or span_id == "0" * 16):
+        return None
+    try:
+        int(trace_id, 16), int(span_id, 16)
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    if version == "00" and len(parts) != 4:
+        return None
+    return trace_id, span_id, sampled
+
+
+def new_id(hex_digits):
+    return f"{random.getrandbits(hex_digits * 4):0{hex_digits}x}"
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+class Span:
+    __slots__ = ("exporter", "trace_id", "span_id", "parent_id", "name", "kind",
+                 "start_ns", "end_ns", "attributes", "error", "_token")
+
+    def __init__(self, exporter, trace_id, parent_id, name, kind=SPAN_KIND_INTERNAL, attributes=None):
+        self.exporter = exporter
+        self.trace_id = trace_id
+        self.span_id = new_id(16)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self._token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.exporter.add(self)
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self.end()
+        return False
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_attribute(k, v) for k, v in self.attributes.items() if v is not None],
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.error:
+            span["status"] = {"code": STATUS_ERROR, "message": self.error}
+        return span
+
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(name, **attributes):
+    """Child span of the current span; a shared no-op outside a sampled request."""
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.exporter, parent.trace_id, parent.span_id, name, attributes=attributes)
+
+
+def current_span():
+    return _current_span.get() or NOOP_SPAN
+
+
+class BatchExporter:
+    """
+    Sends finished spans in the background, batch_size at a time or every
+    flush_interval seconds. url: OTLP/HTTP JSON traces endpoint; path: file
+    that gets one OTLP/JSON document per line.
+    """
+
+    def __init__(self, url=None, path=None, service_name="backend", batch_size=512,
+                 flush_interval=5.0, queue_size=4096, timeout=5.0):
+        if not url and not path:
+            raise ValueError("BatchExporter needs a url or a path")
+        self.url = url
+        self.path = path
+        self.resource = {"attributes": [_attribute("service.name", service_name),
+                                        _attribute("process.pid", os.getpid())]}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.counts = {"exported": 0, "dropped": 0, "failed": 0}
+        self._thread = threading.Thread(target=self.run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def add(self, finished_span):
+        try:
+            self.queue.put_nowait(finished_span)
+        except queue.Full:
+            self.count("dropped")
+
+    def count(self, counter, n=1):
+        with self.lock:
+            self.counts[counter] += n
+
+    def run(self):
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            if batch:
+                self.export(batch)
+
+    def export(self, batch):
+        document = {"resourceSpans": [{
+            "resource": self.resource,
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": [s.to_otlp() for s in batch]}],
+        }]}
+        try:
+            if self.url:
+                import requests
+                response = requests.post(self.url, json=document, timeout=self.timeout)
+                response.raise_for_status()
+            else:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(document, separators=(",", ":")) + "\n")
+            self.count("exported", len(batch))
+        except Exception as e:
+            self.count("failed", len(batch))
+            print(f"Span export error: {e}")
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts, queued=self.queue.qsize())
+
+
+class RequestTrace:
+    """Ids for one request, and its root span if sampled."""
+
+    __slots__ = ("trace_id", "span_id", "sampled", "root", "_token")
+
+    def __init__(self, trace_id, span_id, sampled, root=None):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+        self.root = root
+        self._token = None
+
+    def response_headers(self):
+        return {
+            "X-Request-ID": self.trace_id,
+            "traceresponse": f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}",
+        }
+
+
+class Tracer:
+    def __init__(self, exporter=None, sample_rate=0.0):
+        """Without an exporter nothing is sampled; ids are still propagated."""
+        self.exporter = exporter
+        self.sample_rate = sample_rate if exporter else 0.0
+        self.bound = int(self.sample_rate * TRACE_ID_RATIO_BOUND)
+
+    def should_sample(self, trace_id, parent_sampled):
+        if self.exporter is None:
+            return False
+        return parent_sampled or int(trace_id[16:], 16) < self.bound
+
+    def start_request(self, headers, name, **attributes):
+        """Opens the request's trace and makes its root span current in this context."""
+        parent = parse_traceparent(headers.get("traceparent"))
+        if parent:
+            trace_id, parent_id, parent_sampled = parent
+        else:
+            request_id = (headers.get("X-Request-ID") or "").strip().lower()
+            valid = len(request_id) == 32 and all(c in "0123456789abcdef" for c in request_id)
+            trace_id = request_id if valid and request_id != "0" * 32 else new_id(32)
+            parent_id, parent_sampled = None, False
+
+        if not self.should_sample(trace_id, parent_sampled):
+            return RequestTrace(trace_id, new_id(16), False)
+        root = Span(self.exporter, trace_id, parent_id, name, kind=SPAN_KIND_SERVER, attributes=attributes)
+        trace = RequestTrace(trace_id, root.span_id, True, root)
+        trace._token = _current_span.set(root)
+        return trace
+
+    def end_request(self, trace, status_code=None, error=None):
+        if trace.root is None:
+            return
+        trace.root.set(**{"http.status_code": status_code})
+        if error is not None:
+            trace.root.error = f"{type(error).__name__}: {error}"
+        elif status_code is not None and status_code >= 500:
+            trace.root.error = f"HTTP {status_code}"
+        if trace._token is not None:
+            _current_span.reset(trace._token)
+            trace._token = None
+        trace.root.end()
@@ -0,0 +1,6 @@
+"""
+Training-side helpers shared by the notebooks in models/.
+
+Kept importable without Flask or Supabase so the notebooks (and Colab,
+with this folder uploaded next to them) can use them directly.
+"""
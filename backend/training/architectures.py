@@ -0,0 +1,151 @@
+"""
+Model architectures shared by the server and the training tools.
+
+create_vit_classifier() is the served mammogram ViT; weight files saved
+from it (model.save_weights / ModelCheckpoint) load back with
+load_weights(), which is how the server loads them.
+"""
+
+import keras
+from keras import layers, ops
+
+
+def mlp(x, hidden_units, dropout_rate):
+    for units in hidden_units:
+        x = layers.Dense(units, activation=keras.activations.gelu)(x)
+        x = layers.Dropout(dropout_rate)(x)
+    return x
+
+class Patches(layers.Layer):
+    def __init__(self, patch_size):
+        super().__init__()
+        self.patch_size = patch_size
+
+    def call(self, images):
+        input_shape = ops.shape(images)
+        batch_size = input_shape[0]
+        height = input_shape[1]
+        width = input_shape[2]
+        channels = input_shape[3]
+        num_patches_h = height // self.patch_size
+        num_patches_w = width // self.patch_size
+        patches = keras.ops.image.extract_patches(images, size=self.patch_size)
+        patches = ops.reshape(
+            patches,
+            (
+                batch_size,
+                num_patches_h * num_patches_w,
+                self.patch_size * self.patch_size * channels,
+            ),
+        )
+        return patches
+
+    def get_config(self):
+        config = super().get_config()
+        config.update({"patch_size": self.patch_size})
+        return config
+
+class PatchEncoder(layers.Layer):
+    def __init__(self, num_patches, projection_dim):
+        super().__init__()
+        self.num_patches = num_patches
+        self.projection = layers.Dense(units=projection_dim)
+        self.position_embedding = layers.Embedding(
+            input_dim=num_patches, output_dim=projection_dim
+        )
+
+    def call(self, patch):
+        positions = ops.expand_dims(
+            ops.arange(start=0, stop=self.num_patches, step=1), axis=0
+        )
+        projected_patches = self.projection(patch)
+        encoded = projected_patches + self.position_embedding(positions)
+        return encoded
+
+    def get_config(self):
+        config = super().get_config()
+        config.update({"num_patches": self.num_patches})
+        return config
+
+def create_vit_classifier(patch_size=16, projection_dim=64, transformer_layers=8, num_heads=4,
+                          transformer_units=None, mlp_head_units=(2048, 1024), image_size=224):
+    """
+    The served mammogram ViT. The defaults are the served architecture;
+    the other values are for architecture search (training/search.py).
+    transformer_units defaults to [2 * projection_dim, projection_dim]
+    and must end in projection_dim for the residual connection.
+    """
+    transformer_units = list(transformer_units or (projection_dim * 2, projection_dim))
+    inputs = keras.Input(shape=(image_size, image_size, 1))
+    patches = Patches(patch_size=patch_size)(inputs)
+    num_patches = (image_size // patch_size) ** 2
+    encoded_patches = PatchEncoder(num_patches, projection_dim=projection_dim)(patches)
+    for _ in range(transformer_layers):
+        x1 = layers.LayerNormalization(epsilon=1e-6)(encoded_patches)
+        attention_output = layers.MultiHeadAttention(
+            num_heads=num_heads, key_dim=projection_dim, dropout=0.1
+        )(x1, x1)
+        x2 = layers.Add()([attention_output, encoded_patches])
+        x3 = layers.LayerNormalization(epsilon=1e-6)(x2)
+        x3 = mlp(x3, hidden_units=transformer_units, dropout_rate=0.1)
+        encoded_patches = layers.Add()([x3, x2])
+    representation = layers.LayerNormalization(epsilon=1e-6)(encoded_patches)
+    representation = layers.Flatten()(representation)
+    representation = layers.Dropout(0.5)(representation)
+    features = mlp(representation, hidden_units=list(mlp_head_units), dropout_rate=0.5)
+    logits = layers.Dense(2)(features)
+    model = keras.Model(inputs=inputs, outputs=logits)
+    return model
+
+
+def simple_unet_model(IMG_HEIGHT, IMG_WIDTH, IMG_CHANNELS, base_filters=32, dropout_scale=1.0):
+    """
+    The ultrasound U-Net from models/Ultrasound.py (32-512 filters, batch
+    norm and dropout in every block). base_filters sets the first level's
+    width (doubling per level) and dropout_scale multiplies every dropout
+    rate; the defaults are the notebook's model. Returned uncompiled.
+    """
+    def conv_block(x, filters, dropout):
+        x = layers.Conv2D(filters, (3, 3), activation='relu', kernel_initializer='he_normal', padding='same')(x)
+        x = layers.BatchNormalization()(x)
+        x = layers.Dropout(dropout * dropout_scale)(x)
+        x = layers.Conv2D(filters, (3, 3), activation='relu', kernel_initializer='he_normal', padding='same')(x)
+        return layers.BatchNormalization()(x)
+
+    widths = [base_filters * 2 ** level for level in range(5)]
+    inputs = keras.Input((IMG_HEIGHT, IMG_WIDTH, IMG_CHANNELS))
+
+    # Contraction path
+    skips = []
+    x = inputs
+    for filters, dropout in zip(widths[:4], (0.1, 0.2, 0.2, 0.2)):
+        x = conv_block(x, filters, dropout)
+        skips.append(x)
+        x = layers.MaxPooling2D((2, 2))(x)
+
+    # Bottleneck
+    x = conv_block(x, widths[4], 0.3)
+
+    # Expansive path
+    for filters, dropout, skip in zip(reversed(widths[:4]), (0.2, 0.2, 0.1, 0.1), reversed(skips)):
+        x = layers.Conv2DTranspose(filters, (2, 2), strides=(2, 2), padding='same')(x)
+        x = layers.concatenate([x, skip])
+        x = conv_block(x, filters, dropout)
+
+    outputs = layers.Conv2D(1, (1, 1), activation='sigmoid')(x)
+    return keras.Model(inputs=[inputs], outputs=[outputs])
+
+
+def create_vgg16_transfer(input_shape=(150, 150, 3), weights='imagenet'):
+    """
+    The transfer model from models/deepmammo_cnn_vgg16.py: a frozen VGG16
+    base with a Flatten-Dense(256)-Dropout(0.5)-Dense(2, softmax) head.
+    weights=None skips the ImageNet download. Returned uncompiled.
+    """
+    base_model = keras.applications.VGG16(input_shape=input_shape, include_top=False, weights=weights)
+    base_model.trainable = False
+    x = layers.Flatten()(base_model.output)
+    x = layers.Dense(256, activation='relu')(x)
+    x = layers.Dropout(0.5)(x)
+    predictions = layers.Dense(2, activation='softmax')(x)
+    return keras.Model(inputs=base_model.input, outputs=predictions)
@@ -0,0 +1,164 @@
+"""
+Keras callbacks for the headless trainer (training/train.py).
+
+StepProfiler measures a window of training steps: wall time per step and
+how much of it went to waiting for the input pipeline. instrument() adds
+a last, synchronous stage to the training dataset that timestamps each
+batch as the train step receives it. The time from the start of the step
+to that stamp is input wait; compute is everything after it. The same
+window can also be handed to keras.callbacks.TensorBoard(profile_batch=...)
+for the TF profiler trace with per-op costs (see train.py --profile).
+
+MedianPruner stops a search trial (training/search.py) whose best
+validation metric so far is worse than the median of what the other
+trials had reached by the same epoch, read from their history.csv files.
+"""
+
+import csv
+import glob
+import json
+import os
+import statistics
+import threading
+import time
+
+import keras
+import numpy as np
+import tensorflow as tf
+
+
+class StepProfiler(keras.callbacks.Callback):
+    """
+    Profiles training steps start..stop (1-based, inclusive, counted across
+    epochs) and prints/writes a summary when the window closes.
+    """
+
+    def __init__(self, start, stop, report_path=None):
+        super().__init__()
+        self.start, self.stop = start, stop
+        self.report_path = report_path
+        self.step = 0
+        self.stamps = []
+        self.lock = threading.Lock()
+        self.step_ms = []
+        self.wait_ms = []
+        self.step_began = None
+        self.summary = None
+
+    def instrument(self, dataset):
+        """Returns dataset with a timestamp taken as each batch is handed over."""
+        def stamp(*batch):
+            marker = tf.py_function(self._record, [], tf.float64)
+            with tf.control_dependencies([marker]):
+                return tuple(tf.identity(t) for t in batch)
+        return dataset.map(stamp)
+
+    def _record(self):
+        now = time.perf_counter()
+        with self.lock:
+            self.stamps.append(now)
+            del self.stamps[:-8]
+        return now
+
+    def in_window(self):
+        return self.start <= self.step <= self.stop
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self.step += 1
+        if self.in_window():
+            self.step_began = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        if not self.in_window() or self.step_began is None:
+            return
+        ended = time.perf_counter()
+        with self.lock:
+            received = [t for t in self.stamps if self.step_began <= t <= ended]
+        self.step_ms.append((ended - self.step_began) * 1000)
+        self.wait_ms.append((received[0] - self.step_began) * 1000 if received else 0.0)
+        self.step_began = None
+        if self.step == self.stop:
+            self.report()
+
+    def on_train_end(self, logs=None):
+        if self.summary is None and self.step_ms:
+            self.report()
+
+    def report(self):
+        steps = np.array(self.step_ms)
+        waits = np.array(self.wait_ms)
+        self.summary = {
+            "steps": [self.start, self.start + len(steps) - 1],
+            "step_ms_p50": float(np.percentile(steps, 50)),
+            "step_ms_p95": float(np.percentile(steps, 95)),
+            "step_ms_mean": float(steps.mean()),
+            "input_wait_ms_mean": float(waits.mean()),
+            "input_stall_pct": float(100 * waits.sum() / steps.sum()) if steps.sum() else 0.0,
+            "compute_ms_p50": float(statistics.median(steps - waits)),
+        }
+        print(f"Profiled steps {self.summary['steps'][0]}-{self.summary['steps'][1]}: "
+              f"step p50 {self.summary['step_ms_p50']:.1f} ms (p95 {self.summary['step_ms_p95']:.1f}), "
+              f"input stall {self.summary['input_stall_pct']:.1f}%")
+        if self.report_path:
+            with open(self.report_path, "w") as f:
+                json.dump(self.summary, f, indent=2)
+
+
+def best_so_far(history_path, monitor, mode, epoch):
+    """Best monitored value in history.csv up to epoch (0-based), or None if the run hasn't got that far."""
+    if not os.path.exists(history_path):
+        return None
+    with open(history_path, newline="") as f:
+        values = {int(row["epoch"]): float(row[monitor]) for row in csv.DictReader(f) if row.get(monitor)}
+    if epoch not in values:
+        return None
+    return (max if mode == "max" else min)(v for e, v in values.items() if e <= epoch)
+
+
+class MedianPruner(keras.callbacks.Callback):
+    """
+    Median stopping rule. From epoch `after` (1-based) on, stops training
+    when this run's best value of `monitor` so far is worse than the
+    median of the other runs' best values by the same epoch, provided at
+    least `min_runs` of them got that far. Other runs are the
+    sibling directories matching `runs_glob`; pruned runs keep counting
+    with the epochs they finished.
+    """
+
+    def __init__(self, run_dir, runs_glob, monitor, mode, after=3, min_runs=3):
+        super().__init__()
+        self.run_dir = os.path.abspath(run_dir)
+        self.runs_glob = runs_glob
+        self.monitor, self.mode = monitor, mode
+        self.after, self.min_runs = after, min_runs
+        self.best = None
+        self.pruned_at = None
+
+    def better(self, a, b):
+        return a > b if self.mode == "max" else a < b
+
+    def on_epoch_end(self, epoch, logs=None):
+        value = (logs or {}).get(self.monitor)
+        if value is None:
+            return
+        # A resumed run starts from what its history already holds
+        previous = best_so_far(os.path.join(self.run_dir, "history.csv"), self.monitor, self.mode, epoch - 1)
+        for candidate in (previous, float(value)):
+            if candidate is not None and (self.best is None or self.better(candidate, self.best)):
+                self.best = candidate
+        if epoch + 1 < self.after:
+            return
+        others = []
+        for run in glob.glob(self.runs_glob):
+            if os.path.abspath(run) != self.run_dir:
+                best = best_so_far(os.path.join(run, "history.csv"), self.monitor, self.mode, epoch)
+                if best is not None:
+                    others.append(best)
+        if len(others) < self.min_runs:
+            return
+        median = statistics.median(others)
+        if self.better(median, self.best):
+            self.pruned_at = epoch + 1
+            self.model.stop_training = True
+            print(f"Pruned at epoch {epoch + 1}: best {self.monitor} {self.best:.4f} vs median {median:.4f} "
+                  f"of {len(others)} other runs")
@@ -0,0 +1,174 @@
+"""
+Cached image manifest for the CBIS-DDSM pipeline (models/deepmammo_cnn_vgg16.py).
+
+The notebook rebuilt its path list on every run: it rewrote each
+dicom_info.csv path with fix_dicom_path() via apply, then went through the
+merged frame with iterrows() calling os.path.exists() once per row. That
+is one filesystem round trip per image, which is slow on network mounts
+and was repeated every time.
+
+build_manifest() does the same merge, but:
+
+  * rewrites the paths with a single vectorised str.replace
+  * lists each referenced image directory once (os.scandir, in a thread
+    pool) into an index of (directory, file name, size, mtime) and checks
+    existence with a join against that index instead of a stat per row
+  * caches the index and writes the manifest (CSV, or Parquet if the path
+    ends in .parquet) with file sizes and mtimes
+
+On later runs only the directories whose mtime changed since the cached
+index are listed again; adding, removing or renaming a file in a directory
+bumps its mtime, so unchanged directories are reused as they are.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+LABEL_CSVS = (
+    'calc_case_description_train_set.csv',
+    'mass_case_description_train_set.csv',
+    'calc_case_description_test_set.csv',
+    'mass_case_description_test_set.csv',
+)
+DICOM_PREFIX = 'CBIS-DDSM/jpeg'
+# pathology -> label (0 non-cancer, 1 cancer); anything else is dropped
+PATHOLOGY_LABELS = {
+    'MALIGNANT': 1,
+    'BENIGN': 0,
+    'BENIGN_WITHOUT_CALLBACK': 0,
+}
+DEFAULT_WORKERS = 16
+INDEX_COLUMNS = ['dir', 'dir_mtime', 'name', 'size', 'mtime']
+
+
+def load_labels(csv_dir):
+    """One (patient_id, pathology) row per patient from the four case CSVs."""
+    frames = [pd.read_csv(os.path.join(csv_dir, name), usecols=['patient_id', 'pathology'])
+              for name in LABEL_CSVS]
+    labels = pd.concat(frames, ignore_index=True)
+    labels['patient_id'] = labels['patient_id'].str.strip()
+    return labels.drop_duplicates(subset=['patient_id']).dropna()
+
+
+def labelled_images(dicom_data, labels, image_dir, series='cropped images'):
+    """
+    Rows of dicom_info for one SeriesDescription, joined to their patient's
+    pathology, with full_path pointing into image_dir.
+    """
+    images = dicom_data.loc[dicom_data.SeriesDescription == series, ['PatientID', 'image_path']].copy()
+    images['patient_id'] = images['PatientID'].str.extract(r'(P_\d{5})', expand=False)
+    images = images.merge(labels, on='patient_id', how='left')
+    images = images.dropna(subset=['image_path', 'pathology'])
+    images['full_path'] = images['image_path'].str.replace(DICOM_PREFIX, image_dir, regex=False)
+    images['label'] = images['pathology'].map(PATHOLOGY_LABELS)
+    return images.reset_index(drop=True)
+
+
+def _stat_dir(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _list_dir(path):
+    """[(name, size, mtime_ns)] for the files in path; [] if it doesn't exist."""
+    files = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    files.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    except FileNotFoundError:
+        pass
+    return files
+
+
+def index_dirs(dirs, cached=None, workers=DEFAULT_WORKERS):
+    """
+    File index (INDEX_COLUMNS, mtimes in integer nanoseconds so they survive
+    a CSV round trip) for dirs. Rows of cached whose dir_mtime still
+    matches are reused; every other directory is listed again.
+    Returns (index, number of directories listed).
+    """
+    dirs = sorted(set(dirs))
+    with ThreadPoolExecutor(workers) as pool:
+        mtimes = dict(zip(dirs, pool.map(_stat_dir, dirs)))
+
+        fresh = set()
+        if cached is not None and len(cached):
+            known = cached.drop_duplicates('dir').set_index('dir')['dir_mtime']
+            fresh = {d for d, mtime in mtimes.items()
+                     if mtime is not None and known.get(d) == mtime}
+        stale = [d for d in dirs if d not in fresh and mtimes[d] is not None]
+        listings = dict(zip(stale, pool.map(_list_dir, stale)))
+
+    rows = [(d, mtimes[d], name, size, mtime)
+            for d, files in listings.items() for name, size, mtime in files]
+    # Placeholder rows keep empty directories in the cache too
+    rows += [(d, mtimes[d], None, None, None) for d, files in listings.items() if not files]
+    index = pd.DataFrame(rows, columns=INDEX_COLUMNS)
+    if fresh:
+        index = pd.concat([cached[cached['dir'].isin(fresh)][INDEX_COLUMNS], index], ignore_index=True)
+    return index.astype({'dir_mtime': 'int64', 'size': 'Int64', 'mtime': 'Int64'}), len(stale)
+
+
+def index_path_for(manifest_path):
+    stem, ext = os.path.splitext(manifest_path)
+    return f"{stem}.index{ext}"
+
+
+def read_table(path):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def write_table(df, path):
+    # Write next to the target and rename, so an interrupted run never
+    # leaves a truncated cache behind
+    tmp = f"{path}.tmp"
+    if path.endswith('.parquet'):
+        df.to_parquet(tmp, index=False)
+    else:
+        df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def build_manifest(csv_dir, image_dir, manifest_path=None, dicom_data=None,
+                   series='cropped images', workers=DEFAULT_WORKERS):
+    """
+    Labelled image manifest: one row per image with full_path, pathology,
+    label, exists, size and mtime (ns since the epoch; NaN when missing).
+
+    With manifest_path, the directory index is cached next to it (see
+    index_path_for) and reused on the next call, and the manifest itself is
+    written there for later runs and other notebooks.
+    """
+    if dicom_data is None:
+        dicom_data = pd.read_csv(os.path.join(csv_dir, 'dicom_info.csv'))
+    images = labelled_images(dicom_data, load_labels(csv_dir), image_dir, series)
+    images['dir'] = images['full_path'].map(os.path.dirname)
+    images['name'] = images['full_path'].map(os.path.basename)
+
+    cached = None
+    index_path = index_path_for(manifest_path) if manifest_path else None
+    if index_path and os.path.exists(index_path):
+        cached = read_table(index_path)
+
+    index, listed = index_dirs(images['dir'], cached, workers)
+    manifest = images.merge(index[['dir', 'name', 'size', 'mtime']], on=['dir', 'name'], how='left')
+    manifest['exists'] = manifest['size'].notna()
+    folders = manifest['dir'].nunique()
+    manifest = manifest.drop(columns=['dir', 'name'])
+
+    print(f"Indexed {folders} image folders ({listed} listed, the rest from cache); "
+          f"{int(manifest['exists'].sum())} of {len(manifest)} images found.")
+
+    if manifest_path:
+        write_table(index, index_path)
+        write_table(manifest, manifest_path)
+    return manifest
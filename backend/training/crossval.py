@@ -0,0 +1,218 @@
+"""
+Parallel k-fold cross-validation for the trainable models.
+
+    python -m training.crossval vit  --data "Breast Cancer Dataset/Augmented Dataset" --out cv/vit --folds 5 --jobs 2
+    python -m training.crossval unet --data dataset_intense --out cv/unet --folds 5
+
+Takes every train.py option. Each fold is one train.train() run with
+--folds K --fold I in its own worker process, writing OUT/fold_<I>/
+(best.weights.h5, history.csv, artifact, summary.json) as a single run
+would. Re-running the command skips folds that already have a
+summary.json and resumes interrupted ones from their backup/, unless
+--fresh is given.
+
+CPU partitioning: the cores this process may use are split into --jobs
+disjoint sets. Each worker pins itself to one set and caps TensorFlow's
+intra-op pool (and OpenMP/BLAS) at the size of its set, so the folds
+running side by side don't fight over cores. Workers are spawned, not
+forked (TensorFlow is not fork-safe), and each one loads its own copy
+of TensorFlow and the model, so --jobs is also bounded by memory.
+
+For vit/vgg16 the parent builds the decode-once image cache before any
+worker starts. The workers only open its .npy files as read-only
+memmaps, so the page cache holds one copy of the decoded pixels however
+many folds run.
+
+When the folds are done, aggregate() takes each finished fold's
+best-epoch metrics (by the pipeline's monitored metric) and writes
+OUT/cv_summary.json with the mean and sample std of every metric across
+folds.
+"""
+
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from training import image_cache
+from training.train import build_parser
+
+# Same variants as pipelines.PIPELINES; kept here so the parent never imports TensorFlow
+CACHED_VARIANTS = {"vit": "vit_224", "vgg16": "vgg_150"}
+
+SUMMARY_FILE = "cv_summary.json"
+
+_cores = None
+
+
+def usable_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def partition_cores(cores, jobs):
+    """Splits cores into `jobs` disjoint, near-equal, contiguous sets."""
+    jobs = max(1, min(jobs, len(cores)))
+    size, extra = divmod(len(cores), jobs)
+    sets, start = [], 0
+    for i in range(jobs):
+        end = start + size + (i < extra)
+        sets.append(cores[start:end])
+        start = end
+    return sets
+
+
+def pin_worker(core_sets):
+    """Pool initializer: takes one core set off the queue and confines this process to it."""
+    # Runs before TensorFlow is imported in this process
+    global _cores
+    _cores = core_sets.get()
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, _cores)
+    threads = str(len(_cores))
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "TF_NUM_INTRAOP_THREADS"):
+        os.environ[var] = threads
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+
+def worker_cores():
+    """The core set pin_worker() gave this process."""
+    return _cores
+
+
+def run_fold(options, fold):
+    from training.train import train
+
+    args = Namespace(**options)
+    args.fold = fold
+    args.out = fold_dir(options["out"], fold)
+    args.threads = len(_cores)
+    print(f"Fold {fold}: cores {_cores[0]}-{_cores[-1]} ({args.threads} threads)", flush=True)
+    return train(args)
+
+
+def fold_dir(out, fold):
+    return os.path.join(out, f"fold_{fold}")
+
+
+def prepare_cache(args):
+    """Builds (or reuses) the image cache the classification folds read."""
+    from training.evaluation import classification_items
+
+    variant = CACHED_VARIANTS[args.model]
+    paths = sorted({path for path, _ in classification_items(args.data)})
+    image_cache.ensure_cache(paths, args.cache_dir, {variant: image_cache.DEFAULT_VARIANTS[variant]},
+                             workers=args.workers)
+
+
+def aggregate(out, n_folds):
+    """Mean/std of the finished folds' best-epoch metrics; writes and returns OUT/cv_summary.json."""
+    folds = {}
+    for fold in range(n_folds):
+        path = os.path.join(fold_dir(out, fold), "summary.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                folds[fold] = json.load(f)
+    if not folds:
+        raise ValueError(f"No finished folds under {out}")
+
+    per_fold = {fold: summary["best_epoch"] or {} for fold, summary in sorted(folds.items())}
+    names = sorted({k for metrics in per_fold.values() for k in metrics} - {"epoch", "learning_rate"})
+    metrics = {}
+    for name in names:
+        values = [m[name] for m in per_fold.values() if name in m]
+        metrics[name] = {
+            "mean": statistics.fmean(values),
+            "std": statistics.stdev(values) if len(values) > 1 else 0.0,
+            "min": min(values),
+            "max": max(values),
+        }
+    first = next(iter(folds.values()))
+    result = {
+        "model": first["model"],
+        "folds": len(folds),
+        "missing_folds": [fold for fold in range(n_folds) if fold not in folds],
+        "monitor": first["monitor"],
+        "metrics": metrics,
+        "per_fold": per_fold,
+        "artifacts": {fold: summary["artifact"] for fold, summary in folds.items()},
+    }
+    with open(os.path.join(out, SUMMARY_FILE), "w") as f:
+        json.dump(result, f, indent=2)
+    return result
+
+
+def print_summary(result):
+    print(f"{result['model']}: {result['folds']} folds, best epoch by {result['monitor']}")
+    for name, stats in result["metrics"].items():
+        print(f"  {name:<24} {stats['mean']:.4f} +/- {stats['std']:.4f}  [{stats['min']:.4f}, {stats['max']:.4f}]")
+
+
+def crossval(args):
+    """Trains every fold of args.folds across args.jobs workers; returns the aggregate."""
+    cores = usable_cores()
+    jobs = args.jobs or max(1, len(cores) // (args.threads or len(cores)))
+    core_sets = partition_cores(cores, min(jobs, args.folds))
+    args.cache_dir = args.cache_dir or os.path.join(os.path.dirname(os.path.abspath(args.out)),
+                                                    image_cache.DEFAULT_CACHE_DIR)
+    os.makedirs(args.out, exist_ok=True)
+
+    if args.model in CACHED_VARIANTS:
+        prepare_cache(args)
+
+    pending = [fold for fold in range(args.folds)
+               if args.fresh or not os.path.exists(os.path.join(fold_dir(args.out, fold), "summary.json"))]
+    if len(pending) < args.folds:
+        print(f"Skipping finished folds: {sorted(set(range(args.folds)) - set(pending))}")
+    print(f"{len(pending)} folds on {len(core_sets)} workers x {[len(s) for s in core_sets]} cores")
+
+    options = {k: v for k, v in vars(args).items() if k != "jobs"}
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    for core_set in core_sets:
+        queue.put(core_set)
+
+    failed = []
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(len(core_sets), mp_context=context,
+                             initializer=pin_worker, initargs=(queue,)) as pool:
+        futures = {pool.submit(run_fold, options, fold): fold for fold in pending}
+        for future in as_completed(futures):
+            fold = futures[future]
+            try:
+                summary = future.result()
+                print(f"Fold {fold} done: {summary['monitor']} {summary['best']}")
+            except Exception as e:
+                failed.append(fold)
+                print(f"Fold {fold} failed: {e!r}")
+    print(f"Cross-validation took {time.perf_counter() - t0:.0f}s")
+
+    if failed:
+        print(f"Failed folds {sorted(failed)}; re-run the same command to retry them")
+    result = aggregate(args.out, args.folds)
+    print_summary(result)
+    return result
+
+
+def main(argv=None):
+    parser = build_parser()
+    parser.prog = "python -m training.crossval"
+    parser.description = "K-fold cross-validation with folds trained in parallel processes"
+    parser.set_defaults(folds=5)
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Folds trained at once (default: cores / --threads, or 1)")
+    args = parser.parse_args(argv)
+    if args.folds < 2:
+        parser.error("--folds needs K >= 2")
+    crossval(args)
+
+
+if __name__ == "__main__":
+    main()
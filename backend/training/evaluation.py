@@ -0,0 +1,334 @@
+"""
+Streaming evaluation for the mammogram classifiers and the ultrasound U-Net.
+
+The notebooks used to evaluate by appending every validation batch to a
+list, np.concatenate-ing the lot and calling model.predict on the whole
+array, which holds the full validation set (and its predictions) in
+memory. Here batches go through the model one at a time and only
+fixed-size accumulators are kept:
+
+  ClassificationMetrics  confusion counts at a threshold (precision, recall,
+                         F1, specificity, accuracy) and a per-class
+                         histogram of P(cancer) from which ROC-AUC is read
+                         off; the binning error is at most 1 / bins
+  SegmentationMetrics    pixel-level Dice/IoU over the whole set, plus the
+                         mean and a histogram (for the median) of per-image
+                         Dice/IoU
+
+evaluate() decodes each batch once and runs every model on it, so several
+artifacts (e.g. checkpoints of one run, or the ViT next to VGG16) are
+compared in one pass over the data:
+
+    python -m training.evaluation DATA --model vit=a.weights.h5 --model vit=b.weights.h5 \\
+        --model vgg16=VGG16_mammogram_model.h5 --report report.json
+    python -m training.evaluation dataset_intense --model unet=ultrasound_unet_model.h5
+
+DATA is a folder with Cancer/ and Non-Cancer/ subfolders, a CSV with
+full_path (or image_path) and label columns such as the CBIS manifest, or
+for unet a folder of image/mask pairs.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CLASSIFIERS = ("vit", "vgg16")
+SEGMENTERS = ("unet",)
+DEFAULT_BATCH_SIZE = 32
+SMOOTH = 1.0  # as in the notebook's dice_coef / iou_coef
+
+
+def positive_probability(kind, outputs):
+    """P(cancer) per row from a classifier's raw outputs."""
+    outputs = np.asarray(outputs, dtype=np.float64)
+    if kind == "vit":
+        # The ViT ends in logits; softmax over the two classes
+        outputs = np.exp(outputs - outputs.max(axis=1, keepdims=True))
+        outputs /= outputs.sum(axis=1, keepdims=True)
+    return outputs[:, 1]
+
+
+class ClassificationMetrics:
+    """Binary classification metrics, accumulated batch by batch."""
+
+    def __init__(self, threshold=0.5, bins=1000):
+        self.threshold = threshold
+        self.bins = bins
+        self.histograms = np.zeros((2, bins), dtype=np.int64)  # [label, score bin]
+        self.counts = {"tp": 0, "fp": 0, "tn": 0, "fn": 0}
+
+    def update(self, labels, scores):
+        labels = np.asarray(labels).astype(bool).ravel()
+        scores = np.asarray(scores, dtype=np.float64).ravel()
+        predicted = scores >= self.threshold
+        self.counts["tp"] += int(np.sum(predicted & labels))
+        self.counts["fp"] += int(np.sum(predicted & ~labels))
+        self.counts["tn"] += int(np.sum(~predicted & ~labels))
+        self.counts["fn"] += int(np.sum(~predicted & labels))
+        bins = np.clip((scores * self.bins).astype(np.int64), 0, self.bins - 1)
+        for label in (0, 1):
+            self.histograms[label] += np.bincount(bins[labels == label], minlength=self.bins)
+
+    def roc_auc(self):
+        """
+        P(score of a random positive > score of a random negative), ties
+        (same bin) counted as half. None until both classes have been seen.
+        """
+        negatives, positives = self.histograms
+        if not negatives.sum() or not positives.sum():
+            return None
+        below = np.cumsum(negatives) - negatives
+        return float(np.sum(positives * (below + 0.5 * negatives)) / (positives.sum() * negatives.sum()))
+
+    def result(self):
+        tp, fp, tn, fn = (self.counts[k] for k in ("tp", "fp", "tn", "fn"))
+        total = tp + fp + tn + fn
+
+        def ratio(a, b):
+            return a / b if b else 0.0
+
+        precision = ratio(tp, tp + fp)
+        recall = ratio(tp, tp + fn)
+        return {
+            "images": total,
+            "threshold": self.threshold,
+            "confusion": dict(self.counts),
+            "accuracy": ratio(tp + tn, total),
+            "precision": precision,
+            "recall": recall,
+            "specificity": ratio(tn, tn + fp),
+            "f1": ratio(2 * precision * recall, precision + recall),
+            "roc_auc": self.roc_auc(),
+        }
+
+
+class SegmentationMetrics:
+    """Dice / IoU of thresholded masks, accumulated batch by batch."""
+
+    def __init__(self, threshold=0.5, bins=100):
+        self.threshold = threshold
+        self.bins = bins
+        self.images = 0
+        self.sums = {"dice": 0.0, "iou": 0.0}
+        self.histograms = {"dice": np.zeros(bins, dtype=np.int64), "iou": np.zeros(bins, dtype=np.int64)}
+        self.pixels = {"intersection": 0, "predicted": 0, "true": 0}
+
+    def update(self, masks, probabilities):
+        """masks, probabilities: (batch, H, W[, 1]) in [0, 1]."""
+        batch = len(masks)
+        truth = (np.asarray(masks) > self.threshold).reshape(batch, -1)
+        predicted = (np.asarray(probabilities) > self.threshold).reshape(batch, -1)
+        intersection = np.sum(truth & predicted, axis=1)
+        true_sum, predicted_sum = truth.sum(axis=1), predicted.sum(axis=1)
+        union = true_sum + predicted_sum - intersection
+
+        per_image = {
+            "dice": (2 * intersection + SMOOTH) / (true_sum + predicted_sum + SMOOTH),
+            "iou": (intersection + SMOOTH) / (union + SMOOTH),
+        }
+        for name, values in per_image.items():
+            self.sums[name] += float(values.sum())
+            bins = np.clip((values * self.bins).astype(np.int64), 0, self.bins - 1)
+            self.histograms[name] += np.bincount(bins, minlength=self.bins)
+        self.pixels["intersection"] += int(intersection.sum())
+        self.pixels["predicted"] += int(predicted_sum.sum())
+        self.pixels["true"] += int(true_sum.sum())
+        self.images += batch
+
+    def _median(self, name):
+        if not self.images:
+            return None
+        bin_index = int(np.searchsorted(np.cumsum(self.histograms[name]), (self.images + 1) / 2))
+        return (bin_index + 0.5) / self.bins
+
+    def result(self):
+        intersection, predicted, true = (self.pixels[k] for k in ("intersection", "predicted", "true"))
+        union = predicted + true - intersection
+        return {
+            "images": self.images,
+            "threshold": self.threshold,
+            "dice": (2 * intersection + SMOOTH) / (predicted + true + SMOOTH),
+            "iou": (intersection + SMOOTH) / (union + SMOOTH),
+            "mean_image_dice": self.sums["dice"] / self.images if self.images else None,
+            "mean_image_iou": self.sums["iou"] / self.images if self.images else None,
+            "median_image_dice": self._median("dice"),
+            "median_image_iou": self._median("iou"),
+        }
+
+
+def evaluate(models, batches, threshold=0.5):
+    """
+    models: {name: (kind, model)}; batches yields (inputs, targets), where
+    inputs is one array for every model or a {kind: array} dict. Each batch
+    is run through every model before the next is read.
+    Returns {name: metrics dict}, each with the model's inference seconds.
+    """
+    metrics, seconds = {}, {}
+    for name, (kind, _) in models.items():
+        metrics[name] = (SegmentationMetrics(threshold) if kind in SEGMENTERS
+                         else ClassificationMetrics(threshold))
+        seconds[name] = 0.0
+
+    for inputs, targets in batches:
+        targets = np.asarray(targets)
+        for name, (kind, model) in models.items():
+            x = inputs[kind] if isinstance(inputs, dict) else inputs
+            t0 = time.perf_counter()
+            outputs = np.asarray(model.predict_on_batch(x))
+            seconds[name] += time.perf_counter() - t0
+            if kind in SEGMENTERS:
+                metrics[name].update(targets, outputs)
+            else:
+                metrics[name].update(targets, positive_probability(kind, outputs))
+
+    results = {}
+    for name, (kind, _) in models.items():
+        results[name] = {"kind": kind, **metrics[name].result(), "inference_seconds": seconds[name]}
+    return results
+
+
+def write_report(results, path, **extra):
+    """Writes results (plus any extra top-level fields) as JSON."""
+    with open(path, "w") as f:
+        json.dump({**extra, "models": results}, f, indent=2)
+
+
+def print_report(results):
+    for name, result in results.items():
+        if result["kind"] in SEGMENTERS:
+            print(f"{name}: Dice {result['dice']:.4f}, IoU {result['iou']:.4f} "
+                  f"(per image: Dice {result['mean_image_dice']:.4f}, IoU {result['mean_image_iou']:.4f}) "
+                  f"over {result['images']} images")
+        else:
+            auc = result["roc_auc"]
+            print(f"{name}: Precision {result['precision']:.4f}, Recall {result['recall']:.4f}, "
+                  f"F1 {result['f1']:.4f}, ROC-AUC {'n/a' if auc is None else f'{auc:.4f}'} "
+                  f"over {result['images']} images")
+
+
+# --- Data sources for the CLI ---
+
+def classification_items(data):
+    """[(path, label)] from a Cancer/Non-Cancer folder or a labelled CSV."""
+    if os.path.isdir(data):
+        items = []
+        for folder, label in (("Non-Cancer", 0), ("Cancer", 1)):
+            root = os.path.join(data, folder)
+            items += [(os.path.join(root, name), label) for name in sorted(os.listdir(root))]
+        return items
+    import pandas as pd
+    df = pd.read_csv(data)
+    if "exists" in df:
+        df = df[df["exists"]]
+    path_column = "full_path" if "full_path" in df else "image_path"
+    return list(zip(df[path_column], df["label"].astype(int)))
+
+
+def classification_batches(items, kinds, batch_size, workers=4):
+    """
+    Yields ({kind: model input}, labels). Each image is decoded once and
+    turned into every kind's input exactly as the server does; the next
+    batch is decoded while the current one is being scored.
+    """
+    from PIL import Image
+    from preprocessing import VGG_INPUT_SIZE, VIT_INPUT_SIZE, vgg_input_into, vit_input_into
+
+    shapes = {"vit": (VIT_INPUT_SIZE, VIT_INPUT_SIZE), "vgg16": (VGG_INPUT_SIZE, VGG_INPUT_SIZE, 3)}
+    fill = {"vit": vit_input_into, "vgg16": vgg_input_into}
+
+    def load(chunk):
+        inputs = {kind: np.empty((len(chunk), *shapes[kind]), dtype=np.float32) for kind in kinds}
+        for i, (path, _) in enumerate(chunk):
+            with Image.open(path) as img:
+                gray = img.convert("L")
+            for kind in kinds:
+                fill[kind](gray, inputs[kind][i])
+        if "vit" in inputs:
+            inputs["vit"] = inputs["vit"][..., np.newaxis]
+        return inputs, np.array([label for _, label in chunk], dtype=np.int32)
+
+    chunks = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    with ThreadPoolExecutor(workers) as pool:
+        pending = pool.submit(load, chunks[0]) if chunks else None
+        for i in range(len(chunks)):
+            batch = pending.result()
+            pending = pool.submit(load, chunks[i + 1]) if i + 1 < len(chunks) else None
+            yield batch
+
+
+def load_model(kind, path):
+    """Loads an artifact the way the server's model registry does."""
+    import keras
+    if kind == "vit":
+        from training.architectures import create_vit_classifier
+        model = create_vit_classifier()
+        model.load_weights(path)
+        return model
+    return keras.models.load_model(path, compile=False)
+
+
+def model_label(path, paths):
+    """
+    path relative to the directory all paths share, so artifacts with the
+    same file name (fold_0/best.weights.h5, fold_1/best.weights.h5) keep
+    distinct labels.
+    """
+    common = os.path.commonpath([os.path.dirname(p) for p in paths])
+    return os.path.relpath(path, common)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate one or more model artifacts in a single streaming pass")
+    parser.add_argument("data", help="Cancer/Non-Cancer folder or labelled CSV (classifiers); image/mask folder (unet)")
+    parser.add_argument("--model", action="append", required=True, metavar="KIND=PATH",
+                        help=f"Artifact to evaluate; KIND is one of {', '.join(CLASSIFIERS + SEGMENTERS)}. Repeatable.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--report", help="Write the metrics as JSON")
+    args = parser.parse_args()
+
+    specs = []
+    for spec in args.model:
+        kind, _, path = spec.partition("=")
+        if kind not in CLASSIFIERS + SEGMENTERS or not path:
+            parser.error(f"--model expects KIND=PATH with KIND in {CLASSIFIERS + SEGMENTERS}, got {spec!r}")
+        specs.append((kind, os.path.abspath(path)))
+
+    models = {}
+    for kind, path in specs:
+        name = f"{kind}:{model_label(path, [p for _, p in specs])}"
+        if name in models:
+            parser.error(f"{name} is given more than once")
+        models[name] = (kind, load_model(kind, path))
+    kinds = {kind for kind, _ in models.values()}
+    if kinds & set(SEGMENTERS) and kinds - set(SEGMENTERS):
+        parser.error("Classifiers and the U-Net need different data; evaluate them separately")
+
+    if kinds <= set(SEGMENTERS):
+        from training import ultrasound_data
+        pairs = ultrasound_data.find_pairs(args.data)
+        batches = ultrasound_data.make_dataset(pairs, batch_size=args.batch_size).as_numpy_iterator()
+        count = len(pairs)
+    else:
+        items = classification_items(args.data)
+        batches = classification_batches(items, sorted(kinds), args.batch_size)
+        count = len(items)
+
+    t0 = time.perf_counter()
+    results = evaluate(models, batches, args.threshold)
+    elapsed = time.perf_counter() - t0
+    print_report(results)
+    print(f"Evaluated {len(models)} model(s) on {count} images in {elapsed:.1f}s")
+    if args.report:
+        write_report(results, args.report, data=args.data, seconds=elapsed)
+
+
+if __name__ == "__main__":
+    main()
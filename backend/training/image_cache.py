@@ -0,0 +1,215 @@
+"""
+Decode-once, multi-resolution image cache for the mammogram notebooks.
+
+deepmammo_cnn_vgg16.py decoded every mammogram at 50x50 for the CNN, then
+decoded them all again at 150x150 for VGG16, and vit_mammogram.py decoded
+each image at 224x224 on every epoch. build_cache() decodes each source
+image once and writes every requested variant (size, grayscale or RGB,
+resampling filter) into its own uint8 .npy memmap:
+
+    cache_dir/
+      index.json      variants, shapes and the ordered source paths
+      cnn_50.npy      (N, 50, 50, 3)    read_and_resize_mammogram()
+      vgg_150.npy     (N, 150, 150, 3)  read_and_resize_mammogram_large()
+      vit_224.npy     (N, 224, 224, 1)  MammogramDataset / serving
+      ...
+
+Each variant uses the filter its original loader used, so cached arrays
+match what the notebooks computed. Loaders then slice rows out of the
+memmaps (ImageCache.take) with no decode or resize cost, and the page
+cache shares them between notebooks and epochs.
+
+Decoding runs in a multiprocessing pool; workers write their rows
+straight into the memmaps, so no pixels are pickled back to the parent.
+
+    python -m training.image_cache cache_dir paths.txt --workers 8
+"""
+
+import argparse
+import json
+import os
+from collections import namedtuple
+from multiprocessing import Pool
+
+import cv2
+import numpy as np
+from PIL import Image
+
+INDEX_FILE = 'index.json'
+
+# Relative to a run directory's parent (training/train.py, training/crossval.py)
+DEFAULT_CACHE_DIR = os.path.join('training_cache', 'images')
+
+Variant = namedtuple('Variant', ['size', 'mode', 'resample'])
+
+# resample names -> how the original loaders resized
+RESAMPLERS = {
+    'cv2_linear': None,  # cv2.resize INTER_LINEAR on the uint8 array
+    'bilinear': Image.Resampling.BILINEAR,
+    'bicubic': Image.Resampling.BICUBIC,  # PIL's default for resize()
+    'lanczos': Image.Resampling.LANCZOS,
+}
+
+DEFAULT_VARIANTS = {
+    'cnn_50': Variant(50, 'RGB', 'cv2_linear'),
+    'gray_128': Variant(128, 'L', 'bicubic'),
+    'rgb_128': Variant(128, 'RGB', 'bicubic'),
+    'vgg_150': Variant(150, 'RGB', 'lanczos'),
+    'vit_224': Variant(224, 'L', 'bicubic'),
+}
+
+
+def variant_shape(variant, count):
+    channels = 3 if variant.mode == 'RGB' else 1
+    return (count, variant.size, variant.size, channels)
+
+
+def render(img, variant):
+    """One variant of a decoded PIL image, as a uint8 (size, size, channels) array."""
+    size = (variant.size, variant.size)
+    if variant.resample == 'cv2_linear':
+        # cv2.imread(GRAYSCALE) -> GRAY2RGB -> cv2.resize, as the 50x50 loader did
+        pixels = cv2.resize(np.asarray(img.convert('L')), size, interpolation=cv2.INTER_LINEAR)
+        if variant.mode == 'RGB':
+            return cv2.cvtColor(pixels, cv2.COLOR_GRAY2RGB)
+        return pixels[..., np.newaxis]
+    pixels = np.asarray(img.convert(variant.mode).resize(size, RESAMPLERS[variant.resample]))
+    return pixels if variant.mode == 'RGB' else pixels[..., np.newaxis]
+
+
+# Worker state, set once per process by _init_worker
+_worker = {}
+
+
+def _init_worker(cache_dir, variants):
+    _worker['arrays'] = {
+        name: np.lib.format.open_memmap(os.path.join(cache_dir, f'{name}.npy'), mode='r+')
+        for name in variants
+    }
+    _worker['variants'] = variants
+
+
+def _decode(job):
+    """Decodes job = (row, path) into every variant; returns (row, ok)."""
+    row, path = job
+    try:
+        with Image.open(path) as img:
+            img.load()
+            for name, variant in _worker['variants'].items():
+                _worker['arrays'][name][row] = render(img, variant)
+    except Exception as e:
+        print(f"Error decoding {path}: {e}")
+        return row, False
+    return row, True
+
+
+def build_cache(paths, cache_dir, variants=None, workers=None, chunksize=16):
+    """
+    Decodes every path once into each variant under cache_dir and returns
+    the ImageCache. workers defaults to all cores; workers=1 decodes in
+    this process. Rows that fail to decode are zero and flagged not ok.
+    """
+    variants = variants or DEFAULT_VARIANTS
+    variants = {name: Variant(*variant) for name, variant in variants.items()}
+    paths = [str(path) for path in paths]
+    os.makedirs(cache_dir, exist_ok=True)
+    # Drop any old index first: until the new one is written the cache is incomplete
+    if os.path.exists(os.path.join(cache_dir, INDEX_FILE)):
+        os.remove(os.path.join(cache_dir, INDEX_FILE))
+
+    # Allocate every memmap up front so workers only ever open them
+    for name, variant in variants.items():
+        np.lib.format.open_memmap(os.path.join(cache_dir, f'{name}.npy'), mode='w+',
+                                  dtype=np.uint8, shape=variant_shape(variant, len(paths)))
+
+    ok = np.zeros(len(paths), dtype=bool)
+    jobs = list(enumerate(paths))
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(cache_dir, variants)
+        for row, decoded in map(_decode, jobs):
+            ok[row] = decoded
+        _worker.clear()
+    else:
+        with Pool(workers, initializer=_init_worker, initargs=(cache_dir, variants)) as pool:
+            for row, decoded in pool.imap_unordered(_decode, jobs, chunksize=chunksize):
+                ok[row] = decoded
+
+    index = {
+        'variants': {name: variant._asdict() for name, variant in variants.items()},
+        'paths': paths,
+        'ok': ok.tolist(),
+    }
+    tmp = os.path.join(cache_dir, INDEX_FILE + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp, os.path.join(cache_dir, INDEX_FILE))
+    print(f"Cached {int(ok.sum())} of {len(paths)} images in {len(variants)} variants at {cache_dir}")
+    return ImageCache(cache_dir)
+
+
+class ImageCache:
+    """Read-only view of a cache_dir written by build_cache()."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, INDEX_FILE)) as f:
+            index = json.load(f)
+        self.variants = {name: Variant(**spec) for name, spec in index['variants'].items()}
+        self.paths = index['paths']
+        self.ok = np.array(index['ok'], dtype=bool)
+        self.rows = {path: row for row, path in enumerate(self.paths)}
+        self._arrays = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def array(self, name):
+        """The whole (N, size, size, channels) uint8 memmap of one variant."""
+        array = self._arrays.get(name)
+        if array is None:
+            array = self._arrays[name] = np.load(os.path.join(self.cache_dir, f'{name}.npy'), mmap_mode='r')
+        return array
+
+    def take(self, name, paths):
+        """uint8 images of one variant for paths, in order, as an in-memory array."""
+        rows = np.fromiter((self.rows[str(path)] for path in paths), dtype=np.int64, count=len(paths))
+        return self.array(name)[rows]
+
+    def valid(self, paths):
+        """Boolean mask of which paths decoded successfully."""
+        return np.array([self.ok[self.rows[str(path)]] for path in paths], dtype=bool)
+
+    def covers(self, paths, variants):
+        """True if this cache holds every path in every variant (same spec)."""
+        return (all(self.variants.get(name) == Variant(*variant) for name, variant in variants.items())
+                and all(str(path) in self.rows for path in paths))
+
+
+def ensure_cache(paths, cache_dir, variants=None, workers=None):
+    """Opens cache_dir if it already covers paths and variants, otherwise (re)builds it."""
+    variants = variants or DEFAULT_VARIANTS
+    if os.path.exists(os.path.join(cache_dir, INDEX_FILE)):
+        cache = ImageCache(cache_dir)
+        if cache.covers(paths, variants):
+            print(f"Reusing image cache at {cache_dir} ({len(cache)} images)")
+            return cache
+    return build_cache(paths, cache_dir, variants, workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode images once into multi-resolution uint8 memmaps")
+    parser.add_argument('cache_dir')
+    parser.add_argument('paths', help="Text file with one image path per line")
+    parser.add_argument('--variants', nargs='+', choices=sorted(DEFAULT_VARIANTS),
+                        default=sorted(DEFAULT_VARIANTS))
+    parser.add_argument('--workers', type=int, default=None, help="Decode processes (default: all cores)")
+    args = parser.parse_args()
+
+    with open(args.paths) as f:
+        paths = [line.strip() for line in f if line.strip()]
+    build_cache(paths, args.cache_dir, {name: DEFAULT_VARIANTS[name] for name in args.variants}, args.workers)
+
+
+if __name__ == '__main__':
+    main()
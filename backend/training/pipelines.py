@@ -0,0 +1,160 @@
+"""
+Model, data and compile settings for each trainable model, as the notebooks
+had them, for the headless trainer (training/train.py).
+
+  vit     create_vit_classifier on 224x224 grayscale, (x - 0.5) / 0.5 as
+          the notebook's Normalization layer did; class-balanced batches
+          (sampling.BalancedBatchSampler) from the decode-once image cache
+  vgg16   the frozen VGG16 transfer model on 150x150 RGB / 255, one-hot
+          labels; same cache and sampler
+  unet    simple_unet_model on ultrasound image/mask pairs streamed and
+          jointly augmented by ultrasound_data.make_dataset
+
+Each pipeline's datasets() returns (train, steps_per_epoch, validation);
+steps_per_epoch is None when the training dataset ends by itself. The
+validation rows are a --val-split holdout, or fold --fold of --folds when
+those are set (training/crossval.py).
+"""
+
+from collections import namedtuple
+
+import keras
+import numpy as np
+import tensorflow as tf
+
+from training import evaluation, image_cache, ultrasound_data
+from training.architectures import create_vgg16_transfer, create_vit_classifier, simple_unet_model
+from training.sampling import BalancedBatchSampler, kfold_indexes, split_indexes
+
+Pipeline = namedtuple('Pipeline', ['build', 'compile', 'datasets', 'monitor', 'mode', 'artifact', 'reduce_lr'])
+
+
+def split(labels, args, stratify=True):
+    """(train, validation) indexes: the requested fold, or a val_split holdout."""
+    if getattr(args, 'folds', None):
+        return kfold_indexes(labels, args.folds, seed=args.seed, stratify=stratify)[args.fold]
+    return split_indexes(labels, args.val_split, seed=args.seed, stratify=stratify)
+
+
+def arch_kwargs(args):
+    """--arch KEY=VALUE pairs as keyword arguments for the architecture function."""
+    return dict(getattr(args, 'arch', None) or ())
+
+
+# --- Classification (ViT, VGG16) ---
+
+def cached_classification_data(args, variant, normalise):
+    """
+    Splits the labelled images (stratified, before any balancing), caches
+    them once in the requested variant and returns the train/validation
+    datasets of (normalised images, labels).
+    """
+    items = evaluation.classification_items(args.data)
+    paths = np.array([path for path, _ in items], dtype=object)
+    labels = np.array([label for _, label in items], dtype=np.int32)
+
+    cache = image_cache.ensure_cache(sorted(set(paths)), args.cache_dir,
+                                     {variant: image_cache.DEFAULT_VARIANTS[variant]}, workers=args.workers)
+    ok = cache.valid(paths)
+    paths, labels = paths[ok], labels[ok]
+    rows = np.array([cache.rows[path] for path in paths], dtype=np.int64)
+    pixels = cache.array(variant)
+
+    train, val = split(labels, args)
+    print(f"{len(train)} training / {len(val)} validation images")
+
+    def take(subset):
+        def load(batch):
+            return pixels[rows[subset][batch]], labels[subset][batch]
+        return load
+
+    def to_batches(ds, load):
+        ds = ds.map(lambda batch: tf.numpy_function(load, [batch], [tf.uint8, tf.int32]),
+                    num_parallel_calls=tf.data.AUTOTUNE)
+        return ds.map(lambda images, y: normalise(tf.ensure_shape(images, (None, *pixels.shape[1:])),
+                                                  tf.ensure_shape(y, (None,))))
+
+    sampler = BalancedBatchSampler(labels[train], args.batch_size, seed=args.seed)
+
+    def balanced_batches():
+        # Endless; Keras runs len(sampler) steps per epoch
+        while True:
+            yield from sampler
+            sampler.new_epoch()
+
+    train_ds = tf.data.Dataset.from_generator(balanced_batches, output_signature=tf.TensorSpec([None], tf.int64))
+    train_ds = to_batches(train_ds, take(train))
+    train_ds = train_ds.map(lambda x, y: (tf.image.random_flip_left_right(x, seed=args.seed), y))
+
+    val_ds = tf.data.Dataset.range(len(val)).batch(args.batch_size)
+    val_ds = to_batches(val_ds, take(val))
+    return train_ds.prefetch(tf.data.AUTOTUNE), len(sampler), val_ds.prefetch(tf.data.AUTOTUNE)
+
+
+def vit_normalise(images, labels):
+    return (tf.cast(images, tf.float32) - 0.5) / 0.5, labels
+
+
+def vgg_normalise(images, labels):
+    return tf.cast(images, tf.float32) / 255.0, tf.one_hot(labels, 2)
+
+
+def vit_compile(model, args):
+    model.compile(
+        optimizer=keras.optimizers.AdamW(learning_rate=args.lr or 0.001, weight_decay=0.0001),
+        loss=keras.losses.SparseCategoricalCrossentropy(from_logits=True),
+        metrics=[keras.metrics.SparseCategoricalAccuracy(name="accuracy")],
+    )
+
+
+def vgg_compile(model, args):
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate=args.lr or 0.0001),
+                  loss='binary_crossentropy', metrics=['accuracy'])
+
+
+# --- Segmentation (U-Net) ---
+
+def unet_data(args):
+    pairs = ultrasound_data.find_pairs(args.data)
+    train, val = split(np.zeros(len(pairs)), args, stratify=False)
+    print(f"{len(train)} training / {len(val)} validation image/mask pairs")
+    train_ds = ultrasound_data.make_dataset([pairs[i] for i in train], batch_size=args.batch_size,
+                                            augment=True, shuffle=True, seed=args.seed)
+    val_ds = ultrasound_data.make_dataset([pairs[i] for i in val], batch_size=args.batch_size)
+    return train_ds, None, val_ds
+
+
+def unet_compile(model, args):
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate=args.lr or 0.001),
+                  loss='binary_crossentropy', metrics=['accuracy'])
+
+
+PIPELINES = {
+    "vit": Pipeline(
+        build=lambda args: create_vit_classifier(**arch_kwargs(args)),
+        compile=vit_compile,
+        datasets=lambda args: cached_classification_data(args, "vit_224", vit_normalise),
+        monitor="val_accuracy", mode="max",
+        artifact="vit_mammogram_model.keras",
+        reduce_lr=False,
+    ),
+    "vgg16": Pipeline(
+        build=lambda args: create_vgg16_transfer(weights=None if args.no_pretrained else 'imagenet'),
+        compile=vgg_compile,
+        datasets=lambda args: cached_classification_data(args, "vgg_150", vgg_normalise),
+        monitor="val_loss", mode="min",
+        artifact="VGG16_mammogram_model.h5",
+        reduce_lr=True,
+    ),
+    "unet": Pipeline(
+        build=lambda args: simple_unet_model(ultrasound_data.IMG_SIZE, ultrasound_data.IMG_SIZE, 3,
+                                             **arch_kwargs(args)),
+        compile=unet_compile,
+        datasets=unet_data,
+        monitor="val_loss", mode="min",
+        artifact="ultrasound_unet_model.h5",
+        reduce_lr=True,
+    ),
+}
+
+DEFAULT_BATCH_SIZES = {"vit": 32, "vgg16": 16, "unet": 16}
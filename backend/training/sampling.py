@@ -0,0 +1,127 @@
+"""
+Class-balanced batch sampling without duplicating rows.
+
+vit_mammogram.py used to balance classes by upsampling the minority class
+with sklearn.utils.resample(replace=True) and then splitting the
+duplicated frame. That made every epoch as long as n_classes x the largest
+class, spent decode time on repeated rows, and put copies of the same
+image on both sides of the train/validation split.
+
+BalancedBatchSampler works on the original (already split) labels and
+hands out batches of row indexes with every class equally represented.
+Each class is drawn from its own shuffled pool without replacement. When
+a pool runs out it is reshuffled and drawing carries on, so a minority
+image only repeats after all of its class has been seen. Pools carry
+over between epochs, so with the default epoch length (one pass over the
+rows that exist) the majority class rotates through all of its images
+over successive epochs instead of being truncated.
+"""
+
+import numpy as np
+
+
+class BalancedBatchSampler:
+    """
+    labels: one label per row (any hashable values). batch_size rows per
+    batch, split evenly across the classes (any remainder goes to randomly
+    chosen classes). epoch_size defaults to len(labels) rows.
+    """
+
+    def __init__(self, labels, batch_size=32, epoch_size=None, seed=None):
+        labels = np.asarray(labels)
+        self.classes, inverse = np.unique(labels, return_inverse=True)
+        if len(self.classes) < 2:
+            raise ValueError("BalancedBatchSampler needs at least two classes")
+        self.members = [np.flatnonzero(inverse == c) for c in range(len(self.classes))]
+        self.batch_size = batch_size
+        self.epoch_size = epoch_size or len(labels)
+        self.rng = np.random.default_rng(seed)
+        self.pools = [self.rng.permutation(rows) for rows in self.members]
+        self.cursors = [0] * len(self.members)
+        self.batches = []
+        self.new_epoch()
+
+    def __len__(self):
+        return len(self.batches)
+
+    def __getitem__(self, i):
+        return self.batches[i]
+
+    def __iter__(self):
+        return iter(self.batches)
+
+    def _draw(self, c, count):
+        rows = []
+        while count:
+            pool, cursor = self.pools[c], self.cursors[c]
+            take = min(count, len(pool) - cursor)
+            rows.append(pool[cursor:cursor + take])
+            count -= take
+            self.cursors[c] = cursor + take
+            if self.cursors[c] == len(pool):
+                self.pools[c] = self.rng.permutation(self.members[c])
+                self.cursors[c] = 0
+        return np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+
+    def new_epoch(self):
+        """Draws the next epoch's batches (call from on_epoch_end)."""
+        n_classes = len(self.members)
+        batches = []
+        for start in range(0, self.epoch_size, self.batch_size):
+            size = min(self.batch_size, self.epoch_size - start)
+            counts = np.full(n_classes, size // n_classes)
+            counts[self.rng.choice(n_classes, size % n_classes, replace=False)] += 1
+            batch = np.concatenate([self._draw(c, int(n)) for c, n in enumerate(counts)])
+            batches.append(self.rng.permutation(batch))
+        self.batches = batches
+        return batches
+
+    def summary(self):
+        """Rows per epoch here vs. what upsampling every class to the largest would give."""
+        counts = [len(rows) for rows in self.members]
+        upsampled = max(counts) * len(counts)
+        return {
+            'class_counts': dict(zip(self.classes.tolist(), counts)),
+            'rows_per_epoch': self.epoch_size,
+            'upsampled_rows_per_epoch': upsampled,
+            'rows_per_epoch_ratio': self.epoch_size / upsampled,
+        }
+
+
+def split_indexes(labels, test_fraction, seed=None, stratify=True):
+    """
+    (train, test) row indexes. With stratify, each class is split in the
+    same proportion, like train_test_split(..., stratify=labels).
+    """
+    labels = np.asarray(labels)
+    rng = np.random.default_rng(seed)
+    groups = [np.flatnonzero(labels == c) for c in np.unique(labels)] if stratify else [np.arange(len(labels))]
+    train, test = [], []
+    for rows in groups:
+        rows = rng.permutation(rows)
+        cut = int(round(len(rows) * test_fraction))
+        test.append(rows[:cut])
+        train.append(rows[cut:])
+    return np.sort(np.concatenate(train)), np.sort(np.concatenate(test))
+
+
+def kfold_indexes(labels, k, seed=None, stratify=True):
+    """
+    k (train, test) index pairs whose test parts partition the rows, like
+    StratifiedKFold(k, shuffle=True). With stratify, each class is dealt
+    round-robin across the folds so every fold keeps the class balance.
+    """
+    if k < 2:
+        raise ValueError("kfold_indexes needs k >= 2")
+    labels = np.asarray(labels)
+    if len(labels) < k:
+        raise ValueError(f"Cannot make {k} folds from {len(labels)} rows")
+    rng = np.random.default_rng(seed)
+    groups = [np.flatnonzero(labels == c) for c in np.unique(labels)] if stratify else [np.arange(len(labels))]
+    fold_of = np.empty(len(labels), dtype=np.int64)
+    offset = 0
+    for rows in groups:
+        # Continue the deal where the previous class stopped so fold sizes stay within one row
+        fold_of[rng.permutation(rows)] = (offset + np.arange(len(rows))) % k
+        offset += len(rows)
+    return [(np.flatnonzero(fold_of != f), np.flatnonzero(fold_of == f)) for f in range(k)]
@@ -0,0 +1,250 @@
+"""
+Architecture search for the ViT and the U-Net, with trials run in
+parallel and pruned early.
+
+    python -m training.search vit  --data "Breast Cancer Dataset/Augmented Dataset" --out search/vit --trials 24 --jobs 4 --epochs 20
+    python -m training.search unet --data dataset_intense --out search/unet --trials 12 --jobs 2
+
+Takes every train.py option; they apply to every trial. Trial 0 is the
+served architecture (the defaults of create_vit_classifier /
+simple_unet_model); the rest are drawn without replacement from
+SPACES[model], seeded by --seed, so re-running the command gives the
+same trials and skips the finished ones.
+
+Each trial is a train.py run in OUT/trial_<n>/ with its configuration
+passed as --arch, in a worker process pinned to its own cores
+(crossval.pin_worker). Data handling is the same as a single run,
+including the shared read-only image cache for the ViT.
+
+Pruning: callbacks.MedianPruner stops a trial from epoch --prune-after
+on when its best validation metric so far is worse than the median the
+other trials had reached by the same epoch (at least --prune-min-trials
+of them).
+
+Every finished trial records its best-epoch metrics, parameter count and
+single-image CPU latency (p50/p95 of predict_on_batch at batch size 1
+with the worker's thread count; workers get equal core sets so the
+numbers compare) in OUT/trial_<n>/result.json. OUT/search.json collects
+all trials plus the Pareto front over (monitored metric, latency,
+parameters): the unpruned trials that no other trial beats on one of
+them without being worse on another.
+"""
+
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from argparse import Namespace
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from training import crossval, image_cache
+from training.train import build_parser
+
+SearchSpace = namedtuple('SearchSpace', ['baseline', 'choices'])
+
+# baseline: the served architecture's values for the searched arguments
+SPACES = {
+    "vit": SearchSpace(
+        baseline={"patch_size": 16, "projection_dim": 64, "transformer_layers": 8, "num_heads": 4,
+                  "mlp_head_units": [2048, 1024]},
+        choices={
+            "patch_size": [14, 16, 28, 32],
+            "projection_dim": [32, 64, 96],
+            "transformer_layers": [2, 4, 6, 8],
+            "num_heads": [2, 4, 8],
+            "mlp_head_units": [[512], [1024, 512], [2048, 1024]],
+        },
+    ),
+    "unet": SearchSpace(
+        baseline={"base_filters": 32, "dropout_scale": 1.0},
+        choices={
+            "base_filters": [8, 16, 24, 32],
+            "dropout_scale": [0.0, 0.5, 1.0, 1.5],
+        },
+    ),
+}
+
+RESULT_FILE = "result.json"
+SUMMARY_FILE = "search.json"
+
+
+def sample_trials(space, n_trials, seed=None):
+    """The baseline followed by n_trials - 1 distinct configurations drawn from the grid."""
+    names = list(space.choices)
+    grid = [dict(zip(names, values)) for values in itertools.product(*space.choices.values())]
+    grid = [config for config in grid if config != space.baseline]
+    order = np.random.default_rng(seed).permutation(len(grid))
+    return [space.baseline] + [grid[i] for i in order[:max(0, n_trials - 1)]]
+
+
+def trial_dir(out, trial):
+    return os.path.join(out, f"trial_{trial}")
+
+
+def measure_latency(model, repeats=50, warmup=5):
+    """p50/p95 milliseconds of predict_on_batch on one zero image."""
+    x = np.zeros((1, *model.input_shape[1:]), dtype=np.float32)
+    for _ in range(warmup):
+        model.predict_on_batch(x)
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        model.predict_on_batch(x)
+        times.append((time.perf_counter() - t0) * 1000)
+    return {"p50": float(np.percentile(times, 50)), "p95": float(np.percentile(times, 95))}
+
+
+def run_trial(options, trial, config, prune_after, prune_min_trials):
+    from training.callbacks import MedianPruner
+    from training.pipelines import PIPELINES
+    from training.train import run
+
+    cores = crossval.worker_cores()
+    args = Namespace(**options)
+    args.arch = list(options["arch"]) + list(config.items())
+    args.out = trial_dir(options["out"], trial)
+    args.threads = len(cores)
+    print(f"Trial {trial} on cores {cores[0]}-{cores[-1]}: {config}", flush=True)
+
+    pipeline = PIPELINES[args.model]
+    pruner = MedianPruner(args.out, os.path.join(options["out"], "trial_*"), pipeline.monitor, pipeline.mode,
+                          after=prune_after, min_runs=prune_min_trials)
+    model, summary = run(args, [pruner])
+    result = {
+        "trial": trial,
+        "config": config,
+        "monitor": summary["monitor"],
+        "mode": summary["mode"],
+        "best": summary["best"],
+        "best_epoch": summary["best_epoch"],
+        "pruned_at": pruner.pruned_at,
+        "epochs_run": summary["epochs_run"],
+        "seconds": summary["seconds"],
+        "parameters": summary["parameters"],
+        "latency_ms": None if pruner.pruned_at else measure_latency(model),
+        "latency_threads": args.threads,
+        "artifact": summary["artifact"],
+    }
+    with open(os.path.join(args.out, RESULT_FILE), "w") as f:
+        json.dump(result, f, indent=2)
+    return result
+
+
+def dominates(a, b):
+    """a is at least as good as b on every objective and better on one."""
+    sign = 1 if a["mode"] == "max" else -1
+    a_objectives = (sign * a["best"], -a["latency_ms"]["p50"], -a["parameters"])
+    b_objectives = (sign * b["best"], -b["latency_ms"]["p50"], -b["parameters"])
+    return all(x >= y for x, y in zip(a_objectives, b_objectives)) and a_objectives != b_objectives
+
+
+def pareto_front(results):
+    candidates = [r for r in results if not r["pruned_at"] and r["best"] is not None and r["latency_ms"]]
+    return [r for r in candidates if not any(dominates(other, r) for other in candidates)]
+
+
+def collect(out, n_trials):
+    """Writes and returns OUT/search.json from the finished trials' result.json files."""
+    results = []
+    for trial in range(n_trials):
+        path = os.path.join(trial_dir(out, trial), RESULT_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                results.append(json.load(f))
+    front = pareto_front(results)
+    summary = {
+        "trials": len(results),
+        "pruned": [r["trial"] for r in results if r["pruned_at"]],
+        "pareto_front": [r["trial"] for r in front],
+        "results": results,
+    }
+    with open(os.path.join(out, SUMMARY_FILE), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def print_summary(summary):
+    front = set(summary["pareto_front"])
+    results = [r for r in summary["results"] if r["best"] is not None]
+    if not results:
+        print("No finished trials")
+        return
+    monitor, mode = results[0]["monitor"], results[0]["mode"]
+    results.sort(key=lambda r: r["best"], reverse=mode == "max")
+    print(f"{'trial':>5} {monitor:>12} {'p50 ms':>8} {'params':>11}  config")
+    for r in results:
+        latency = f"{r['latency_ms']['p50']:8.1f}" if r["latency_ms"] else f"{'pruned':>8}"
+        mark = "*" if r["trial"] in front else " "
+        print(f"{r['trial']:>5} {r['best']:12.4f} {latency} {r['parameters']:11,d} {mark} {r['config']}")
+    print("* Pareto front (metric vs latency vs parameters)")
+
+
+def search(args):
+    """Runs the trials across args.jobs pinned workers; returns the collected summary."""
+    trials = sample_trials(SPACES[args.model], args.trials, seed=args.seed)
+    cores = crossval.usable_cores()
+    jobs = args.jobs or max(1, len(cores) // (args.threads or len(cores)))
+    core_sets = crossval.partition_cores(cores, min(jobs, len(trials)))
+    args.cache_dir = args.cache_dir or os.path.join(os.path.dirname(os.path.abspath(args.out)),
+                                                    image_cache.DEFAULT_CACHE_DIR)
+    os.makedirs(args.out, exist_ok=True)
+
+    if args.model in crossval.CACHED_VARIANTS:
+        crossval.prepare_cache(args)
+
+    pending = [trial for trial in range(len(trials))
+               if args.fresh or not os.path.exists(os.path.join(trial_dir(args.out, trial), RESULT_FILE))]
+    print(f"{len(pending)} of {len(trials)} trials on {len(core_sets)} workers x {[len(s) for s in core_sets]} cores")
+
+    options = {k: v for k, v in vars(args).items()
+               if k not in ("jobs", "trials", "prune_after", "prune_min_trials")}
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    for core_set in core_sets:
+        queue.put(core_set)
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(len(core_sets), mp_context=context,
+                             initializer=crossval.pin_worker, initargs=(queue,)) as pool:
+        futures = {pool.submit(run_trial, options, trial, trials[trial], args.prune_after, args.prune_min_trials): trial
+                   for trial in pending}
+        for future in as_completed(futures):
+            trial = futures[future]
+            try:
+                result = future.result()
+                state = f"pruned at epoch {result['pruned_at']}" if result["pruned_at"] else "done"
+                print(f"Trial {trial} {state}: {result['monitor']} {result['best']}")
+            except Exception as e:
+                print(f"Trial {trial} failed: {e!r}")
+    print(f"Search took {time.perf_counter() - t0:.0f}s")
+
+    summary = collect(args.out, len(trials))
+    print_summary(summary)
+    return summary
+
+
+def main(argv=None):
+    parser = build_parser()
+    parser.prog = "python -m training.search"
+    parser.description = "Architecture search with parallel, early-pruned trials"
+    parser.add_argument("--trials", type=int, default=16, help="Including the served architecture as trial 0")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Trials trained at once (default: cores / --threads, or 1)")
+    parser.add_argument("--prune-after", type=int, default=3, help="First epoch (1-based) a trial may be pruned")
+    parser.add_argument("--prune-min-trials", type=int, default=3,
+                        help="Other trials needed at an epoch before pruning against them")
+    args = parser.parse_args(argv)
+    if args.model not in SPACES:
+        parser.error(f"search supports {', '.join(SPACES)}")
+    search(args)
+
+
+if __name__ == "__main__":
+    main()
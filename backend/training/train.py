@@ -0,0 +1,221 @@
+"""
+Headless trainer for the served models.
+
+    python -m training vit   --data "Breast Cancer Dataset/Augmented Dataset" --out runs/vit
+    python -m training unet  --data dataset_intense --out runs/unet --epochs 50
+    python -m training vgg16 --data cbis_ddsm/manifest.csv --out runs/vgg16
+
+Uses the notebooks' architectures and settings (see pipelines.py) without
+the Colab/Kaggle parts. Everything a run produces goes under --out:
+
+  backup/        epoch-level state (keras BackupAndRestore). Re-running
+                 the same command resumes after the last finished epoch;
+                 --fresh discards it
+  best.weights.h5  best epoch so far by the pipeline's monitored metric
+  history.csv    per-epoch metrics (appended across resumes)
+  <artifact>     the best model under the file name the server loads
+                 (vit_mammogram_model.keras, ultrasound_unet_model.h5,
+                 VGG16_mammogram_model.h5)
+  summary.json   arguments, the best epoch's metrics, artifact path and
+                 sha256
+
+--profile START:STOP captures training steps START..STOP (1-based, counted
+across epochs): profile.json gets step time percentiles and the share of
+step time spent waiting for input, and logs/ gets a TensorBoard profiler
+trace with per-op costs (tensorboard --logdir OUT/logs, Profile tab).
+
+--folds K --fold I validates on fold I of a K-fold split instead of the
+--val-split holdout; training/crossval.py runs all folds in parallel.
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_profile(spec):
+    start, _, stop = spec.partition(":")
+    start, stop = int(start), int(stop or start)
+    if start < 1 or stop < start:
+        raise argparse.ArgumentTypeError("expected START:STOP with 1 <= START <= STOP")
+    return start, stop
+
+
+def parse_arch(spec):
+    key, sep, value = spec.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError("expected KEY=VALUE")
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    return key, value
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m training", description="Train a served model headlessly")
+    parser.add_argument("model", choices=("vit", "unet", "vgg16"))
+    parser.add_argument("--data", required=True,
+                        help="vit/vgg16: Cancer/Non-Cancer folder or labelled CSV (e.g. the CBIS manifest); "
+                             "unet: folder of image/mask pairs")
+    parser.add_argument("--out", required=True, help="Run directory (checkpoints, logs, artifact)")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=None, help="Default: the notebook's")
+    parser.add_argument("--lr", type=float, default=None, help="Default: the notebook's")
+    parser.add_argument("--val-split", type=float, default=0.2)
+    parser.add_argument("--folds", type=int, default=None, help="Validate on one fold of a K-fold split")
+    parser.add_argument("--fold", type=int, default=0, help="Which fold (0-based) with --folds")
+    parser.add_argument("--patience", type=int, default=10, help="Early-stopping patience in epochs")
+    parser.add_argument("--steps-per-epoch", type=int, default=None, help="Cap steps per epoch (smoke runs)")
+    parser.add_argument("--validation-steps", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cache-dir", default=None, help="Decoded-image cache (vit/vgg16)")
+    parser.add_argument("--workers", type=int, default=None, help="Processes for building the image cache")
+    parser.add_argument("--threads", type=int, default=None, help="TensorFlow intra-op threads")
+    parser.add_argument("--no-pretrained", action="store_true", help="vgg16: skip the ImageNet weights")
+    parser.add_argument("--arch", type=parse_arch, action="append", default=[], metavar="KEY=VALUE",
+                        help="Architecture argument (JSON value), e.g. patch_size=32 or mlp_head_units=[512]")
+    parser.add_argument("--profile", type=parse_profile, default=None, metavar="START:STOP")
+    parser.add_argument("--fresh", action="store_true", help="Discard any saved state in --out and start over")
+    return parser
+
+
+def check_folds(parser, args):
+    if args.folds is not None and not (args.folds >= 2 and 0 <= args.fold < args.folds):
+        parser.error("--folds needs K >= 2 and 0 <= --fold < K")
+    return args
+
+
+def best_epoch(history_path, monitor, mode):
+    """The history.csv row with the best monitored value (covers resumed runs), or None."""
+    if not os.path.exists(history_path):
+        return None
+    with open(history_path, newline="") as f:
+        rows = [row for row in csv.DictReader(f) if row.get(monitor) not in (None, "")]
+    if not rows:
+        return None
+    pick = max if mode == "max" else min
+    row = pick(rows, key=lambda r: float(r[monitor]))
+    return {k: int(v) if k == "epoch" else float(v) for k, v in row.items() if v != ""}
+
+
+def sha256_of(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def train(args):
+    """Runs one training job described by parsed CLI args; returns the summary dict."""
+    return run(args)[1]
+
+
+def run(args, extra_callbacks=()):
+    """train() that also takes extra keras callbacks and returns (model, summary)."""
+    import tensorflow as tf
+    if args.threads:
+        # Must happen before TensorFlow runs its first op
+        tf.config.threading.set_intra_op_parallelism_threads(args.threads)
+        tf.config.threading.set_inter_op_parallelism_threads(max(1, min(2, args.threads)))
+    import keras
+
+    from training.callbacks import StepProfiler
+    from training.image_cache import DEFAULT_CACHE_DIR
+    from training.pipelines import DEFAULT_BATCH_SIZES, PIPELINES
+
+    pipeline = PIPELINES[args.model]
+    args.batch_size = args.batch_size or DEFAULT_BATCH_SIZES[args.model]
+    args.cache_dir = args.cache_dir or os.path.join(os.path.dirname(os.path.abspath(args.out)), DEFAULT_CACHE_DIR)
+    keras.utils.set_random_seed(args.seed)
+
+    backup_dir = os.path.join(args.out, "backup")
+    if args.fresh and os.path.exists(args.out):
+        shutil.rmtree(args.out)
+    os.makedirs(args.out, exist_ok=True)
+    if os.path.exists(backup_dir):
+        print(f"Resuming from {backup_dir}")
+
+    train_ds, steps_per_epoch, val_ds = pipeline.datasets(args)
+    if args.steps_per_epoch:
+        steps_per_epoch = min(steps_per_epoch or args.steps_per_epoch, args.steps_per_epoch)
+
+    model = pipeline.build(args)
+    pipeline.compile(model, args)
+
+    best_path = os.path.join(args.out, "best.weights.h5")
+    history_path = os.path.join(args.out, "history.csv")
+    callbacks = [
+        *extra_callbacks,
+        keras.callbacks.BackupAndRestore(backup_dir),
+        keras.callbacks.ModelCheckpoint(best_path, monitor=pipeline.monitor, mode=pipeline.mode,
+                                        save_best_only=True, save_weights_only=True),
+        keras.callbacks.EarlyStopping(monitor=pipeline.monitor, mode=pipeline.mode,
+                                      patience=args.patience, restore_best_weights=True, verbose=1),
+        keras.callbacks.CSVLogger(history_path, append=True),
+    ]
+    if pipeline.reduce_lr:
+        callbacks.append(keras.callbacks.ReduceLROnPlateau(monitor=pipeline.monitor, factor=0.2,
+                                                           patience=max(1, args.patience // 2),
+                                                           min_lr=1e-5, verbose=1))
+    profiler = None
+    if args.profile:
+        start, stop = args.profile
+        profiler = StepProfiler(start, stop, os.path.join(args.out, "profile.json"))
+        train_ds = profiler.instrument(train_ds)
+        callbacks.append(profiler)
+        try:
+            import tensorboard  # noqa: F401 (the trace needs the tensorboard package)
+            callbacks.append(keras.callbacks.TensorBoard(os.path.join(args.out, "logs"), profile_batch=(start, stop)))
+        except ImportError:
+            print("tensorboard is not installed; skipping the per-op profiler trace")
+
+    t0 = time.perf_counter()
+    history = model.fit(train_ds, validation_data=val_ds, epochs=args.epochs,
+                        steps_per_epoch=steps_per_epoch, validation_steps=args.validation_steps,
+                        callbacks=callbacks, verbose=2)
+    elapsed = time.perf_counter() - t0
+
+    if os.path.exists(best_path):
+        model.load_weights(best_path)
+    artifact = os.path.join(args.out, pipeline.artifact)
+    model.save(artifact)
+
+    best_metrics = best_epoch(history_path, pipeline.monitor, pipeline.mode)
+    best = best_metrics[pipeline.monitor] if best_metrics else None
+    summary = {
+        "model": args.model,
+        "args": vars(args),
+        "epochs_run": len(history.epoch),
+        "seconds": elapsed,
+        "monitor": pipeline.monitor,
+        "mode": pipeline.mode,
+        "best": best,
+        "best_epoch": best_metrics,
+        "parameters": model.count_params(),
+        "final": {k: v[-1] for k, v in history.history.items()},
+        "artifact": artifact,
+        "sha256": sha256_of(artifact),
+        "profile": profiler.summary if profiler else None,
+    }
+    with open(os.path.join(args.out, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2, default=str)
+    print(f"Saved {artifact} ({pipeline.monitor} best: {best})")
+    return model, summary
+
+
+def main(argv=None):
+    parser = build_parser()
+    train(check_folds(parser, parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Streaming image/mask pipeline for the ultrasound U-Net (models/Ultrasound.py).
+
+The notebook used to cv2.imread the whole dataset into lists, stack them
+and divide by 255.0, which held a float64 copy of every image and mask in
+RAM before model.fit. Here only the file paths are materialised:
+
+  pairs   find_pairs() walks the dataset once and returns (image, mask)
+          path pairs, matched the same way load_data() did
+  decode  cv2 reads and resizes each pair in a tf.data map with parallel
+          calls (OpenCV releases the GIL), so images stay BGR exactly as
+          preprocess_ultrasound() feeds them at serving time
+  augment one random affine (flip, rotation, scale, shift) per pair,
+          applied to the image and its mask with the same matrix
+  batch   samples stay uint8 until they are batched; the cast to float32
+          and the / 255 happen once per batch, then the next batches are
+          prefetched while the model trains
+
+Peak memory is a few batches plus the shuffle buffer of path strings,
+whatever the dataset size.
+"""
+
+import os
+
+import cv2
+import numpy as np
+import tensorflow as tf
+
+IMG_SIZE = 128
+DEFAULT_BATCH_SIZE = 16
+
+# Augmentation ranges. Ultrasound has a fixed probe-at-the-top orientation,
+# so there are no vertical flips or large rotations.
+FLIP_PROBABILITY = 0.5
+MAX_ROTATION_DEGREES = 10.0
+SCALE_RANGE = (0.9, 1.1)
+MAX_SHIFT_FRACTION = 0.08
+
+
+def find_pairs(root_path):
+    """
+    Sorted (image_path, mask_path) pairs under root_path: every .png whose
+    name doesn't contain 'mask' and has a matching '<name>_mask.png' next to it.
+    """
+    pairs = []
+    for root, _, files in os.walk(root_path):
+        names = set(files)
+        for file in files:
+            if 'mask' in file or not file.lower().endswith('.png'):
+                continue
+            mask_name = file.replace('.png', '_mask.png')
+            if mask_name in names:
+                pairs.append((os.path.join(root, file), os.path.join(root, mask_name)))
+    pairs.sort()
+    return pairs
+
+
+def read_pair(img_path, mask_path, size=IMG_SIZE):
+    """Decodes one pair as uint8: image (size, size, 3) BGR, mask (size, size, 1)."""
+    img = cv2.imread(img_path)
+    mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
+    if img is None or mask is None:
+        raise ValueError(f"Could not decode {img_path} / {mask_path}")
+    img = cv2.resize(img, (size, size))
+    mask = cv2.resize(mask, (size, size))
+    return img, mask[..., np.newaxis]
+
+
+def augment_pair(img, mask, rng):
+    """Applies one random flip + affine to img and mask together."""
+    size = img.shape[1], img.shape[0]
+    center = size[0] / 2, size[1] / 2
+    matrix = cv2.getRotationMatrix2D(
+        center,
+        rng.uniform(-MAX_ROTATION_DEGREES, MAX_ROTATION_DEGREES),
+        rng.uniform(*SCALE_RANGE),
+    )
+    matrix[:, 2] += rng.uniform(-MAX_SHIFT_FRACTION, MAX_SHIFT_FRACTION, 2) * size
+    if rng.random() < FLIP_PROBABILITY:
+        # Mirror the output: x' = (width - 1) - x
+        matrix[0] = -matrix[0]
+        matrix[0, 2] += size[0] - 1
+
+    # Black borders, as in the scans themselves
+    img = cv2.warpAffine(img, matrix, size, flags=cv2.INTER_LINEAR,
+                         borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+    # Nearest neighbour keeps the mask's labels as they were (no blended edges)
+    mask = cv2.warpAffine(mask, matrix, size, flags=cv2.INTER_NEAREST,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+    return img, mask[..., np.newaxis]
+
+
+def _load(img_path, mask_path, seed, size, augment):
+    img, mask = read_pair(img_path.decode(), mask_path.decode(), size)
+    if augment:
+        img, mask = augment_pair(img, mask, np.random.default_rng(seed))
+    return img, mask
+
+
+def to_float(images, masks):
+    """uint8 batch -> float32 in [0, 1], as the notebook's X / 255.0 did."""
+    return tf.cast(images, tf.float32) / 255.0, tf.cast(masks, tf.float32) / 255.0
+
+
+def make_dataset(pairs, batch_size=DEFAULT_BATCH_SIZE, size=IMG_SIZE,
+                 augment=False, shuffle=False, seed=None, drop_remainder=False):
+    """
+    tf.data pipeline of (images, masks) float32 batches for model.fit.
+
+    With shuffle/augment the order and augmentations change every epoch;
+    a fixed seed makes the sequence of epochs reproducible.
+    """
+    img_paths = [img for img, _ in pairs]
+    mask_paths = [mask for _, mask in pairs]
+    ds = tf.data.Dataset.from_tensor_slices((img_paths, mask_paths))
+    if shuffle:
+        # Shuffles path strings only, so the whole dataset fits the buffer
+        ds = ds.shuffle(len(pairs), seed=seed, reshuffle_each_iteration=True)
+
+    # One augmentation seed per sample, redrawn each epoch
+    seeds = tf.data.Dataset.random(seed=seed, rerandomize_each_iteration=True)
+    ds = tf.data.Dataset.zip((ds, seeds))
+
+    def load(paths, sample_seed):
+        img, mask = tf.numpy_function(
+            lambda i, m, s: _load(i, m, s, size, augment),
+            [paths[0], paths[1], sample_seed],
+            [tf.uint8, tf.uint8],
+        )
+        img.set_shape((size, size, 3))
+        mask.set_shape((size, size, 1))
+        return img, mask
+
+    ds = ds.map(load, num_parallel_calls=tf.data.AUTOTUNE, deterministic=seed is not None)
+    ds = ds.batch(batch_size, drop_remainder=drop_remainder)
+    ds = ds.map(to_float, num_parallel_calls=tf.data.AUTOTUNE)
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+
+def load_arrays(pairs, size=IMG_SIZE):
+    """
+    Decodes pairs into float32 arrays in one go, for the small held-out test
+    set the notebook plots and scores. Use make_dataset() for training.
+    """
+    images = np.empty((len(pairs), size, size, 3), dtype=np.uint8)
+    masks = np.empty((len(pairs), size, size, 1), dtype=np.uint8)
+    for i, (img_path, mask_path) in enumerate(pairs):
+        images[i], masks[i] = read_pair(img_path, mask_path, size)
+    return images.astype(np.float32) / 255.0, masks.astype(np.float32) / 255.0
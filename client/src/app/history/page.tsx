@@ -4,8 +4,10 @@ import React, { useEffect } from "react";
 import { useAppDispatch, useAppSelector } from "@/lib/hooks";
 import {
 	fetchHistory,
+	fetchMoreHistory,
 	deleteScan,
 	ScanRecord,
+	ScanTypeFilter,
 } from "@/lib/features/historySlice";
 import GlassCard from "@/components/GlassCard";
 import { Calendar, AlertOctagon, CheckCircle, Search } from "lucide-react";
@@ -19,7 +21,8 @@ import Modal from "@/components/Modal";
 export default function HistoryPage() {
 	const dispatch = useAppDispatch();
 	const router = useRouter();
-	const { scans, loading, error } = useAppSelector((state) => state.history);
+	const { scans, scanType, nextCursor, loading, loadingMore, error } =
+		useAppSelector((state) => state.history);
 	const { user, loading: authLoading } = useAppSelector(
 		(state) => state.auth
 	);
@@ -31,24 +34,16 @@ export default function HistoryPage() {
 	const [scanToDelete, setScanToDelete] = React.useState<string | null>(null);
 	const [isDeleting, setIsDeleting] = React.useState(false);
 
-	// Filter Logic
-	const [filterType, setFilterType] = React.useState<
-		"all" | "mammogram" | "ultrasound"
-	>("all");
+	// The type tabs refetch from the server (GET /scans?scan_type=...); the
+	// search box only narrows the pages loaded so far.
 	const [searchQuery, setSearchQuery] = React.useState("");
 
+	const selectType = (type: ScanTypeFilter) => {
+		if (type !== scanType) dispatch(fetchHistory(type));
+	};
+
 	const filteredScans = React.useMemo(() => {
 		return scans.filter((scan) => {
-			// 1. Filter by Type
-			if (filterType !== "all" && scan.scan_type !== filterType) {
-				// Fallback for messy data: if scan_type is missing, assume mammogram if filter is mammogram?
-				// Or just strict string match. Let's do strict.
-				// Actually, if scan_type is undefined, it might be an old mammogram.
-				if (filterType === "mammogram" && !scan.scan_type) return true;
-				return false;
-			}
-
-			// 2. Filter by Search (ID or Type)
 			if (searchQuery) {
 				const q = searchQuery.toLowerCase();
 				const idMatch = scan.id.toLowerCase().includes(q);
@@ -60,7 +55,7 @@ export default function HistoryPage() {
 
 			return true;
 		});
-	}, [scans, filterType, searchQuery]);
+	}, [scans, searchQuery]);
 
 	const confirmDelete = (scanId: string) => {
 		setScanToDelete(scanId);
@@ -89,7 +84,8 @@ export default function HistoryPage() {
 		}
 	}, [user, authLoading, dispatch, router]);
 
-	if (loading || authLoading) return <DashboardLoader />;
+	// Switching tabs keeps the current rows on screen until the new page lands
+	if (authLoading || (loading && scans.length === 0)) return <DashboardLoader />;
 
 	if (error) {
 		return (
@@ -116,7 +112,7 @@ export default function HistoryPage() {
 							<Search className="absolute left-3 top-2.5 w-4 h-4 text-slate-400" />
 							<input
 								type="text"
-								placeholder="Search ID or Type..."
+								placeholder="Search loaded scans by ID or type..."
 								value={searchQuery}
 								onChange={(e) => setSearchQuery(e.target.value)}
 								className="pl-9 pr-4 py-2 bg-white dark:bg-slate-800 border border-slate-200 dark:border-slate-700 rounded-lg text-sm outline-none focus:border-pink-500 w-full md:w-64 shadow-sm text-slate-800 dark:text-slate-200"
@@ -130,10 +126,10 @@ export default function HistoryPage() {
 							(type) => (
 								<button
 									key={type}
-									onClick={() => setFilterType(type)}
+									onClick={() => selectType(type)}
 									className={cn(
 										"px-4 py-2 rounded-lg text-sm font-bold capitalize transition-all",
-										filterType === type
+										scanType === type
 											? "bg-white dark:bg-slate-700 text-pink-600 dark:text-pink-400 shadow-sm"
 											: "text-slate-500 hover:text-slate-700 dark:text-slate-400 dark:hover:text-slate-300"
 									)}>
@@ -144,12 +140,22 @@ export default function HistoryPage() {
 					</div>
 				</header>
 
-				<div className="grid gap-4">
+				<div
+					className={cn(
+						"grid gap-4 transition-opacity",
+						loading && "opacity-50 pointer-events-none"
+					)}>
 					{filteredScans.length === 0 ? (
 						<div className="text-center py-20">
 							<p className="text-slate-400">
 								No scans found matching your criteria.
 							</p>
+							{searchQuery && nextCursor && (
+								<p className="text-slate-400 text-sm mt-2">
+									Search only covers the scans loaded so far; load
+									more to search further back.
+								</p>
+							)}
 						</div>
 					) : (
 						filteredScans.map((scan: ScanRecord) => (
@@ -161,12 +167,17 @@ export default function HistoryPage() {
 									onClick={(e) => {
 										e.stopPropagation();
 										setLightboxImage(
-											scan.original_image_url || null
+											scan.preview_url ||
+												scan.original_image_url ||
+												null
 										);
 									}}>
 									{scan.original_image_url ? (
 										<img
-											src={scan.original_image_url}
+											src={
+												scan.thumbnail_url ||
+												scan.original_image_url
+											}
 											alt="Scan"
 											className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-500"
 										/>
@@ -262,6 +273,17 @@ export default function HistoryPage() {
 					)}
 				</div>
 
+				{nextCursor && (
+					<div className="flex justify-center">
+						<button
+							onClick={() => dispatch(fetchMoreHistory())}
+							disabled={loading || loadingMore}
+							className="px-5 py-2 bg-white dark:bg-slate-800 border border-slate-200 dark:border-slate-700 rounded-lg text-sm font-bold text-slate-600 dark:text-slate-300 hover:text-pink-600 dark:hover:text-pink-400 shadow-sm transition-colors disabled:opacity-50">
+							{loadingMore ? "Loading..." : "Load more"}
+						</button>
+					</div>
+				)}
+
 				<Lightbox
 					isOpen={!!lightboxImage}
 					imageSrc={lightboxImage}
@@ -4,7 +4,7 @@ import React, { useEffect } from "react";
 import { motion } from "framer-motion";
 import { useAppDispatch, useAppSelector } from "@/lib/hooks";
 import { checkSession } from "@/lib/features/authSlice";
-import { fetchHistory } from "@/lib/features/historySlice";
+import { fetchStats } from "@/lib/features/statsSlice";
 import DashboardStats from "@/components/DashboardStats";
 import { DashboardLoader } from "@/components/DashboardLoader";
 import { useRouter } from "next/navigation";
@@ -15,8 +15,8 @@ export default function Home() {
 	const { user, loading: authLoading } = useAppSelector(
 		(state) => state.auth
 	);
-	const { scans, loading: historyLoading } = useAppSelector(
-		(state) => state.history
+	const { stats, loading: statsLoading, error } = useAppSelector(
+		(state) => state.stats
 	);
 
 	useEffect(() => {
@@ -27,11 +27,11 @@ export default function Home() {
 		if (!authLoading && !user) {
 			router.push("/login");
 		} else if (user) {
-			dispatch(fetchHistory());
+			dispatch(fetchStats());
 		}
 	}, [user, authLoading, dispatch, router]);
 
-	if (authLoading || (user && historyLoading && scans.length === 0))
+	if (authLoading || (user && statsLoading && !stats))
 		return <DashboardLoader />;
 	if (!user) return null;
 
@@ -51,7 +51,15 @@ export default function Home() {
 				</div>
 			</header>
 
-			<DashboardStats scans={scans} />
+			{stats ? (
+				<DashboardStats stats={stats} />
+			) : (
+				error && (
+					<div className="p-4 bg-rose-50 text-rose-600 rounded-xl border border-rose-200">
+						Error: {error}
+					</div>
+				)
+			)}
 		</div>
 	);
 }
@@ -21,33 +21,19 @@ import {
 	YAxis,
 	CartesianGrid,
 } from "recharts";
-import { ScanRecord } from "@/lib/features/historySlice";
+import { ScanStats } from "@/lib/features/statsSlice";
 
 interface DashboardStatsProps {
-	scans: ScanRecord[];
+	stats: ScanStats;
 }
 
-export default function DashboardStats({ scans }: DashboardStatsProps) {
-	const totalScans = scans.length;
-	const malignantCount = scans.filter(
-		(s) => s.prediction_label === "Malignant"
-	).length;
-	const benignCount = scans.filter(
-		(s) => s.prediction_label === "Benign"
-	).length;
+export default function DashboardStats({ stats: counters }: DashboardStatsProps) {
+	const totalScans = counters.total_scans;
+	const malignantCount = counters.malignant_count;
+	const benignCount = counters.benign_count;
 
 	// Average Confidence
-	const avgConfidence =
-		totalScans > 0
-			? (
-					(scans.reduce(
-						(acc, curr) => acc + curr.confidence_score,
-						0
-					) /
-						totalScans) *
-					100
-			  ).toFixed(1)
-			: "0.0";
+	const avgConfidence = (counters.avg_confidence * 100).toFixed(1);
 
 	// Pie Chart Data
 	const pieData = [
@@ -55,18 +41,11 @@ export default function DashboardStats({ scans }: DashboardStatsProps) {
 		{ name: "Malignant", value: malignantCount, color: "#f43f5e" }, // Rose-500
 	];
 
-	// Accuracy Distribution (Mock for now, or bin confidence scores?)
-	// Let's bin confidence scores > 90%, 80-90%, < 80%
-	const highConf = scans.filter((s) => s.confidence_score >= 0.9).length;
-	const medConf = scans.filter(
-		(s) => s.confidence_score >= 0.8 && s.confidence_score < 0.9
-	).length;
-	const lowConf = scans.filter((s) => s.confidence_score < 0.8).length;
-
+	// Confidence scores binned > 90%, 80-90%, < 80%
 	const barData = [
-		{ name: ">90%", count: highConf },
-		{ name: "80-90%", count: medConf },
-		{ name: "<80%", count: lowConf },
+		{ name: ">90%", count: counters.high_confidence_count },
+		{ name: "80-90%", count: counters.medium_confidence_count },
+		{ name: "<80%", count: counters.low_confidence_count },
 	];
 
 	const stats = [
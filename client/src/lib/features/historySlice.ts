@@ -1,5 +1,4 @@
 import { createSlice, createAsyncThunk } from "@reduxjs/toolkit";
-import { supabase } from "../supabaseClient";
 
 export interface ScanRecord {
 	id: string;
@@ -8,35 +7,113 @@ export interface ScanRecord {
 	confidence_score: number;
 	original_image_url: string;
 	annotated_image_url?: string;
+	thumbnail_url?: string;
+	preview_url?: string;
 	scan_type?: string;
+	model_version?: string;
 }
 
+export type ScanTypeFilter = "all" | "mammogram" | "ultrasound";
+
 interface HistoryState {
 	scans: ScanRecord[];
+	scanType: ScanTypeFilter;
+	nextCursor: string | null;
+	// Latest page request; a response for anything older (e.g. a tab the
+	// user has already left) is dropped
+	requestId: string | null;
 	loading: boolean;
+	loadingMore: boolean;
 	error: string | null;
 }
 
 const initialState: HistoryState = {
 	scans: [],
+	scanType: "all",
+	nextCursor: null,
+	requestId: null,
 	loading: false,
+	loadingMore: false,
 	error: null,
 };
 
+const PAGE_SIZE = 20;
+
+interface ScanPage {
+	scans: ScanRecord[];
+	next_cursor: string | null;
+}
+
+// One newest-first page of GET /scans, filtered server-side by scan type;
+// pass the previous page's next_cursor to continue after it.
+async function fetchScanPage(
+	session: any,
+	scanType: ScanTypeFilter,
+	cursor: string | null
+) {
+	const apiUrl = process.env.NEXT_PUBLIC_API_URL || "http://localhost:5000";
+	const params = new URLSearchParams({ limit: String(PAGE_SIZE) });
+	if (scanType !== "all") params.set("scan_type", scanType);
+	if (cursor) params.set("cursor", cursor);
+
+	const response = await fetch(`${apiUrl}/scans?${params}`, {
+		headers: {
+			Authorization: `Bearer ${session.access_token}`,
+		},
+	});
+
+	if (!response.ok) {
+		const err = await response.json();
+		throw new Error(err.error || "Failed to load history");
+	}
+	return (await response.json()) as ScanPage;
+}
+
+// Loads the first page for scanType (default: the current filter),
+// replacing whatever was loaded before.
 export const fetchHistory = createAsyncThunk(
 	"history/fetchHistory",
-	async (_, { rejectWithValue }) => {
+	async (scanType: ScanTypeFilter | undefined, { getState, rejectWithValue }) => {
+		try {
+			const state = getState() as any;
+			const session = state.auth.session;
+			if (!session) throw new Error("No session");
+
+			return await fetchScanPage(
+				session,
+				scanType ?? state.history.scanType,
+				null
+			);
+		} catch (err: any) {
+			return rejectWithValue(err.message);
+		}
+	}
+);
+
+export const fetchMoreHistory = createAsyncThunk(
+	"history/fetchMoreHistory",
+	async (_, { getState, rejectWithValue }) => {
 		try {
-			const { data, error } = await supabase
-				.from("scans")
-				.select("*")
-				.order("created_at", { ascending: false });
+			const state = getState() as any;
+			const session = state.auth.session;
+			if (!session) throw new Error("No session");
 
-			if (error) throw error;
-			return data as ScanRecord[];
+			return await fetchScanPage(
+				session,
+				state.history.scanType,
+				state.history.nextCursor
+			);
 		} catch (err: any) {
 			return rejectWithValue(err.message);
 		}
+	},
+	{
+		condition: (_, { getState }) => {
+			const { history } = getState() as any;
+			return (
+				!!history.nextCursor && !history.loading && !history.loadingMore
+			);
+		},
 	}
 );
 
@@ -75,18 +152,40 @@ const historySlice = createSlice({
 	reducers: {},
 	extraReducers: (builder) => {
 		builder
-			.addCase(fetchHistory.pending, (state) => {
+			.addCase(fetchHistory.pending, (state, action) => {
 				state.loading = true;
+				state.loadingMore = false;
 				state.error = null;
+				state.requestId = action.meta.requestId;
+				if (action.meta.arg) state.scanType = action.meta.arg;
 			})
 			.addCase(fetchHistory.fulfilled, (state, action) => {
+				if (action.meta.requestId !== state.requestId) return;
 				state.loading = false;
-				state.scans = action.payload;
+				state.scans = action.payload.scans;
+				state.nextCursor = action.payload.next_cursor;
 			})
 			.addCase(fetchHistory.rejected, (state, action) => {
+				if (action.meta.requestId !== state.requestId) return;
 				state.loading = false;
 				state.error = action.payload as string;
 			})
+			.addCase(fetchMoreHistory.pending, (state, action) => {
+				state.loadingMore = true;
+				state.error = null;
+				state.requestId = action.meta.requestId;
+			})
+			.addCase(fetchMoreHistory.fulfilled, (state, action) => {
+				if (action.meta.requestId !== state.requestId) return;
+				state.loadingMore = false;
+				state.scans = state.scans.concat(action.payload.scans);
+				state.nextCursor = action.payload.next_cursor;
+			})
+			.addCase(fetchMoreHistory.rejected, (state, action) => {
+				if (action.meta.requestId !== state.requestId) return;
+				state.loadingMore = false;
+				state.error = action.payload as string;
+			})
 			.addCase(deleteScan.fulfilled, (state, action) => {
 				state.scans = state.scans.filter(
 					(scan) => scan.id !== action.payload
@@ -10,6 +10,7 @@ interface ScanResult {
 	annotated_url?: string;
 	mask_image?: string;
 	scan_type?: "mammogram" | "ultrasound";
+	request_id?: string;
 }
 
 interface ScanState {
@@ -24,6 +25,35 @@ const initialState: ScanState = {
 	error: null,
 };
 
+// Sends a fresh W3C trace context with the upload. The server echoes the
+// trace id as X-Request-ID, so the client-side time logged here can be
+// matched to the server's spans for the same request.
+async function tracedUpload(url: string, token: string, file: File) {
+	const hex = (bytes: number) =>
+		Array.from(crypto.getRandomValues(new Uint8Array(bytes)), (b) =>
+			b.toString(16).padStart(2, "0")
+		).join("");
+	const traceId = hex(16);
+
+	const formData = new FormData();
+	formData.append("file", file);
+
+	const started = performance.now();
+	const response = await fetch(url, {
+		method: "POST",
+		headers: {
+			Authorization: `Bearer ${token}`,
+			traceparent: `00-${traceId}-${hex(8)}-00`,
+		},
+		body: formData,
+	});
+	const requestId = response.headers.get("X-Request-ID") || traceId;
+	console.debug(
+		`[${requestId}] POST ${url}: ${Math.round(performance.now() - started)} ms, ${file.size} bytes, HTTP ${response.status}`
+	);
+	return { response, requestId };
+}
+
 export const uploadScan = createAsyncThunk(
 	"scan/uploadScan",
 	async (file: File, { getState, rejectWithValue }) => {
@@ -36,26 +66,23 @@ export const uploadScan = createAsyncThunk(
 				throw new Error("User not authenticated");
 			}
 
-			const formData = new FormData();
-			formData.append("file", file);
-
 			const apiUrl =
 				process.env.NEXT_PUBLIC_API_URL || "http://localhost:5000";
-			const response = await fetch(`${apiUrl}/predict`, {
-				method: "POST",
-				headers: {
-					Authorization: `Bearer ${session.access_token}`,
-				},
-				body: formData,
-			});
+			const { response, requestId } = await tracedUpload(
+				`${apiUrl}/predict`,
+				session.access_token,
+				file
+			);
 
 			if (!response.ok) {
 				const err = await response.json();
-				throw new Error(err.error || "Failed to analyze scan");
+				throw new Error(
+					`${err.error || "Failed to analyze scan"} (request ${requestId})`
+				);
 			}
 
 			const data: ScanResult = await response.json();
-			return data;
+			return { ...data, request_id: requestId };
 		} catch (error: any) {
 			return rejectWithValue(error.message);
 		}
@@ -73,26 +100,23 @@ export const uploadUltrasoundScan = createAsyncThunk(
 				throw new Error("User not authenticated");
 			}
 
-			const formData = new FormData();
-			formData.append("file", file);
-
 			const apiUrl =
 				process.env.NEXT_PUBLIC_API_URL || "http://localhost:5000";
-			const response = await fetch(`${apiUrl}/ultrasound`, {
-				method: "POST",
-				headers: {
-					Authorization: `Bearer ${session.access_token}`,
-				},
-				body: formData,
-			});
+			const { response, requestId } = await tracedUpload(
+				`${apiUrl}/ultrasound`,
+				session.access_token,
+				file
+			);
 
 			if (!response.ok) {
 				const err = await response.json();
-				throw new Error(err.error || "Failed to analyze ultrasound");
+				throw new Error(
+					`${err.error || "Failed to analyze ultrasound"} (request ${requestId})`
+				);
 			}
 
 			const data: ScanResult = await response.json();
-			return data;
+			return { ...data, request_id: requestId };
 		} catch (error: any) {
 			return rejectWithValue(error.message);
 		}
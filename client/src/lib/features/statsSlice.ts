@@ -0,0 +1,80 @@
+import { createSlice, createAsyncThunk } from "@reduxjs/toolkit";
+
+// Counters kept up to date by the scans triggers (scan_stats) and served by
+// GET /stats, so the dashboard doesn't need the whole history.
+export interface ScanStats {
+	total_scans: number;
+	mammogram_scans: number;
+	ultrasound_scans: number;
+	malignant_count: number;
+	benign_count: number;
+	abnormality_count: number;
+	high_confidence_count: number;
+	medium_confidence_count: number;
+	low_confidence_count: number;
+	avg_confidence: number;
+	updated_at: string | null;
+}
+
+interface StatsState {
+	stats: ScanStats | null;
+	loading: boolean;
+	error: string | null;
+}
+
+const initialState: StatsState = {
+	stats: null,
+	loading: false,
+	error: null,
+};
+
+export const fetchStats = createAsyncThunk(
+	"stats/fetchStats",
+	async (_, { getState, rejectWithValue }) => {
+		try {
+			const state = getState() as any;
+			const session = state.auth.session;
+			if (!session) throw new Error("No session");
+
+			const apiUrl =
+				process.env.NEXT_PUBLIC_API_URL || "http://localhost:5000";
+			const response = await fetch(`${apiUrl}/stats`, {
+				headers: {
+					Authorization: `Bearer ${session.access_token}`,
+				},
+			});
+
+			if (!response.ok) {
+				const err = await response.json();
+				throw new Error(err.error || "Failed to load stats");
+			}
+
+			return (await response.json()) as ScanStats;
+		} catch (err: any) {
+			return rejectWithValue(err.message);
+		}
+	}
+);
+
+const statsSlice = createSlice({
+	name: "stats",
+	initialState,
+	reducers: {},
+	extraReducers: (builder) => {
+		builder
+			.addCase(fetchStats.pending, (state) => {
+				state.loading = true;
+				state.error = null;
+			})
+			.addCase(fetchStats.fulfilled, (state, action) => {
+				state.loading = false;
+				state.stats = action.payload;
+			})
+			.addCase(fetchStats.rejected, (state, action) => {
+				state.loading = false;
+				state.error = action.payload as string;
+			});
+	},
+});
+
+export default statsSlice.reducer;
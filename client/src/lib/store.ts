@@ -2,6 +2,7 @@ import { configureStore } from "@reduxjs/toolkit";
 import authReducer from "./features/authSlice";
 import scanReducer from "./features/scanSlice";
 import historyReducer from "./features/historySlice";
+import statsReducer from "./features/statsSlice";
 
 export const makeStore = () => {
 	return configureStore({
@@ -9,6 +10,7 @@ export const makeStore = () => {
 			auth: authReducer,
 			scan: scanReducer,
 			history: historyReducer,
+			stats: statsReducer,
 		},
 	});
 };
@@ -4,12 +4,33 @@ create table public.scans (
   user_id uuid references auth.users(id) not null,
   original_image_url text not null,
   annotated_image_url text,
+  thumbnail_url text,
+  preview_url text,
+  -- every 'mammo-scans' object written for this scan (original + derived)
+  storage_paths text[],
   prediction_label text,
   confidence_score float,
   created_at timestamp with time zone default timezone('utc'::text, now()) not null,
-  scan_type text
+  scan_type text,
+  -- served model(s) that produced the prediction, e.g. 'vit@2026-10-01'
+  model_version text
 );
 
+-- Existing deployments: add the newer columns in place
+-- alter table public.scans add column if not exists thumbnail_url text;
+-- alter table public.scans add column if not exists preview_url text;
+-- alter table public.scans add column if not exists storage_paths text[];
+-- alter table public.scans add column if not exists model_version text;
+
+-- Keyset pagination for the history API walks (user_id, created_at, id) newest
+-- first; this index turns each page into a bounded range scan.
+create index scans_user_created_id_idx
+  on public.scans (user_id, created_at desc, id desc);
+
+-- Same ordering for the type-filtered history tabs
+create index scans_user_type_created_id_idx
+  on public.scans (user_id, scan_type, created_at desc, id desc);
+
 -- Enable RLS
 alter table public.scans enable row level security;
 
@@ -23,6 +44,210 @@ create policy "Users can insert their own scans"
   on public.scans for insert
   with check ( auth.uid() = user_id );
 
+-- Per-user dashboard counters, kept in step with public.scans by the
+-- statement-level triggers below so /stats is a single-row lookup.
+create table public.scan_stats (
+  user_id uuid references auth.users(id) on delete cascade primary key,
+  total_scans bigint not null default 0,
+  mammogram_scans bigint not null default 0,
+  ultrasound_scans bigint not null default 0,
+  malignant_count bigint not null default 0,
+  benign_count bigint not null default 0,
+  abnormality_count bigint not null default 0,
+  high_confidence_count bigint not null default 0,
+  medium_confidence_count bigint not null default 0,
+  low_confidence_count bigint not null default 0,
+  confidence_sum double precision not null default 0,
+  updated_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
+
+alter table public.scan_stats enable row level security;
+
+create policy "Users can view their own scan stats"
+  on public.scan_stats for select
+  using ( auth.uid() = user_id );
+
+-- Adds a (possibly negative) delta to one user's counters
+create or replace function public.scan_stats_bump(
+  p_user_id uuid, p_total bigint, p_mammogram bigint, p_ultrasound bigint,
+  p_malignant bigint, p_benign bigint, p_abnormality bigint,
+  p_high bigint, p_medium bigint, p_low bigint, p_confidence double precision
+) returns void
+language sql security definer set search_path = public as $$
+  insert into public.scan_stats as s (
+    user_id, total_scans, mammogram_scans, ultrasound_scans,
+    malignant_count, benign_count, abnormality_count,
+    high_confidence_count, medium_confidence_count, low_confidence_count,
+    confidence_sum
+  ) values (
+    p_user_id, p_total, p_mammogram, p_ultrasound,
+    p_malignant, p_benign, p_abnormality,
+    p_high, p_medium, p_low, p_confidence
+  )
+  on conflict (user_id) do update set
+    total_scans = s.total_scans + excluded.total_scans,
+    mammogram_scans = s.mammogram_scans + excluded.mammogram_scans,
+    ultrasound_scans = s.ultrasound_scans + excluded.ultrasound_scans,
+    malignant_count = s.malignant_count + excluded.malignant_count,
+    benign_count = s.benign_count + excluded.benign_count,
+    abnormality_count = s.abnormality_count + excluded.abnormality_count,
+    high_confidence_count = s.high_confidence_count + excluded.high_confidence_count,
+    medium_confidence_count = s.medium_confidence_count + excluded.medium_confidence_count,
+    low_confidence_count = s.low_confidence_count + excluded.low_confidence_count,
+    confidence_sum = s.confidence_sum + excluded.confidence_sum,
+    updated_at = timezone('utc'::text, now());
+$$;
+
+-- Runs once per INSERT/DELETE statement (not per row), so a bulk delete
+-- costs one counter update per affected user. Being a trigger, the update
+-- commits or rolls back together with the scans change itself.
+create or replace function public.scan_stats_apply()
+returns trigger
+language plpgsql security definer set search_path = public as $$
+begin
+  if tg_op = 'INSERT' then
+    perform public.scan_stats_bump(
+      user_id, count(*),
+      count(*) filter (where coalesce(scan_type, 'mammogram') = 'mammogram'),
+      count(*) filter (where scan_type = 'ultrasound'),
+      count(*) filter (where prediction_label = 'Malignant'),
+      count(*) filter (where prediction_label = 'Benign'),
+      count(*) filter (where prediction_label = 'Potential Abnormality Detected'),
+      count(*) filter (where coalesce(confidence_score, 0) >= 0.9),
+      count(*) filter (where coalesce(confidence_score, 0) >= 0.8 and coalesce(confidence_score, 0) < 0.9),
+      count(*) filter (where coalesce(confidence_score, 0) < 0.8),
+      coalesce(sum(confidence_score), 0)
+    ) from new_rows group by user_id;
+  else
+    perform public.scan_stats_bump(
+      user_id, -count(*),
+      -count(*) filter (where coalesce(scan_type, 'mammogram') = 'mammogram'),
+      -count(*) filter (where scan_type = 'ultrasound'),
+      -count(*) filter (where prediction_label = 'Malignant'),
+      -count(*) filter (where prediction_label = 'Benign'),
+      -count(*) filter (where prediction_label = 'Potential Abnormality Detected'),
+      -count(*) filter (where coalesce(confidence_score, 0) >= 0.9),
+      -count(*) filter (where coalesce(confidence_score, 0) >= 0.8 and coalesce(confidence_score, 0) < 0.9),
+      -count(*) filter (where coalesce(confidence_score, 0) < 0.8),
+      -coalesce(sum(confidence_score), 0)
+    ) from old_rows group by user_id;
+  end if;
+  return null;
+end;
+$$;
+
+create trigger scans_stats_after_insert
+  after insert on public.scans
+  referencing new table as new_rows
+  for each statement execute function public.scan_stats_apply();
+
+create trigger scans_stats_after_delete
+  after delete on public.scans
+  referencing old table as old_rows
+  for each statement execute function public.scan_stats_apply();
+
+-- Recomputes counters from public.scans (all users, or just p_user_id) and
+-- returns how many scan_stats rows had drifted. Holding the table lock keeps
+-- concurrent triggers from interleaving with the recount.
+create or replace function public.reconcile_scan_stats(p_user_id uuid default null)
+returns integer
+language plpgsql security definer set search_path = public as $$
+declare
+  repaired integer;
+begin
+  lock table public.scan_stats in exclusive mode;
+
+  with actual as (
+    select
+      user_id,
+      count(*) as total_scans,
+      count(*) filter (where coalesce(scan_type, 'mammogram') = 'mammogram') as mammogram_scans,
+      count(*) filter (where scan_type = 'ultrasound') as ultrasound_scans,
+      count(*) filter (where prediction_label = 'Malignant') as malignant_count,
+      count(*) filter (where prediction_label = 'Benign') as benign_count,
+      count(*) filter (where prediction_label = 'Potential Abnormality Detected') as abnormality_count,
+      count(*) filter (where coalesce(confidence_score, 0) >= 0.9) as high_confidence_count,
+      count(*) filter (where coalesce(confidence_score, 0) >= 0.8 and coalesce(confidence_score, 0) < 0.9) as medium_confidence_count,
+      count(*) filter (where coalesce(confidence_score, 0) < 0.8) as low_confidence_count,
+      coalesce(sum(confidence_score), 0) as confidence_sum
+    from public.scans
+    where p_user_id is null or user_id = p_user_id
+    group by user_id
+  ),
+  upserted as (
+    insert into public.scan_stats as s (
+      user_id, total_scans, mammogram_scans, ultrasound_scans,
+      malignant_count, benign_count, abnormality_count,
+      high_confidence_count, medium_confidence_count, low_confidence_count,
+      confidence_sum
+    )
+    select * from actual
+    on conflict (user_id) do update set
+      total_scans = excluded.total_scans,
+      mammogram_scans = excluded.mammogram_scans,
+      ultrasound_scans = excluded.ultrasound_scans,
+      malignant_count = excluded.malignant_count,
+      benign_count = excluded.benign_count,
+      abnormality_count = excluded.abnormality_count,
+      high_confidence_count = excluded.high_confidence_count,
+      medium_confidence_count = excluded.medium_confidence_count,
+      low_confidence_count = excluded.low_confidence_count,
+      confidence_sum = excluded.confidence_sum,
+      updated_at = timezone('utc'::text, now())
+    where (s.total_scans, s.mammogram_scans, s.ultrasound_scans,
+           s.malignant_count, s.benign_count, s.abnormality_count,
+           s.high_confidence_count, s.medium_confidence_count, s.low_confidence_count)
+      is distinct from
+          (excluded.total_scans, excluded.mammogram_scans, excluded.ultrasound_scans,
+           excluded.malignant_count, excluded.benign_count, excluded.abnormality_count,
+           excluded.high_confidence_count, excluded.medium_confidence_count, excluded.low_confidence_count)
+       or abs(s.confidence_sum - excluded.confidence_sum) > 1e-6
+    returning 1
+  ),
+  removed as (
+    delete from public.scan_stats s
+    where (p_user_id is null or s.user_id = p_user_id)
+      and not exists (select 1 from public.scans where scans.user_id = s.user_id)
+    returning 1
+  )
+  select (select count(*) from upserted) + (select count(*) from removed)
+    into repaired;
+
+  return repaired;
+end;
+$$;
+
+-- These run with the owner's rights, so keep them off the public /rpc API:
+-- the triggers call them as the owner, and the reconcile job uses the
+-- service_role key.
+revoke execute on function
+  public.scan_stats_bump(uuid, bigint, bigint, bigint, bigint, bigint, bigint, bigint, bigint, bigint, double precision),
+  public.reconcile_scan_stats(uuid),
+  public.scan_stats_apply()
+  from public, anon, authenticated;
+grant execute on function
+  public.scan_stats_bump(uuid, bigint, bigint, bigint, bigint, bigint, bigint, bigint, bigint, bigint, double precision),
+  public.reconcile_scan_stats(uuid),
+  public.scan_stats_apply()
+  to service_role;
+
+-- One row per storage object referenced by a scan, for the storage garbage
+-- collector (backend/storage_gc.py). Legacy rows without storage_paths fall
+-- back to the paths embedded in their public URLs. The "C" collation makes
+-- ORDER BY path match the byte order the storage API lists objects in.
+create view public.scan_storage_objects
+  with (security_invoker = true) as
+  select s.id as scan_id, s.user_id, (p.path collate "C") as path
+  from public.scans s
+  cross join lateral unnest(
+    coalesce(s.storage_paths, array[
+      nullif(split_part(split_part(s.original_image_url, 'mammo-scans/', 2), '?', 1), ''),
+      nullif(split_part(split_part(s.preview_url, 'mammo-scans/', 2), '?', 1), ''),
+      nullif(split_part(split_part(s.thumbnail_url, 'mammo-scans/', 2), '?', 1), '')
+    ])
+  ) as p(path)
+  where p.path is not null;
+
 -- Storage buckets setup (Run these via Supabase Dashboard if SQL editor doesn't support storage creation directly)
 -- insert into storage.buckets (id, name, public) values ('mammo-scans', 'mammo-scans', true);
 